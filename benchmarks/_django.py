@@ -0,0 +1,109 @@
+"""
+Shared setup for the benchmark scripts in this directory.
+
+Usage from a benchmark:
+
+    from _django import setup, test_database
+    setup()
+    with test_database():
+        ...
+
+Benchmarks never touch db.sqlite3: ``test_database`` creates a throwaway
+test database the same way ``manage.py test`` does and removes it on exit.
+"""
+
+import os
+import sys
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+
+
+def setup(**overrides):
+    sys.path.insert(0, str(ROOT))
+    os.environ.setdefault("DJANGO_SETTINGS_MODULE", "foodsdonation.settings")
+    import django
+    from django.conf import settings
+
+    settings.ALLOWED_HOSTS = ["testserver"]
+    # Render {% static %} without requiring a collectstatic manifest.
+    settings.STORAGES = {
+        **settings.STORAGES,
+        "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+    }
+    for name, value in overrides.items():
+        setattr(settings, name, value)
+    django.setup()
+
+
+@contextmanager
+def test_database(keepdb=False):
+    from django.db import connections
+    from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+    setup_test_environment(debug=False)
+    old_config = setup_databases(verbosity=0, interactive=False, keepdb=keepdb, aliases=set(connections))
+    try:
+        yield
+    finally:
+        teardown_databases(old_config, verbosity=0, keepdb=keepdb)
+        teardown_test_environment()
+
+
+def seed_donations(total, donors=200):
+    """
+    Grow the Donation table to ``total`` rows, spread over ``donors`` donor
+    accounts, and make sure a ``receiver`` account (password ``x``) exists.
+    """
+    import datetime
+
+    from django.utils import timezone
+
+    from portal.models import Donation, Donor, User
+
+    if not User.objects.filter(username="receiver").exists():
+        User.objects.create_user("receiver", password="x", user_type="receiver")
+        users = User.objects.bulk_create(
+            User(username=f"donor{i}", email=f"donor{i}@example.com", user_type="donor")
+            for i in range(donors)
+        )
+        Donor.objects.bulk_create(Donor(user=u, mobile_number="5550100") for u in users)
+    users = list(User.objects.filter(user_type="donor"))
+    now, today = timezone.now(), datetime.date.today()
+    missing = total - Donation.objects.count()
+    Donation.objects.bulk_create(
+        (
+            Donation(
+                donor=users[i % len(users)],
+                food_type=f"Meal pack {i}",
+                quantity="20 boxes",
+                pickup_location="Community hall, 4th cross",
+                pickup_time=now,
+                expiry_date=today,
+            )
+            for i in range(missing)
+        ),
+        batch_size=2000,
+    )
+
+
+def timeit(func, repeat=5, number=1):
+    """Return the best wall-clock time per call in seconds."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for _ in range(number):
+            func()
+        best = min(best, (time.perf_counter() - start) / number)
+    return best
+
+
+def report(rows, headers):
+    widths = [max(len(str(h)), *(len(str(r[i])) for r in rows)) for i, h in enumerate(headers)]
+    line = "  ".join(str(h).ljust(w) for h, w in zip(headers, widths))
+    print(line)
+    print("-" * len(line))
+    for row in rows:
+        print("  ".join(str(c).ljust(w) for c, w in zip(row, widths)))
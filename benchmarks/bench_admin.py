@@ -0,0 +1,73 @@
+"""
+Admin changelist latency on large tables.
+
+Seeds N donations (and one request per ten donations), logs in as staff
+and times the Donation and Request changelists: the first page, a deep
+page, the status filter, a search and a date-hierarchy drill-down.  The
+query count per page is reported alongside; it must not grow with the
+page size.
+
+    python benchmarks/bench_admin.py [--donations 1000000]
+"""
+
+import argparse
+
+from _django import report, seed_donations, setup, test_database, timeit
+
+setup()
+
+from django.db import connection  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from portal.models import Donation, Request, User  # noqa: E402
+
+
+def seed_requests(every=10):
+    receiver = User.objects.get(username="receiver")
+    ids = Donation.objects.values_list("pk", flat=True)[::every]
+    Request.objects.bulk_create(
+        (Request(donation_id=pk, requester=receiver, message="") for pk in ids),
+        batch_size=2000,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--donations", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    with test_database():
+        seed_donations(args.donations)
+        seed_requests()
+        User.objects.create_superuser("admin", password="x")
+        client = Client()
+        client.login(username="admin", password="x")
+
+        now = timezone.localtime()
+        pages = [
+            ("donations", "/admin/portal/donation/"),
+            ("donations p.500", "/admin/portal/donation/?p=500"),
+            ("donations status", "/admin/portal/donation/?status__exact=Requested"),
+            ("donations search", "/admin/portal/donation/?q=donor42"),
+            (
+                "donations day",
+                f"/admin/portal/donation/?pickup_time__year={now.year}"
+                f"&pickup_time__month={now.month}&pickup_time__day={now.day}",
+            ),
+            ("requests", "/admin/portal/request/"),
+            ("requests search", "/admin/portal/request/?q=Meal+pack+42"),
+        ]
+        rows = []
+        for name, url in pages:
+            queries = []
+            with connection.execute_wrapper(lambda execute, *args: queries.append(args) or execute(*args)):
+                response = client.get(url)
+            assert response.status_code == 200, (url, response.status_code)
+            seconds = timeit(lambda: client.get(url), repeat=3)
+            rows.append((name, f"{seconds * 1000:.1f}", len(queries)))
+        report(rows, ["page", "ms", "queries"])
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,109 @@
+"""
+JSON API throughput against the HTML receiver feed.
+
+Seeds N donations, then times reading every donation through
+``/api/v1/donations/`` (cursor pages of --limit rows) and through the HTML
+``/receiver/dashboard/`` page, and compares the API serializer
+(``.values()`` + orjson) with building model instances and encoding them
+with Django's JSON encoder.
+
+    python benchmarks/bench_api.py [--donations 10000] [--limit 500]
+"""
+
+import argparse
+import json
+import time
+
+from _django import report, seed_donations, setup, test_database, timeit
+
+setup()
+
+from django.core.serializers.json import DjangoJSONEncoder  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from portal import api  # noqa: E402
+from portal.models import Donation  # noqa: E402
+
+
+def read_api(client, limit, fields=None):
+    url = f"/api/v1/donations/?limit={limit}" + (f"&fields={fields}" if fields else "")
+    rows = size = 0
+    cursor = None
+    while True:
+        response = client.get(url + (f"&cursor={cursor}" if cursor else ""))
+        size += len(response.content)
+        data = json.loads(response.content)
+        rows += len(data["results"])
+        cursor = data["next"]
+        if not cursor:
+            return rows, size
+
+
+def read_html(client):
+    response = client.get("/receiver/dashboard/")
+    return b"".join(response.streaming_content) if response.streaming else response.content
+
+
+def instances_json(limit):
+    objs = Donation.objects.select_related("donor")[:limit]
+    return json.dumps(
+        [
+            {
+                "id": d.id,
+                "donor": d.donor_id,
+                "donor_username": d.donor.username,
+                "food_type": d.food_type,
+                "quantity": d.quantity,
+                "pickup_location": d.pickup_location,
+                "pickup_time": d.pickup_time,
+                "expiry_date": d.expiry_date,
+                "status": d.status,
+            }
+            for d in objs
+        ],
+        cls=DjangoJSONEncoder,
+    ).encode()
+
+
+def values_json(limit):
+    return api.dumps(list(api.values(Donation.objects.all(), api.DONATION_FIELDS)[:limit]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--donations", type=int, default=10000)
+    parser.add_argument("--limit", type=int, default=500)
+    args = parser.parse_args()
+
+    with test_database():
+        seed_donations(args.donations)
+        client = Client()
+        client.login(username="receiver", password="x")
+
+        rows = []
+        for label, func in (
+            ("api, all fields", lambda: read_api(client, args.limit)),
+            ("api, fields=id,food_type", lambda: read_api(client, args.limit, "id,food_type")),
+            ("html receiver dashboard", lambda: (args.donations, len(read_html(client)))),
+        ):
+            func()
+            start = time.perf_counter()
+            count, size = func()
+            elapsed = time.perf_counter() - start
+            rows.append([label, count, size, f"{elapsed * 1000:.0f}", f"{count / elapsed:,.0f}"])
+        report(rows, ["endpoint", "rows", "bytes", "ms", "rows/s"])
+        print()
+
+        t_values = timeit(lambda: values_json(args.limit))
+        t_instances = timeit(lambda: instances_json(args.limit))
+        report(
+            [
+                ["values() + " + ("orjson" if api.orjson else "json"), f"{t_values * 1000:.2f}"],
+                ["model instances + DjangoJSONEncoder", f"{t_instances * 1000:.2f}"],
+            ],
+            [f"serialize {args.limit} donations", "ms"],
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,115 @@
+"""
+Mirroring the donation list: full re-download vs the change feed.
+
+Seeds ``--donations`` donations, then measures what a partner app pays to
+refresh its copy: paging through ``/api/v1/donations/`` from the start,
+against asking ``/api/v1/changes/`` for what changed since its last token,
+when nothing changed and after ``--edits`` edits.  Also times bulk writes
+with and without the change triggers, the price every write pays.
+
+    python benchmarks/bench_changes.py [--donations 50000] [--edits 100]
+"""
+
+import argparse
+import time
+
+from _django import report, seed_donations, setup, test_database, timeit
+
+setup()
+
+from django.db import connection, transaction  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from portal.models import Donation, User  # noqa: E402
+
+PAGE = 500
+
+
+def fetch_all(client, url, params, cursor_name):
+    """(bytes, requests, last token) for paging through ``url`` to the end."""
+    total, calls = 0, 0
+    while True:
+        response = client.get(url, params)
+        total += len(response.content)
+        calls += 1
+        data = response.json()
+        if not data.get("more", data["next"] is not None):
+            return total, calls, data["next"]
+        params = {**params, cursor_name: data["next"]}
+
+
+def measure(func):
+    start = time.perf_counter()
+    result = func()
+    return result, time.perf_counter() - start
+
+
+def write_cost(donor, count=500):
+    def run():
+        with transaction.atomic():
+            now = timezone.now()
+            created = Donation.objects.bulk_create(
+                Donation(donor=donor, food_type="Bench", quantity="1", pickup_location="x",
+                         pickup_time=now, expiry_date=now.date())
+                for _ in range(count)
+            )
+            Donation.objects.filter(pk__in=[d.pk for d in created]).update(status="Expired")
+            transaction.set_rollback(True)
+
+    return timeit(run)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--donations", type=int, default=50_000)
+    parser.add_argument("--edits", type=int, default=100)
+    args = parser.parse_args()
+
+    with test_database():
+        seed_donations(args.donations)
+        client = Client()
+        client.force_login(User.objects.get(username="receiver"))
+        rows = []
+
+        (size, calls, _), elapsed = measure(
+            lambda: fetch_all(client, reverse("api_donations"), {"limit": PAGE}, "cursor")
+        )
+        rows.append(("full re-download", calls, f"{size / 2**10:.0f}KiB", f"{elapsed * 1000:.1f}ms"))
+        (size, calls, token), elapsed = measure(
+            lambda: fetch_all(client, reverse("api_changes"), {"limit": PAGE}, "since")
+        )
+        rows.append(("change feed, first sync", calls, f"{size / 2**10:.0f}KiB", f"{elapsed * 1000:.1f}ms"))
+
+        def delta():
+            return fetch_all(client, reverse("api_changes"), {"limit": PAGE, "since": token}, "since")
+
+        size, calls, _ = delta()
+        rows.append(("change feed, up to date", calls, f"{size}B", f"{timeit(delta) * 1000:.2f}ms"))
+        edited = Donation.objects.order_by("?").values_list("pk", flat=True)[: args.edits]
+        Donation.objects.filter(pk__in=list(edited)).update(quantity="5 boxes")
+        (size, calls, _), elapsed = measure(delta)
+        rows.append(
+            (f"change feed, {args.edits} edits", calls, f"{size / 2**10:.1f}KiB", f"{elapsed * 1000:.1f}ms")
+        )
+        print(f"{args.donations} donations, pages of {PAGE}")
+        report(rows, ("refresh", "requests", "bytes", "time"))
+
+        donor = User.objects.filter(user_type="donor").first()
+        with_triggers = write_cost(donor)
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE '%_change_%'")
+            names = [name for (name,) in cursor.fetchall()]
+            for name in names:
+                cursor.execute(f"DROP TRIGGER {name}")
+        without = write_cost(donor)
+        print()
+        report(
+            [("with triggers", f"{with_triggers * 1000:.1f}ms"), ("without", f"{without * 1000:.1f}ms")],
+            ("500 inserts + 500-row update", "time"),
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,107 @@
+"""
+Write overhead of the donation event log.
+
+Times the mutating views (create, edit, claim, delete) through the test
+client with the event log on, and with ``events.log`` and
+``events.atomic`` replaced by no-ops, which is what the views did before
+the log existed.  Also reports the average stored event size.
+
+    python benchmarks/bench_events.py [--ops 500] [--rounds 3]
+"""
+
+import argparse
+import contextlib
+import time
+from unittest import mock
+
+from _django import report, setup, test_database
+
+setup(PORTAL_RATE_LIMIT_ENABLED=False)
+
+from django.db.models.functions import Length  # noqa: E402
+from django.db.models import Avg  # noqa: E402
+from django.test import Client  # noqa: E402
+
+from portal import events  # noqa: E402
+from portal.models import Donation, DonationEvent, User  # noqa: E402
+
+DONATION = {
+    "food_type": "Rice",
+    "quantity": "10 plates",
+    "pickup_location": "Main Street",
+    "pickup_time": "2030-01-01T10:00",
+    "expiry_date": "2030-01-02",
+}
+
+
+def client(user):
+    # A fresh client per run, so unread flash messages do not pile up.
+    client = Client()
+    client.force_login(user)
+    return client
+
+
+def run(ops, donor, receiver):
+    """Seconds per call of each view, ``ops`` calls each."""
+    timings = {}
+    donor_client, receiver_client = client(donor), client(receiver)
+
+    def timed(name, calls):
+        start = time.perf_counter()
+        for call in calls:
+            call()
+        timings[name] = (time.perf_counter() - start) / ops
+
+    first = Donation.objects.order_by("-pk").values_list("pk", flat=True).first() or 0
+    timed("create", (lambda: donor_client.post("/donor/dashboard/", DONATION) for _ in range(ops)))
+    ids = list(Donation.objects.filter(pk__gt=first).values_list("pk", flat=True))
+    timed(
+        "edit",
+        (
+            lambda pk=pk: donor_client.post(f"/donation/edit/{pk}/", {**DONATION, "quantity": "12 plates"})
+            for pk in ids
+        ),
+    )
+    timed("claim", (lambda pk=pk: receiver_client.post(f"/donation/{pk}/request/", {"message": "hi"}) for pk in ids))
+    timed("delete", (lambda pk=pk: donor_client.post(f"/donation/delete/{pk}/") for pk in ids))
+    assert not Donation.objects.filter(pk__gt=first).exists()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--ops", type=int, default=500)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    with test_database():
+        donor = User.objects.create_user("donor", password="x", user_type="donor")
+        receiver = User.objects.create_user("receiver", password="x", user_type="receiver")
+
+        run(50, donor, receiver)  # warm up
+        without, logged = {}, {}
+        for _ in range(args.rounds):  # interleaved, best of each
+            with mock.patch.object(events, "log", lambda *args, **kwargs: None), mock.patch.object(
+                events, "atomic", contextlib.nullcontext
+            ):
+                for view, seconds in run(args.ops, donor, receiver).items():
+                    without[view] = min(seconds, without.get(view, seconds))
+            for view, seconds in run(args.ops, donor, receiver).items():
+                logged[view] = min(seconds, logged.get(view, seconds))
+
+        rows = [
+            (
+                view,
+                f"{without[view] * 1e3:.2f}",
+                f"{logged[view] * 1e3:.2f}",
+                f"{(logged[view] - without[view]) * 1e6:+.0f}",
+            )
+            for view in without
+        ]
+        report(rows, ["view", "no log ms", "log ms", "overhead us"])
+        size = DonationEvent.objects.aggregate(avg=Avg(Length("data")))["avg"]
+        print(f"\n{DonationEvent.objects.count()} events, {size:.0f} bytes of data per event on average")
+
+
+if __name__ == "__main__":
+    main()
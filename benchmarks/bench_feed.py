@@ -0,0 +1,74 @@
+"""
+Receiver feed benchmark: streamed vs buffered rendering.
+
+Seeds a throwaway database with N donations and fetches the receiver
+dashboard through the full middleware stack (with compression) in both
+modes, reporting time to first byte, total time, bytes on the wire and peak
+Python memory.  Streaming should keep TTFB and peak memory flat as N grows.
+
+    python benchmarks/bench_feed.py [--sizes 1000 10000 50000] [--encoding gzip]
+"""
+
+import argparse
+import time
+import tracemalloc
+
+from _django import report, seed_donations, setup, test_database
+
+setup()
+
+from django.test import Client, override_settings  # noqa: E402
+
+
+def fetch(client, encoding, measure_memory):
+    if measure_memory:
+        tracemalloc.start()
+    start = time.perf_counter()
+    response = client.get("/receiver/dashboard/", HTTP_ACCEPT_ENCODING=encoding)
+    if response.streaming:
+        chunks = iter(response.streaming_content)
+        size = len(next(chunks))
+        ttfb = time.perf_counter() - start
+        size += sum(len(c) for c in chunks)
+    else:
+        ttfb = time.perf_counter() - start
+        size = len(response.content)
+    total = time.perf_counter() - start
+    peak = 0
+    if measure_memory:
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+    response.close()
+    return ttfb, total, size, peak
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[1000, 10000, 50000])
+    parser.add_argument("--encoding", default="gzip", help="Accept-Encoding header to send")
+    args = parser.parse_args()
+
+    rows = []
+    with test_database():
+        client = Client()
+        for n in sorted(args.sizes):
+            seed_donations(n)
+            client.login(username="receiver", password="x")
+            for streaming in (False, True):
+                with override_settings(PORTAL_STREAM_FEEDS=streaming):
+                    fetch(client, args.encoding, False)  # warm up
+                    ttfb, total, size, _ = fetch(client, args.encoding, False)
+                    *_, peak = fetch(client, args.encoding, True)
+                rows.append([
+                    n,
+                    "stream" if streaming else "buffer",
+                    f"{ttfb * 1000:.1f}",
+                    f"{total * 1000:.0f}",
+                    size,
+                    f"{peak / 2**20:.1f}",
+                ])
+    report(rows, ["donations", "mode", "ttfb ms", "total ms", "bytes", "peak MiB"])
+
+
+if __name__ == "__main__":
+    main()
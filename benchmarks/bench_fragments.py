@@ -0,0 +1,107 @@
+"""
+Bytes and server time per donor dashboard action, full page vs fragment.
+
+For a donor with ``--donations`` donations (each with one request), times
+posting, editing and deleting a donation the old way (POST, redirect,
+re-render the whole dashboard) and the fragment way (one POST answered with
+just the changed HTML, as fragments.js sends it).
+
+    python benchmarks/bench_fragments.py [--donations 200] [--ops 50]
+"""
+
+import argparse
+import time
+
+from _django import report, setup, test_database
+
+setup()
+
+from django.test import Client  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from portal.models import Donation, Request, User  # noqa: E402
+
+DONATION = {
+    "food_type": "Rice",
+    "quantity": "10 plates",
+    "pickup_location": "Main Street",
+    "pickup_time": "2030-01-01T10:00",
+    "expiry_date": "2030-01-02",
+}
+FRAGMENT = {"HX-Request": "true"}
+
+
+def seed(donor, count):
+    receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+    now = timezone.now()
+    donations = Donation.objects.bulk_create(
+        Donation(
+            donor=donor, food_type=f"Meal {i}", quantity="1", pickup_location="Main Street",
+            pickup_time=now, expiry_date=now.date(),
+        )
+        for i in range(count)
+    )
+    Request.objects.bulk_create(
+        Request(donation=donation, requester=receiver, message="Please") for donation in donations
+    )
+
+
+def measure(client, calls):
+    """Mean (bytes, seconds) per action; each call returns its responses."""
+    total_bytes, start = 0, time.perf_counter()
+    for call in calls:
+        total_bytes += sum(len(response.content) for response in call())
+    return total_bytes / len(calls), (time.perf_counter() - start) / len(calls)
+
+
+def full(client, method, url, data=None):
+    def call():
+        response = getattr(client, method)(url, data or {})
+        return [response, client.get(response.url)]
+
+    return call
+
+
+def fragment(client, method, url, data=None):
+    return lambda: [getattr(client, method)(url, data or {}, headers=FRAGMENT)]
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--donations", type=int, default=200)
+    parser.add_argument("--ops", type=int, default=50)
+    args = parser.parse_args()
+
+    with test_database():
+        donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        seed(donor, args.donations)
+        client = Client()
+        client.force_login(donor)
+        dashboard = reverse("donor_dashboard")
+        rows = []
+        for name, style in (("full page", full), ("fragment", fragment)):
+            timings = {}
+            first = Donation.objects.order_by("-pk").values_list("pk", flat=True).first()
+            timings["post"] = measure(
+                client, [style(client, "post", dashboard, DONATION) for _ in range(args.ops)]
+            )
+            ids = list(Donation.objects.filter(pk__gt=first).values_list("pk", flat=True))
+            timings["edit"] = measure(
+                client,
+                [
+                    style(client, "post", reverse("edit_donation", args=[pk]), {**DONATION, "quantity": "9"})
+                    for pk in ids
+                ],
+            )
+            timings["delete"] = measure(
+                client, [style(client, "post", reverse("delete_donation", args=[pk])) for pk in ids]
+            )
+            for action, (size, seconds) in timings.items():
+                rows.append((action, name, f"{size / 1024:.1f} KiB", f"{seconds * 1000:.2f}ms"))
+        print(f"{args.donations} donations, {args.ops} actions each")
+        report(sorted(rows, key=lambda row: row[0]), ("action", "style", "bytes", "server time"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,60 @@
+"""
+Server time per GET of the pages that are the same for every visitor,
+without and with the page cache (portal.pagecache).
+
+Times ``--requests`` GETs of the home, signup and login pages, first as an
+anonymous visitor with no session (answered by PageCacheMiddleware before
+the session, CSRF and auth middleware) and then as a logged-in receiver
+(answered by the view's decorator, per role).
+
+    python benchmarks/bench_page_cache.py [--requests 500]
+"""
+
+import argparse
+
+from _django import report, setup, test_database, timeit
+
+setup()
+
+from django.test import Client, override_settings  # noqa: E402
+from django.urls import reverse  # noqa: E402
+
+from portal import pagecache  # noqa: E402
+from portal.models import User  # noqa: E402
+
+PAGES = ("home", "donor_signup", "donorLogin")
+
+
+def measure(user, url, requests, timeout):
+    with override_settings(PORTAL_PAGE_CACHE_TIMEOUT=timeout):
+        pagecache.store.clear()
+        # A new client loads the middleware under the current settings.
+        client = Client()
+        if user is not None:
+            client.force_login(user)
+        client.get(url)
+        return timeit(lambda: client.get(url), repeat=3, number=requests)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=500)
+    args = parser.parse_args()
+
+    with test_database():
+        receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+        rows = []
+        for who, user in (("anonymous", None), ("receiver", receiver)):
+            for name in PAGES:
+                url = reverse(name)
+                uncached = measure(user, url, args.requests, 0)
+                cached = measure(user, url, args.requests, 300)
+                rows.append((
+                    name, who, f"{uncached * 1000:.3f}ms", f"{cached * 1000:.3f}ms", f"{uncached / cached:.1f}x",
+                ))
+        print(f"{args.requests} GETs per page, best of 3")
+        report(rows, ("page", "visitor", "uncached", "cached", "speed-up"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,146 @@
+"""
+Donation photo uploads and the weight of the receiver feed.
+
+Uploads ``--uploads`` camera-sized JPEGs through the photo view, first the
+way the portal does it (the file is spooled to disk and stored; thumbnails
+are left to the process pool) and then rendering the thumbnails inside the
+request, and reports requests per second.  Then renders the thumbnails of
+``--donations`` photographed donations and compares the receiver feed's
+weight with thumbnails against linking the originals, in total and for the
+first screen of cards (the rest are loaded lazily, as they scroll into
+view).
+
+    python benchmarks/bench_photos.py [--uploads 20] [--donations 60]
+"""
+
+import argparse
+import os
+import random
+import tempfile
+import time
+from io import BytesIO
+
+from _django import report, setup, test_database
+
+media = tempfile.mkdtemp()
+setup(MEDIA_ROOT=media, PORTAL_THUMBNAIL_WORKERS=0)
+
+from django.conf import settings  # noqa: E402
+from django.core.files.uploadedfile import SimpleUploadedFile  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.urls import reverse  # noqa: E402
+from django.utils import timezone  # noqa: E402
+from PIL import Image  # noqa: E402
+
+from portal import photos, thumbnails  # noqa: E402
+from portal.models import Donation, DonationPhoto, User  # noqa: E402
+
+FIRST_SCREEN = 6
+
+
+def camera_jpeg(rng, width=4000, height=3000):
+    # Noise over a colour gradient: compresses about as badly as a photo.
+    image = Image.effect_noise((width // 4, height // 4), 40).convert("RGB").resize((width, height))
+    tint = Image.new("RGB", (width, height), tuple(rng.randrange(256) for _ in range(3)))
+    buffer = BytesIO()
+    Image.blend(image, tint, 0.5).save(buffer, "JPEG", quality=92)
+    return buffer.getvalue()
+
+
+def upload_all(client, donations, content, render_inline):
+    start = time.perf_counter()
+    for donation in donations:
+        client.post(
+            reverse("donation_photos", args=[donation.pk]),
+            {"photo": SimpleUploadedFile("photo.jpg", content)},
+        )
+        if render_inline:
+            photo = DonationPhoto.objects.filter(donation=donation).latest("pk")
+            photos.finish(photo.pk, _Done(thumbnails.render(*photos.render_job(photo))))
+    return time.perf_counter() - start
+
+
+class _Done:
+    """A finished future, for recording an inline render like a pooled one."""
+
+    def __init__(self, result):
+        self._result = result
+
+    def result(self):
+        return self._result
+
+
+def make_donations(donor, count):
+    now = timezone.now()
+    return Donation.objects.bulk_create(
+        Donation(
+            donor=donor, food_type=f"Meal {i}", quantity="1", pickup_location="Main Street",
+            pickup_time=now, expiry_date=now.date(),
+        )
+        for i in range(count)
+    )
+
+
+def image_bytes(urls):
+    return sum(
+        os.path.getsize(os.path.join(media, url[len(settings.MEDIA_URL):].lstrip("/"))) for url in urls
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--uploads", type=int, default=20)
+    parser.add_argument("--donations", type=int, default=60)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with test_database():
+        donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        client = Client()
+        client.force_login(donor)
+
+        content = camera_jpeg(rng)
+        rows = []
+        for label, inline in (("spooled, thumbnails in pool", False), ("thumbnails in request", True)):
+            donations = make_donations(donor, args.uploads)
+            elapsed = upload_all(client, donations, content, inline)
+            rows.append((
+                label,
+                f"{args.uploads / elapsed:.1f}/s",
+                f"{args.uploads * len(content) / elapsed / 2**20:.1f}MiB/s",
+            ))
+        print(f"{args.uploads} uploads of a {len(content) / 2**20:.1f}MiB JPEG")
+        report(rows, ("upload", "requests", "throughput"))
+
+        DonationPhoto.objects.all().delete()
+        Donation.objects.all().delete()
+        for donation in make_donations(donor, args.donations):
+            client.post(
+                reverse("donation_photos", args=[donation.pk]),
+                {"photo": SimpleUploadedFile("photo.jpg", camera_jpeg(rng, 1600, 1200))},
+            )
+        start = time.perf_counter()
+        photos.render_pending()
+        rendered = time.perf_counter() - start
+
+        receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+        client.force_login(receiver)
+        html = len(b"".join(client.get(reverse("receiver_dashboard")).streaming_content))
+        ready = list(DonationPhoto.objects.order_by("donation_id"))
+        originals = [photo.image.url for photo in ready]
+        webp = [photos.thumbnail_urls(photo)["webp"].split(" ")[0] for photo in ready]
+        jpeg = [photos.thumbnail_urls(photo)["src"] for photo in ready]
+        rows = [
+            (
+                name,
+                f"{(html + image_bytes(urls)) / 2**10:.0f}KiB",
+                f"{(html + image_bytes(urls[:FIRST_SCREEN])) / 2**10:.0f}KiB",
+            )
+            for name, urls in (("originals", originals), ("WebP thumbnails", webp), ("JPEG thumbnails", jpeg))
+        ]
+        print(f"\n{args.donations} donations with a photo, thumbnails rendered in {rendered:.2f}s")
+        report(rows, ("feed images", "page weight", f"first {FIRST_SCREEN} cards"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Cost of posting the upcoming occurrences of recurring donations.
+
+Seeds ``--templates`` recurring donations with a mix of daily and weekly
+schedules, then times ``recurring.materialize`` for a week ahead at a few
+batch sizes, with the peak memory Python allocated during the run
+(tracemalloc).  A batch as large as the table is the unchunked baseline.
+The last row is the next run of the day, when everything is already
+generated.
+
+    python benchmarks/bench_recurring.py [--templates 20000]
+"""
+
+import argparse
+import datetime
+import random
+import time
+import tracemalloc
+
+from _django import report, setup, test_database
+
+setup()
+
+from django.db import transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from portal import recurring  # noqa: E402
+from portal.models import RecurringDonation, User  # noqa: E402
+
+RULES = ("FREQ=DAILY", "FREQ=WEEKLY;BYDAY=MO,WE,FR", "FREQ=WEEKLY;BYDAY=FR", "FREQ=DAILY;INTERVAL=2")
+
+
+def seed(total, rng):
+    donors = User.objects.bulk_create(
+        User(username=f"donor{i}", user_type="donor") for i in range(max(total // 20, 1))
+    )
+    today = timezone.localdate()
+    RecurringDonation.objects.bulk_create(
+        (
+            RecurringDonation(
+                donor=donors[i % len(donors)],
+                food_type=f"food {i % 500}",
+                quantity="10",
+                pickup_location=f"ward {i % 200}",
+                rule=rng.choice(RULES),
+                pickup_time=datetime.time(rng.randrange(8, 21)),
+                starts_on=today - datetime.timedelta(days=rng.randrange(30)),
+            )
+            for i in range(total)
+        ),
+        batch_size=2000,
+    )
+
+
+def measure(batch_size, rollback=True):
+    tracemalloc.start()
+    start = time.perf_counter()
+    with transaction.atomic():
+        created = recurring.materialize(batch_size=batch_size)
+        transaction.set_rollback(rollback)
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return created, elapsed, peak
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--templates", type=int, default=20_000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with test_database():
+        seed(args.templates, rng)
+        rows = []
+        for batch_size in (500, 2000, args.templates):
+            created, elapsed, peak = measure(batch_size)
+            rows.append((batch_size, created, f"{elapsed:.2f}s", f"{peak / 2**20:.1f}MiB"))
+        measure(recurring.DEFAULT_BATCH_SIZE, rollback=False)
+        created, elapsed, peak = measure(recurring.DEFAULT_BATCH_SIZE)
+        rows.append(("rerun", created, f"{elapsed:.2f}s", f"{peak / 2**20:.1f}MiB"))
+        print(f"{args.templates} recurring donations, {recurring.DEFAULT_HORIZON} days ahead")
+        report(rows, ("batch size", "created", "time", "peak memory"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Pickup route planning time and route length.
+
+Scatters ``--sizes`` claimed donations over a 30 km city across a day of
+pickups and times ``routes.plan`` with routes of ``--max-stops`` stops,
+reporting the total driving distance against visiting each route's stops
+in the order they were claimed and against nearest neighbour alone.  A
+last row plans a single route through ``--single`` stops, where the
+distance matrix and 2-opt work on everything at once.
+
+    python benchmarks/bench_routes.py [--sizes 500 2000 5000] [--max-stops 25] [--single 1000]
+"""
+
+import argparse
+import datetime
+import random
+import time
+
+from _django import report, setup
+
+setup()
+
+from django.utils import timezone  # noqa: E402
+
+from portal import routes  # noqa: E402
+from portal.models import Donation  # noqa: E402
+
+np = routes.np
+DEPOT = (12.97, 77.59)
+
+
+def stops(count, rng):
+    start = timezone.now().replace(hour=8, minute=0, second=0, microsecond=0)
+    return [
+        Donation(
+            pk=i,
+            latitude=DEPOT[0] + rng.uniform(-0.135, 0.135),
+            longitude=DEPOT[1] + rng.uniform(-0.135, 0.135),
+            pickup_time=start + datetime.timedelta(minutes=rng.randrange(12 * 60)),
+        )
+        for i in range(count)
+    ]
+
+
+def baselines(planned):
+    """Total km visiting each route's stops as claimed (by id), and by nearest neighbour only."""
+    claimed = greedy = 0.0
+    for route in planned:
+        by_id = sorted(route.stops, key=lambda stop: stop.pk)
+        points = [DEPOT] + [(stop.latitude, stop.longitude) for stop in by_id]
+        matrix = routes.distance_matrix(points)
+        claimed += routes.tour_length(matrix, np.array([*range(len(points)), 0]))
+        greedy += routes.tour_length(matrix, routes.nearest_neighbour(matrix))
+    return claimed, greedy
+
+
+def measure(donations, max_stops, window=routes.DEFAULT_WINDOW):
+    start = time.perf_counter()
+    planned = routes.plan(donations, depot=DEPOT, max_stops=max_stops, window=window)
+    elapsed = time.perf_counter() - start
+    claimed, greedy = baselines(planned)
+    planned_km = sum(route.distance for route in planned)
+    return (
+        len(donations),
+        len(planned),
+        f"{elapsed:.2f}s",
+        f"{claimed:.0f}",
+        f"{greedy:.0f}",
+        f"{planned_km:.0f} ({1 - planned_km / greedy:.1%} shorter)",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--sizes", type=int, nargs="+", default=[500, 2000, 5000])
+    parser.add_argument("--max-stops", type=int, default=routes.DEFAULT_MAX_STOPS)
+    parser.add_argument("--single", type=int, default=1000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    rows = [measure(stops(size, rng), args.max_stops) for size in args.sizes]
+    rows.append(measure(stops(args.single, rng), args.single, window=datetime.timedelta(days=1)))
+    report(rows, ("stops", "routes", "plan time", "as claimed km", "nearest neighbour km", "2-opt km"))
+
+
+if __name__ == "__main__":
+    main()
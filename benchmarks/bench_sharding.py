@@ -0,0 +1,154 @@
+"""
+Write throughput of concurrent donors with 1, 2, 4, ... regional shards.
+
+Every run starts ``--writers`` processes, one per region, each posting
+``--donations`` donations the way the portal does (one ``events.atomic()``
+transaction per donation: the row, its event and its change-feed entry).
+The regions share ``--shards`` SQLite files between them: with one shard
+every writer queues for the same write lock; with one shard per region
+none waits for another.  Databases use the production settings (WAL,
+synchronous=NORMAL, IMMEDIATE transactions) unless ``--durable`` asks for
+synchronous=FULL, where every commit waits for the disk.
+
+Besides throughput, each writer times how long ``BEGIN IMMEDIATE`` waited
+for another writer's lock and how long each donation took end to end.  On
+a machine with fewer cores than writers the processes also queue for the
+CPU, which caps throughput whatever the shards; the lock wait shows what
+sharding took off each write.
+
+    python benchmarks/bench_sharding.py [--writers 4] [--shards 1 2 4] [--donations 500] [--durable]
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+from _django import ROOT, report, setup
+
+
+def environment(directory, shards, writers, durable):
+    pragmas = "journal_mode=WAL,synchronous=" + ("FULL" if durable else "NORMAL")
+    return {
+        **os.environ,
+        "DJANGO_PROFILE": "production",
+        "DJANGO_SECRET_KEY": "bench",
+        "DJANGO_DB_PATH": os.path.join(directory, "default.sqlite3"),
+        "DJANGO_DB_PRAGMAS": pragmas,
+        "DJANGO_DB_TIMEOUT": "60",
+        # Regions r0..rN share the shards round-robin: with one shard
+        # per region each region has a file of its own.
+        "DJANGO_DB_SHARDS": ",".join(
+            f"r{shard}={os.path.join(directory, f'r{shard}.sqlite3')}" for shard in range(shards)
+        ),
+        "BENCH_REGIONS": ",".join(f"r{writer % shards}" for writer in range(writers)),
+    }
+
+
+def prepare():
+    setup()
+    from django.core.management import call_command
+
+    from portal.models import User
+
+    call_command("migrate", verbosity=0)
+    call_command("setup_shards", verbosity=0, stdout=open(os.devnull, "w"))
+    for writer, region in enumerate(os.environ["BENCH_REGIONS"].split(",")):
+        User.objects.create_user(f"donor{writer}", user_type="donor", region=region)
+
+
+def write(writer, count, start_at):
+    setup()
+    from django.utils import timezone
+
+    from portal import events, sharding
+    from portal.models import Donation, DonationEvent, User
+
+    donor = User.objects.get(username=f"donor{writer}")
+    now = timezone.now()
+    waits, latencies = [], []
+    time.sleep(max(0, start_at - time.time()))
+    with sharding.region(donor.region):
+        for i in range(count):
+            start = time.perf_counter()
+            block = events.atomic()
+            # Entering the outermost block runs BEGIN IMMEDIATE, which
+            # waits for any other writer of the same database.
+            block.__enter__()
+            waits.append(time.perf_counter() - start)
+            try:
+                donation = Donation.objects.create(
+                    donor=donor, food_type=f"Meal {i}", quantity="10 boxes",
+                    pickup_location="Community hall", pickup_time=now, expiry_date=now.date(),
+                )
+                events.log(DonationEvent.CREATED, donation.pk, events.snapshot(donation), actor=donor)
+            finally:
+                block.__exit__(None, None, None)
+            latencies.append(time.perf_counter() - start)
+    print(json.dumps({"end": time.time(), "waits": waits, "latencies": latencies}))
+
+
+def run(shards, args):
+    with tempfile.TemporaryDirectory() as directory:
+        env = environment(directory, shards, args.writers, args.durable)
+        script = [sys.executable, __file__]
+        subprocess.run([*script, "--prepare"], env=env, cwd=ROOT, check=True)
+        # Writers start together once every process has loaded Django.
+        start_at = time.time() + 3 + 0.5 * args.writers
+        workers = [
+            subprocess.Popen(
+                [*script, "--write", str(writer), "--donations", str(args.donations), "--start-at", str(start_at)],
+                env=env, cwd=ROOT, stdout=subprocess.PIPE, text=True,
+            )
+            for writer in range(args.writers)
+        ]
+        ends, waits, latencies = [], [], []
+        for worker in workers:
+            out, _ = worker.communicate()
+            if worker.returncode:
+                raise SystemExit(f"writer failed with {worker.returncode}")
+            result = json.loads(out.strip().splitlines()[-1])
+            ends.append(result["end"])
+            waits += result["waits"]
+            latencies += result["latencies"]
+    elapsed = max(ends) - start_at
+    total = args.writers * args.donations
+    latencies.sort()
+    return (
+        shards,
+        total,
+        f"{elapsed:.2f}s",
+        f"{total / elapsed:.0f}/s",
+        f"{sum(waits) / len(waits) * 1000:.2f}ms",
+        f"{latencies[int(len(latencies) * 0.99)] * 1000:.1f}ms",
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--writers", type=int, default=4)
+    parser.add_argument("--shards", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--donations", type=int, default=500)
+    parser.add_argument("--durable", action="store_true")
+    parser.add_argument("--prepare", action="store_true", help=argparse.SUPPRESS)
+    parser.add_argument("--write", type=int, help=argparse.SUPPRESS)
+    parser.add_argument("--start-at", type=float, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.prepare:
+        return prepare()
+    if args.write is not None:
+        return write(args.write, args.donations, args.start_at)
+
+    rows = [run(shards, args) for shards in args.shards]
+    print(
+        f"{args.writers} writers, {args.donations} donations each, "
+        f"synchronous={'FULL' if args.durable else 'NORMAL'}, {os.cpu_count()} CPUs"
+    )
+    report(rows, ("shards", "donations", "time", "throughput", "lock wait (mean)", "latency (p99)"))
+
+
+if __name__ == "__main__":
+    main()
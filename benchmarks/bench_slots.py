@@ -0,0 +1,157 @@
+"""
+Pickup slot search and booking.
+
+Seeds N donations with --slots pickup slots each, spread over a week, and
+fills --full of them.  Then times:
+
+- finding the first 50 free slots after a moment, overall and at one
+  pickup location (portal.pickups.free_slots),
+- booking through portal.pickups.book, overlap check included,
+- --threads receivers racing for one slot of capacity --capacity; the slot
+  must end up exactly full.
+
+The test database is a file, so the threads really contend for it.
+
+    python benchmarks/bench_slots.py [--donations 20000] [--slots 8] [--full 0.9]
+"""
+
+import argparse
+import datetime
+import random
+import tempfile
+import threading
+from pathlib import Path
+
+from _django import report, seed_donations, setup, test_database, timeit
+
+TMP = tempfile.mkdtemp()
+setup(
+    DATABASES={
+        "default": {
+            "ENGINE": "django.db.backends.sqlite3",
+            "NAME": str(Path(TMP) / "bench.sqlite3"),
+            "OPTIONS": {"transaction_mode": "IMMEDIATE", "timeout": 30},
+            "TEST": {"NAME": str(Path(TMP) / "test_bench.sqlite3")},
+        }
+    }
+)
+
+from django.db import IntegrityError, connection, transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from portal import pickups  # noqa: E402
+from portal.models import Donation, PickupSlot, Request, User  # noqa: E402
+
+
+def seed_slots(per_donation, full):
+    start = timezone.now().replace(minute=0, second=0, microsecond=0) + datetime.timedelta(hours=1)
+    slots = []
+    for i, pk in enumerate(Donation.objects.values_list("pk", flat=True).iterator()):
+        first = start + datetime.timedelta(hours=i % 168)
+        for k in range(per_donation):
+            slot_start = first + datetime.timedelta(minutes=30 * k)
+            booked = 1 if random.random() < full else 0
+            slots.append(PickupSlot(
+                donation_id=pk, start=slot_start, end=slot_start + datetime.timedelta(minutes=30),
+                capacity=1, booked=booked,
+            ))
+    PickupSlot.objects.bulk_create(slots, batch_size=5000)
+    return start
+
+
+def race(slot, threads):
+    receivers = User.objects.bulk_create(
+        User(username=f"racer{slot.pk}-{i}", user_type="receiver") for i in range(threads)
+    )
+    barrier = threading.Barrier(threads)
+    outcomes = []
+
+    def attempt(receiver):
+        barrier.wait()
+        try:
+            with transaction.atomic():
+                claim = Request.objects.create(donation_id=slot.donation_id, requester=receiver, message="")
+                pickups.book(slot.pk, receiver, claim)
+            outcomes.append("booked")
+        except pickups.SlotError:
+            outcomes.append("full")
+        except Exception as e:  # noqa: BLE001 - report whatever the database raised
+            outcomes.append(type(e).__name__)
+        finally:
+            connection.close()
+
+    workers = [threading.Thread(target=attempt, args=(r,)) for r in receivers]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join()
+    slot.refresh_from_db()
+    return outcomes, slot.booked
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--donations", type=int, default=20000)
+    parser.add_argument("--slots", type=int, default=8)
+    parser.add_argument("--full", type=float, default=0.9)
+    parser.add_argument("--threads", type=int, default=16)
+    parser.add_argument("--capacity", type=int, default=3)
+    args = parser.parse_args()
+    random.seed(0)
+
+    with test_database():
+        seed_donations(args.donations)
+        for i in range(50):
+            Donation.objects.filter(pk__gt=i * args.donations // 50).update(pickup_location=f"Location {i}")
+        start = seed_slots(args.slots, args.full)
+        total = PickupSlot.objects.count()
+        print(f"{total} slots, {PickupSlot.objects.filter(booked=0).count()} free\n")
+
+        moment = start + datetime.timedelta(days=3)
+        rows = [
+            ("first 50 free", timeit(lambda: list(pickups.free_slots(moment)[:50]), repeat=20)),
+            (
+                "first 50 free at a location",
+                timeit(lambda: list(pickups.free_slots(moment, pickup_location="Location 7")[:50]), repeat=20),
+            ),
+            (
+                "free in a 1h window",
+                timeit(lambda: list(pickups.free_slots(moment, moment + datetime.timedelta(hours=1))), repeat=20),
+            ),
+        ]
+
+        receivers = User.objects.bulk_create(
+            User(username=f"booker{i}", user_type="receiver") for i in range(200)
+        )
+        free = list(PickupSlot.objects.filter(booked=0).values_list("pk", "donation_id")[:2000])
+        random.shuffle(free)
+
+        def book_all():
+            booked = 0
+            for i, (slot_id, donation_id) in enumerate(free):
+                receiver = receivers[i % len(receivers)]
+                try:
+                    with transaction.atomic():
+                        claim = Request.objects.create(donation_id=donation_id, requester=receiver, message="")
+                        pickups.book(slot_id, receiver, claim)
+                    booked += 1
+                except (pickups.SlotError, IntegrityError):
+                    pass  # overlapping, or a second slot of the same donation
+            return booked
+
+        begin = timezone.now()
+        booked = book_all()
+        seconds = (timezone.now() - begin).total_seconds()
+        rows.append((f"book ({booked} of {len(free)} attempts fit)", seconds / len(free)))
+        report([(name, f"{s * 1e3:.2f}") for name, s in rows], ["operation", "ms"])
+
+        slot = PickupSlot.objects.filter(booked=0).first()
+        PickupSlot.objects.filter(pk=slot.pk).update(capacity=args.capacity)
+        outcomes, final = race(slot, args.threads)
+        counts = {outcome: outcomes.count(outcome) for outcome in sorted(set(outcomes))}
+        print(f"\n{args.threads} threads racing for a slot of capacity {args.capacity}: {counts}, booked={final}")
+        assert final == counts.get("booked", 0) <= args.capacity
+
+
+if __name__ == "__main__":
+    main()
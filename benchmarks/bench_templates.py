@@ -0,0 +1,129 @@
+"""
+Template rendering micro-benchmark.
+
+For every page template, measures the render time with the cached loader
+(compile once, render many) against a plain loader that re-reads and
+re-compiles the template chain on each render, and reports the response size.
+With ``--baseline REV`` the page as it existed at that git revision is
+rendered with the same context to show the bytes saved per response.
+
+    python benchmarks/bench_templates.py [--donations 50] [--baseline REV]
+"""
+
+import argparse
+import datetime
+import subprocess
+
+from _django import ROOT, report, setup, timeit
+
+setup()
+
+from django.middleware.csrf import get_token  # noqa: E402
+from django.template import Engine, RequestContext  # noqa: E402
+from django.template.backends.django import DjangoTemplates  # noqa: E402
+from django.template import engines  # noqa: E402
+from django.test import RequestFactory  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from portal.forms import (  # noqa: E402
+    DonationForm,
+    DonorLoginForm,
+    DonorSignupForm,
+    ReceiverLoginForm,
+    ReceiverSignupForm,
+)
+from portal.models import Donation, Donor, User  # noqa: E402
+
+
+DONOR = User(id=1, username="bakery", email="bakery@example.com", user_type="donor")
+
+
+def page_contexts(n):
+    donor = DONOR
+    donations = []
+    for i in range(1, n + 1):
+        d = Donation(
+            id=i,
+            donor=donor,
+            food_type=f"Bread batch {i}",
+            quantity="10 loaves",
+            pickup_location="12 Market Street",
+            pickup_time=timezone.now(),
+            expiry_date=datetime.date.today(),
+        )
+        d.donor_profile = Donor(user=donor, mobile_number="5550100")
+        donations.append(d)
+    return {
+        "home.html": {},
+        "donorLogin.html": {"form": DonorLoginForm()},
+        "RecieverLogin.html": {"form": ReceiverLoginForm()},
+        "donor_signup.html": {"form": DonorSignupForm()},
+        "receiver_signup.html": {"form": ReceiverSignupForm()},
+        "donor_dashboard.html": {"form": DonationForm(), "donations": donations, "requests": []},
+        "edit_donation.html": {"form": DonationForm(instance=donations[0])},
+        "delete_donation.html": {"donation": donations[0]},
+        "receiver_dashboard.html": {"donations": donations},
+    }
+
+
+def uncached_engine(engine):
+    return Engine(
+        dirs=engine.dirs,
+        app_dirs=False,
+        loaders=[
+            "django.template.loaders.filesystem.Loader",
+            "django.template.loaders.app_directories.Loader",
+        ],
+        context_processors=engine.context_processors,
+        builtins=engine.builtins,
+        libraries=engine.libraries,
+    )
+
+
+def baseline_source(rev, name):
+    try:
+        return subprocess.run(
+            ["git", "show", f"{rev}:templates/{name}"],
+            cwd=ROOT, capture_output=True, text=True, check=True,
+        ).stdout
+    except subprocess.CalledProcessError:
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n\n")[0])
+    parser.add_argument("--donations", type=int, default=50)
+    parser.add_argument("--baseline", help="git revision to compare response size against")
+    parser.add_argument("--number", type=int, default=200)
+    args = parser.parse_args()
+
+    backend = next(e for e in engines.all() if isinstance(e, DjangoTemplates))
+    cached, plain = backend.engine, uncached_engine(backend.engine)
+    request = RequestFactory().get("/")
+    request.user = DONOR
+    get_token(request)
+
+    rows = []
+    for name, context in page_contexts(args.donations).items():
+        def render(engine):
+            return engine.get_template(name).render(RequestContext(request, context))
+
+        render(cached)  # warm the cache
+        size = len(render(cached).encode())
+        t_cached = timeit(lambda: render(cached), number=args.number)
+        t_plain = timeit(lambda: render(plain), number=args.number)
+        row = [name, f"{t_plain * 1e6:.0f}", f"{t_cached * 1e6:.0f}", f"{t_plain / t_cached:.1f}x", size]
+        if args.baseline:
+            source = baseline_source(args.baseline, name)
+            old = len(plain.from_string(source).render(RequestContext(request, context)).encode()) if source else None
+            row.append(old - size if old is not None else "n/a")
+        rows.append(row)
+
+    headers = ["template", "uncached us", "cached us", "speedup", "bytes"]
+    if args.baseline:
+        headers.append(f"bytes saved vs {args.baseline}")
+    report(rows, headers)
+
+
+if __name__ == "__main__":
+    main()
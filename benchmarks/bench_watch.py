@@ -0,0 +1,119 @@
+"""
+Cost of matching new donations against receivers' saved searches.
+
+Seeds ``--searches`` saved searches over a vocabulary of food words and
+pickup locations, then times ``watch.match`` for a single donation and for
+a bulk import of 500, against the naive approach of loading every saved
+search and checking it.
+
+    python benchmarks/bench_watch.py [--searches 100000]
+"""
+
+import argparse
+import random
+
+from _django import report, setup, test_database, timeit
+
+setup()
+
+from django.db import transaction  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from portal import watch  # noqa: E402
+from portal.models import Donation, SavedSearch, User, WatchAlert  # noqa: E402
+
+FOODS = [f"food{i}" for i in range(2000)]
+LOCATIONS = [f"ward {i}" for i in range(200)]
+
+
+def seed(total, rng):
+    receivers = User.objects.bulk_create(
+        User(username=f"receiver{i}", user_type="receiver") for i in range(total // 10)
+    )
+    searches = []
+    for i in range(total):
+        terms = sorted(rng.sample(FOODS, rng.choice((1, 1, 2))))
+        searches.append(
+            SavedSearch(
+                receiver=receivers[i % len(receivers)],
+                name=f"search {i}",
+                terms=" ".join(terms),
+                location=rng.choice(LOCATIONS) if rng.random() < 0.8 else "",
+                min_days_left=rng.choice((None, 1, 3)),
+                token=max(terms, key=lambda term: (len(term), term)) if terms else "",
+            )
+        )
+    SavedSearch.objects.bulk_create(searches, batch_size=2000)
+
+
+def donations(count, donor, rng):
+    now = timezone.now()
+    return Donation.objects.bulk_create(
+        Donation(
+            donor=donor,
+            food_type=" ".join(rng.sample(FOODS, 2)),
+            quantity="1",
+            pickup_location=rng.choice(LOCATIONS).title(),
+            pickup_time=now,
+            expiry_date=(now + timezone.timedelta(days=2)).date(),
+        )
+        for _ in range(count)
+    )
+
+
+def naive(batch):
+    today = timezone.localdate()
+    keys = [
+        (
+            set(watch.words(donation.food_type)), watch.normalise_location(donation.pickup_location),
+            watch.coordinates(donation), donation,
+        )
+        for donation in batch
+    ]
+    alerts = []
+    for search in SavedSearch.objects.only(
+        "terms", "location", "min_days_left", "token", "latitude", "longitude", "radius_km"
+    ):
+        for food_words, location, point, donation in keys:
+            if watch.matches(search, food_words, location, point, donation.expiry_date, today):
+                alerts.append(WatchAlert(search=search, donation=donation))
+    WatchAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+    return len(alerts)
+
+
+def timed(func, batch, repeat=5):
+    def run():
+        with transaction.atomic():
+            func(batch)
+            transaction.set_rollback(True)
+
+    return timeit(run, repeat=repeat)
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--searches", type=int, default=100_000)
+    args = parser.parse_args()
+    rng = random.Random(1)
+
+    with test_database():
+        seed(args.searches, rng)
+        donor = User.objects.create_user("donor", user_type="donor")
+        rows = []
+        for size in (1, 500):
+            batch = donations(size, donor, rng)
+            with transaction.atomic():
+                alerts = watch.match(batch)
+                transaction.set_rollback(True)
+            rows.append((
+                size,
+                alerts,
+                f"{timed(watch.match, batch) * 1000:.2f}ms",
+                f"{timed(naive, batch, repeat=1) * 1000:.2f}ms",
+            ))
+        print(f"{args.searches} saved searches")
+        report(rows, ("donations", "alerts", "indexed", "scan all searches"))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,15 @@
+"""
+Settings for foodsdonation, split by concern:
+
+- ``base``: the project itself (apps, middleware, auth, portal options)
+  plus ``DJANGO_PROFILE``, ``DJANGO_SECRET_KEY``, ``DJANGO_DEBUG`` and
+  ``DJANGO_ALLOWED_HOSTS``;
+- ``performance``: cache, database, templates, sessions, logging and static
+  storage, each tunable from the environment;
+- ``env``: the typed environment readers they use.
+
+``DJANGO_SETTINGS_MODULE=foodsdonation.settings`` loads them all.
+"""
+
+from .base import *  # noqa: F401,F403
+from .performance import *  # noqa: F401,F403
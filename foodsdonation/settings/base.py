@@ -0,0 +1,171 @@
+"""
+Project settings shared by every environment: installed apps, middleware,
+URLs, authentication and the portal's own options.
+
+Generated by 'django-admin startproject' using Django 5.1.7.
+
+For more information on this file, see
+https://docs.djangoproject.com/en/5.1/topics/settings/
+
+For the full list of settings and their values, see
+https://docs.djangoproject.com/en/5.1/ref/settings/
+"""
+
+from pathlib import Path
+
+from django.core.exceptions import ImproperlyConfigured
+
+from . import env
+
+# Build paths inside the project like this: BASE_DIR / 'subdir'.
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+# "development" (the default) or "production"; picks the defaults of the
+# environment-driven settings here and in performance.py.
+PROFILE = env.string('DJANGO_PROFILE', 'development')
+if PROFILE not in ('development', 'production'):
+    raise ImproperlyConfigured(f"DJANGO_PROFILE must be development or production, not {PROFILE!r}.")
+PRODUCTION = PROFILE == 'production'
+
+# SECURITY WARNING: keep the secret key used in production secret!
+SECRET_KEY = env.string('DJANGO_SECRET_KEY')
+if SECRET_KEY is None:
+    if PRODUCTION:
+        raise ImproperlyConfigured("Set DJANGO_SECRET_KEY in production.")
+    SECRET_KEY = 'django-insecure-)+bfzsep%g_fturmgul+hew!4y$r+jizirbtw9kv-f6r1)^4#4'
+
+# SECURITY WARNING: don't run with debug turned on in production!
+# DEBUG also makes every connection keep a log of every query it runs.
+DEBUG = env.boolean('DJANGO_DEBUG', not PRODUCTION)
+
+ALLOWED_HOSTS = env.items('DJANGO_ALLOWED_HOSTS')
+
+AUTH_USER_MODEL = 'portal.User'
+# Application definition
+
+INSTALLED_APPS = [
+    'django.contrib.admin',
+    'django.contrib.auth',
+    'django.contrib.contenttypes',
+    'django.contrib.sessions',
+    'django.contrib.messages',
+    'django.contrib.staticfiles',
+    'portal',
+    'widget_tweaks',
+]
+
+MIDDLEWARE = [
+    'django.middleware.security.SecurityMiddleware',
+    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'portal.middleware.ProfilingMiddleware',
+    'portal.middleware.CompressionMiddleware',
+    'portal.middleware.PageCacheMiddleware',
+    'django.contrib.sessions.middleware.SessionMiddleware',
+    'django.middleware.common.CommonMiddleware',
+    'django.middleware.csrf.CsrfViewMiddleware',
+    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'portal.middleware.RegionMiddleware',
+    'django.contrib.messages.middleware.MessageMiddleware',
+    'django.middleware.clickjacking.XFrameOptionsMiddleware',
+]
+
+ROOT_URLCONF = 'foodsdonation.urls'
+
+WSGI_APPLICATION = 'foodsdonation.wsgi.application'
+
+# Stream long feeds (receiver dashboard) row chunk by row chunk instead of
+# building the whole page in memory; see portal.streaming.render_feed.
+PORTAL_STREAM_FEEDS = True
+
+# Token-bucket limits for login, signup and food claims (portal.ratelimit),
+# as "<requests>/<period>" with period s, m, h or d.
+PORTAL_RATE_LIMIT_ENABLED = True
+PORTAL_RATE_LIMITS = {
+    'login': '10/m',
+    'signup': '10/h',
+    'claim': '30/m',
+}
+
+# Seconds a form's idempotency key is remembered (portal.idempotency), and
+# after which a request still running with it is taken to have died.
+PORTAL_IDEMPOTENCY_TTL = 24 * 60 * 60
+PORTAL_IDEMPOTENCY_LEASE = 5 * 60
+
+# Completed, expired and deleted donations untouched for this many days are
+# moved to the archive tables by the archive_donations command.
+PORTAL_ARCHIVE_AFTER_DAYS = 30
+
+# Donation photos (portal.photos): largest upload accepted, photos per
+# donation, thumbnail widths (the first is shown, the others are its
+# high-density variants) and the processes rendering thumbnails.  With 0
+# workers, uploads wait for the make_thumbnails command.
+PORTAL_PHOTO_MAX_SIZE = 10 * 1024 * 1024
+PORTAL_PHOTOS_PER_DONATION = 4
+PORTAL_THUMBNAIL_WIDTHS = (320, 640)
+PORTAL_THUMBNAIL_WORKERS = 2
+
+# Full-page cache (portal.pagecache) of the pages that are the same for
+# every visitor or role: seconds a page is kept (0 turns the cache off) and
+# pages kept per process.
+PORTAL_PAGE_CACHE_TIMEOUT = 5 * 60
+PORTAL_PAGE_CACHE_MAX_PAGES = 1000
+
+# SQLite upkeep (portal.maintenance, run by maintain_db): where backups go,
+# how many per database are kept, and how often (seconds) each task runs
+# under --scheduled or --loop.
+PORTAL_BACKUP_DIR = BASE_DIR / 'backups'
+PORTAL_BACKUPS_KEPT = 7
+PORTAL_MAINTENANCE_SCHEDULE = {
+    'optimize': 60 * 60,
+    'vacuum': 24 * 60 * 60,
+    'backup': 6 * 60 * 60,
+}
+
+
+# Password validation
+# https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
+
+AUTH_PASSWORD_VALIDATORS = [
+    {
+        'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.MinimumLengthValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.CommonPasswordValidator',
+    },
+    {
+        'NAME': 'django.contrib.auth.password_validation.NumericPasswordValidator',
+    },
+]
+
+
+# Internationalization
+# https://docs.djangoproject.com/en/5.1/topics/i18n/
+
+LANGUAGE_CODE = 'en-us'
+
+TIME_ZONE = 'UTC'
+
+USE_I18N = True
+
+USE_TZ = True
+
+
+# Static files (CSS, JavaScript, Images)
+# https://docs.djangoproject.com/en/5.1/howto/static-files/
+
+STATIC_URL = 'static/'
+STATIC_ROOT = BASE_DIR / 'staticfiles'
+STATICFILES_DIRS = [BASE_DIR / 'foodsdonation' / 'static']
+
+# Uploaded files; portal.views.media serves the donation photos.
+MEDIA_URL = 'media/'
+MEDIA_ROOT = BASE_DIR / 'media'
+
+# Default primary key field type
+# https://docs.djangoproject.com/en/5.1/ref/settings/#default-auto-field
+
+DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
+
@@ -0,0 +1,79 @@
+"""
+Typed readers for settings taken from environment variables.
+
+An unset or empty variable gives the default; a value that does not parse
+raises ImproperlyConfigured naming the variable, so a typo fails at startup
+instead of silently falling back.
+"""
+
+import os
+
+from django.core.exceptions import ImproperlyConfigured
+
+TRUE = {"1", "true", "yes", "on"}
+FALSE = {"0", "false", "no", "off"}
+
+
+def _raw(name):
+    value = os.environ.get(name, "").strip()
+    return value or None
+
+
+def string(name, default=None):
+    value = _raw(name)
+    return default if value is None else value
+
+
+def boolean(name, default):
+    value = _raw(name)
+    if value is None:
+        return default
+    if value.lower() in TRUE:
+        return True
+    if value.lower() in FALSE:
+        return False
+    raise ImproperlyConfigured(f"{name} must be a boolean (1/0, true/false), not {value!r}.")
+
+
+def integer(name, default):
+    value = _raw(name)
+    if value is None:
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ImproperlyConfigured(f"{name} must be an integer, not {value!r}.")
+
+
+def items(name, default=()):
+    """A comma-separated list: ``a.example.com,b.example.com``."""
+    value = _raw(name)
+    if value is None:
+        return list(default)
+    return [item.strip() for item in value.split(",") if item.strip()]
+
+
+def mapping(name, default=None):
+    """Comma-separated pairs: ``journal_mode=WAL,synchronous=NORMAL``."""
+    value = _raw(name)
+    if value is None:
+        return dict(default or {})
+    pairs = {}
+    for item in items(name):
+        key, sep, val = item.partition("=")
+        if not sep or not key.strip():
+            raise ImproperlyConfigured(f"{name} must be key=value pairs, not {value!r}.")
+        pairs[key.strip()] = val.strip()
+    return pairs
+
+
+def choice(name, default, choices):
+    """One of ``choices``' keys, mapped to its value; dotted paths pass through."""
+    value = string(name, default)
+    if value in choices:
+        return choices[value]
+    if "." in value:
+        return value
+    raise ImproperlyConfigured(
+        f"{name} must be one of {', '.join(sorted(choices))} or a dotted path, not {value!r}."
+    )
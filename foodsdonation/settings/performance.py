@@ -0,0 +1,190 @@
+"""
+Settings that trade speed against convenience, read from the environment.
+
+Development defaults keep behaviour simple (a per-process memory cache, a
+fresh connection per request, database sessions, Django's default logging);
+``DJANGO_PROFILE=production`` switches the defaults to the tuned values.
+Each can be overridden on its own:
+
+    DJANGO_CACHE_BACKEND        locmem, file, redis, memcached, dummy or a dotted path
+    DJANGO_CACHE_LOCATION       backend location (directory, server URL, ...)
+    DJANGO_DB_PATH              SQLite database file
+    DJANGO_DB_PRAGMAS           PRAGMAs run on each new connection, a=b,c=d
+    DJANGO_DB_TRANSACTION_MODE  DEFERRED, IMMEDIATE or EXCLUSIVE
+    DJANGO_DB_TIMEOUT           seconds to wait for a locked database
+    DJANGO_DB_CONN_MAX_AGE      seconds to keep a connection (0: per request)
+    DJANGO_DB_SHARDS            regional shard databases, region=path,...
+    DJANGO_TEMPLATE_CACHE       cache compiled templates
+    DJANGO_SESSION_ENGINE       db, cache, cached_db, signed_cookies or a dotted path
+    DJANGO_LOG_LEVEL            console log level (unset: Django's default logging)
+    DJANGO_STATIC_STORAGE       manifest, plain or a dotted path
+    DJANGO_REQUEST_PROFILE_EVERY  profile one request in this many (0: none)
+    DJANGO_REQUEST_PROFILE_TOKEN  profile requests sending it in X-Portal-Profile
+    DJANGO_REQUEST_PROFILE_DIR    where profiled requests are written
+
+``manage.py perfcheck`` warns about combinations that cost performance.
+"""
+
+from . import env
+from .base import BASE_DIR, PRODUCTION
+
+CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+    'memcached': 'django.core.cache.backends.memcached.PyMemcacheCache',
+    'dummy': 'django.core.cache.backends.dummy.DummyCache',
+}
+# Backends every worker process sees the same contents of.
+SHARED_CACHE_BACKENDS = {CACHE_BACKENDS[name] for name in ('file', 'redis', 'memcached')}
+SESSION_ENGINES = {
+    'db': 'django.contrib.sessions.backends.db',
+    'cache': 'django.contrib.sessions.backends.cache',
+    'cached_db': 'django.contrib.sessions.backends.cached_db',
+    'signed_cookies': 'django.contrib.sessions.backends.signed_cookies',
+}
+STATIC_STORAGES = {
+    # collectstatic minifies our CSS, fingerprints every file and
+    # precompresses it; WhiteNoise serves the hashed names with far-future
+    # cache headers.
+    'manifest': 'portal.storage.PortalStaticFilesStorage',
+    'plain': 'django.contrib.staticfiles.storage.StaticFilesStorage',
+}
+
+# WAL lets readers carry on while a write commits, and synchronous=NORMAL
+# is durable under WAL except against power loss of the last commit.
+PRODUCTION_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'cache_size': '-20000',
+    'mmap_size': '134217728',
+    'temp_store': 'MEMORY',
+}
+
+
+# Cache
+
+CACHES = {
+    'default': {
+        'BACKEND': env.choice('DJANGO_CACHE_BACKEND', 'locmem', CACHE_BACKENDS),
+        'LOCATION': env.string('DJANGO_CACHE_LOCATION', ''),
+    }
+}
+
+
+# Database
+# https://docs.djangoproject.com/en/5.1/ref/settings/#databases
+
+DB_PRAGMAS = env.mapping('DJANGO_DB_PRAGMAS', PRODUCTION_PRAGMAS if PRODUCTION else {})
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': env.string('DJANGO_DB_PATH', BASE_DIR / 'db.sqlite3'),
+        'CONN_MAX_AGE': env.integer('DJANGO_DB_CONN_MAX_AGE', 600 if PRODUCTION else 0),
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': {
+            # IMMEDIATE takes the write lock when a transaction starts, so
+            # concurrent writers wait for it (up to the timeout) instead of
+            # failing with "database is locked" halfway through.
+            'transaction_mode': env.string('DJANGO_DB_TRANSACTION_MODE', 'IMMEDIATE' if PRODUCTION else None),
+            'timeout': env.integer('DJANGO_DB_TIMEOUT', 20 if PRODUCTION else 5),
+            'init_command': ''.join(f'PRAGMA {name}={value};' for name, value in DB_PRAGMAS.items()),
+        },
+    }
+}
+
+# Regional shards (portal.sharding): each region's donations and requests
+# in a database of its own, configured like default.  A region's position
+# fixes the ids its shard hands out, so only ever append regions.
+PORTAL_SHARDS = {}
+for _region, _path in env.mapping('DJANGO_DB_SHARDS').items():
+    PORTAL_SHARDS[_region] = f'region_{_region}'
+    DATABASES[f'region_{_region}'] = {**DATABASES['default'], 'NAME': _path}
+
+DATABASE_ROUTERS = ['portal.sharding.RegionRouter']
+
+
+# Templates
+
+_TEMPLATE_LOADERS = [
+    'django.template.loaders.filesystem.Loader',
+    'django.template.loaders.app_directories.Loader',
+]
+
+TEMPLATES = [
+    {
+        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'DIRS': ['templates'],
+        'OPTIONS': {
+            # Compiled templates are cached by default in every environment;
+            # under runserver Django's autoreloader drops the cache whenever
+            # a template file changes (django.template.autoreload).
+            'loaders': (
+                [('django.template.loaders.cached.Loader', _TEMPLATE_LOADERS)]
+                if env.boolean('DJANGO_TEMPLATE_CACHE', True)
+                else _TEMPLATE_LOADERS
+            ),
+            'context_processors': [
+                'django.template.context_processors.debug',
+                'django.template.context_processors.request',
+                'django.contrib.auth.context_processors.auth',
+                'django.contrib.messages.context_processors.messages',
+            ],
+        },
+    },
+]
+
+
+# Sessions
+
+# Sessions are read from the cache only when it is shared: with a
+# per-process cache, workers would serve each other's stale sessions.
+SESSION_ENGINE = env.choice(
+    'DJANGO_SESSION_ENGINE',
+    'cached_db' if PRODUCTION and CACHES['default']['BACKEND'] in SHARED_CACHE_BACKENDS else 'db',
+    SESSION_ENGINES,
+)
+
+
+# Logging
+
+# Unset in development: Django's default logging (console output in DEBUG
+# only).  Otherwise everything at or above the level goes to the console.
+LOG_LEVEL = env.string('DJANGO_LOG_LEVEL', 'WARNING' if PRODUCTION else None)
+if LOG_LEVEL:
+    LOG_LEVEL = LOG_LEVEL.upper()
+    LOGGING = {
+        'version': 1,
+        'disable_existing_loggers': False,
+        'handlers': {
+            'console': {'class': 'logging.StreamHandler', 'level': LOG_LEVEL},
+        },
+        'root': {'handlers': ['console'], 'level': LOG_LEVEL},
+        'loggers': {
+            'django': {'level': LOG_LEVEL},
+        },
+    }
+
+
+# Static files
+
+STORAGES = {
+    'default': {
+        'BACKEND': 'django.core.files.storage.FileSystemStorage',
+    },
+    'staticfiles': {
+        'BACKEND': env.choice('DJANGO_STATIC_STORAGE', 'manifest', STATIC_STORAGES),
+    },
+}
+WHITENOISE_KEEP_ONLY_HASHED_FILES = True
+
+
+# Request profiling
+
+# portal.profiling: cProfile and tracemalloc around one request in
+# PORTAL_REQUEST_PROFILE_EVERY, and around any request whose
+# X-Portal-Profile header carries the token.  Off unless one is set.
+PORTAL_REQUEST_PROFILE_EVERY = env.integer('DJANGO_REQUEST_PROFILE_EVERY', 0)
+PORTAL_REQUEST_PROFILE_TOKEN = env.string('DJANGO_REQUEST_PROFILE_TOKEN')
+PORTAL_REQUEST_PROFILE_DIR = env.string('DJANGO_REQUEST_PROFILE_DIR', BASE_DIR / 'profiles')
@@ -0,0 +1,213 @@
+"""
+Daily donation analytics.
+
+Metrics are kept in DonationRollup, one row per (pickup day, donor, pickup
+location):
+
+- donations and meals (the leading number of ``Donation.quantity``),
+- claimed donations and the summed seconds from posting to first request,
+  giving claim rate and mean time to claim,
+- expired unclaimed donations (waste), as of the last run.
+
+``update_rollups`` refreshes only the groups touched since the previous run
+(the ``rollups`` watermark): donations saved since then, donations with new
+requests, donations that expired in between, and groups that lost a
+donation through an edit or delete (recorded as RollupInvalidation rows by
+the signal handlers below).  ``rebuild_rollups`` recomputes everything and
+is what the incremental path is checked against.
+
+Both paths read the live and the archive tables, so archiving donations
+(portal.archive) leaves the metrics unchanged; soft-deleted donations drop
+out, as deleted ones always have.
+"""
+
+import re
+from collections import defaultdict
+from itertools import chain
+
+from django.db import transaction
+from django.db.models import Min, Q, Sum
+from django.db.models.signals import post_delete, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from . import sharding
+from .models import ArchivedDonation, Donation, DonationRollup, RollupInvalidation, Watermark
+
+WATERMARK = "rollups"
+BATCH_SIZE = 500
+REPORT_SUMS = ("donations", "meals", "claimed", "claim_seconds", "expired_unclaimed")
+
+_LEADING_NUMBER = re.compile(r"\s*(\d+)")
+
+
+def parse_meals(quantity):
+    """``"20 boxes"`` -> 20; quantities without a leading number count as 1."""
+    match = _LEADING_NUMBER.match(quantity or "")
+    return int(match.group(1)) if match else 1
+
+
+def group_key(pickup_time, donor_id, pickup_location):
+    return (timezone.localtime(pickup_time).date(), donor_id, pickup_location)
+
+
+@receiver(pre_save, sender=Donation)
+def invalidate_moved_donation(sender, instance, raw=False, using=None, **kwargs):
+    if raw or instance.pk is None:
+        return
+    old = (
+        Donation.all_objects.using(using).filter(pk=instance.pk)
+        .values_list("pickup_time", "donor_id", "pickup_location")
+        .first()
+    )
+    if old is None:
+        return
+    new_key = group_key(instance.pickup_time, instance.donor_id, instance.pickup_location)
+    if group_key(*old) != new_key:
+        _invalidate(group_key(*old), using)
+
+
+@receiver(post_delete, sender=Donation)
+def invalidate_deleted_donation(sender, instance, using=None, **kwargs):
+    _invalidate(group_key(instance.pickup_time, instance.donor_id, instance.pickup_location), using)
+
+
+def _invalidate(key, using):
+    day, donor_id, pickup_location = key
+    RollupInvalidation.objects.using(using).create(day=day, donor_id=donor_id, pickup_location=pickup_location)
+
+
+def _donation_rows(queryset, requests="request"):
+    """Per-donation values needed for the rollups, with the first claim time."""
+    return (
+        queryset.order_by()
+        .values("id", "donor_id", "pickup_location", "pickup_time", "quantity", "created_at", "expiry_date")
+        .annotate(first_claim=Min(f"{requests}__created_at"))
+    )
+
+
+def _all_rows(**filters):
+    """``_donation_rows`` for live and archived donations matching ``filters``."""
+    live = Donation.objects.filter(**filters)
+    archived = ArchivedDonation.objects.filter(deleted_at__isnull=True, **filters)
+    return chain(
+        _donation_rows(live).iterator(),
+        _donation_rows(archived, requests="requests").iterator(),
+    )
+
+
+def _aggregate(rows, today):
+    groups = defaultdict(
+        lambda: DonationRollup(donations=0, meals=0, claimed=0, claim_seconds=0, expired_unclaimed=0)
+    )
+    for row in rows:
+        key = group_key(row["pickup_time"], row["donor_id"], row["pickup_location"])
+        rollup = groups[key]
+        rollup.day, rollup.donor_id, rollup.pickup_location = key
+        rollup.donations += 1
+        rollup.meals += parse_meals(row["quantity"])
+        if row["first_claim"] is not None:
+            rollup.claimed += 1
+            rollup.claim_seconds += max(0, int((row["first_claim"] - row["created_at"]).total_seconds()))
+        elif row["expiry_date"] < today:
+            rollup.expired_unclaimed += 1
+    return groups
+
+
+def rebuild_rollups():
+    """Recompute every rollup from the live tables.  Returns the group count."""
+    now = timezone.now()
+    groups = _aggregate(_all_rows(), timezone.localdate(now))
+    with transaction.atomic(using=sharding.current()):
+        DonationRollup.objects.all().delete()
+        RollupInvalidation.objects.all().delete()
+        DonationRollup.objects.bulk_create(groups.values(), batch_size=BATCH_SIZE)
+        Watermark.objects.update_or_create(name=WATERMARK, defaults={"value": now})
+    return len(groups)
+
+
+def _changed_keys(since, now):
+    """Groups whose rollup may differ from what was written at ``since``."""
+    keys = set()
+    # all_objects: a donation soft-deleted since then leaves its group.
+    changed = Donation.all_objects.filter(
+        Q(updated_at__gte=since)
+        | Q(deleted_at__gte=since)
+        | Q(request__created_at__gte=since)
+        | Q(expiry_date__gte=timezone.localdate(since), expiry_date__lt=timezone.localdate(now))
+    )
+    for row in changed.values_list("pickup_time", "donor_id", "pickup_location").distinct():
+        keys.add(group_key(*row))
+    invalidated = list(RollupInvalidation.objects.values_list("id", "day", "donor_id", "pickup_location"))
+    keys.update((day, donor_id, location) for _, day, donor_id, location in invalidated)
+    return keys, [pk for pk, *_ in invalidated]
+
+
+def update_rollups():
+    """
+    Bring the rollups up to date, touching only groups changed since the last
+    run.  Falls back to a full rebuild the first time.  Returns the number of
+    groups refreshed.
+    """
+    watermark = Watermark.objects.filter(name=WATERMARK).first()
+    if watermark is None:
+        return rebuild_rollups()
+
+    now = timezone.now()
+    today = timezone.localdate(now)
+    keys, invalidation_ids = _changed_keys(watermark.value, now)
+    keys = sorted(keys)
+    with transaction.atomic(using=sharding.current()):
+        for start in range(0, len(keys), BATCH_SIZE):
+            _refresh(keys[start:start + BATCH_SIZE], today)
+        RollupInvalidation.objects.filter(pk__in=invalidation_ids).delete()
+        watermark.value = now
+        watermark.save(update_fields=["value"])
+    return len(keys)
+
+
+def _refresh(keys, today):
+    wanted = set(keys)
+    days = {day for day, _, _ in keys}
+    donors = {donor_id for _, donor_id, _ in keys}
+    rows = (
+        row
+        for row in _all_rows(donor_id__in=donors, pickup_time__date__in=days)
+        if group_key(row["pickup_time"], row["donor_id"], row["pickup_location"]) in wanted
+    )
+    groups = _aggregate(rows, today)
+    stale = [
+        pk
+        for pk, *key in DonationRollup.objects.filter(day__in=days, donor_id__in=donors).values_list(
+            "id", "day", "donor_id", "pickup_location"
+        )
+        if tuple(key) in wanted
+    ]
+    DonationRollup.objects.filter(pk__in=stale).delete()
+    DonationRollup.objects.bulk_create(groups.values())
+
+
+def report(start=None, end=None, group_by="day"):
+    """
+    Summarise rollups between ``start`` and ``end`` (inclusive dates) grouped
+    by ``"day"``, ``"donor"`` or ``"location"``.  Reads only DonationRollup,
+    in ``default`` and every shard, adding up the groups they share.
+    """
+    column = {"day": "day", "donor": "donor__username", "location": "pickup_location"}[group_by]
+    queryset = DonationRollup.objects.all()
+    if start:
+        queryset = queryset.filter(day__gte=start)
+    if end:
+        queryset = queryset.filter(day__lte=end)
+    queryset = queryset.values(column).annotate(**{name: Sum(name) for name in REPORT_SUMS}).order_by()
+    totals = {}
+    for alias in sharding.aliases():
+        for row in queryset.using(alias):
+            total = totals.setdefault(row.pop(column), dict.fromkeys(REPORT_SUMS, 0))
+            for name in REPORT_SUMS:
+                total[name] += row[name]
+    for group in sorted(totals):
+        row = {"group": group, **totals[group]}
+        row["claim_rate"] = row["claimed"] / row["donations"] if row["donations"] else 0
+        row["avg_hours_to_claim"] = row["claim_seconds"] / row["claimed"] / 3600 if row["claimed"] else None
+        yield row
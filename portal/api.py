@@ -0,0 +1,774 @@
+"""
+Versioned JSON API (``/api/v1/``) for partner apps.
+
+List endpoints support sparse fieldsets (``?fields=id,food_type``) and
+cursor pagination (``?limit=`` and the opaque ``next`` cursor from the
+previous page).  Rows are read with ``QuerySet.values()`` and encoded with
+orjson when it is installed, so no model instances are built per row.
+Authentication is the regular session login, CSRF included.
+"""
+
+import base64
+import binascii
+import datetime
+import json
+from functools import wraps
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError
+from django.db.models import F, Q
+from django.http import HttpResponse
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from django.views.decorators.http import require_http_methods
+
+from . import changes, events, inbox, pagecache, pickups, routes, sharding, watch
+from .forms import DonationForm, RecurringDonationForm
+from .idempotency import idempotent
+from .models import (
+    ArchivedDonation,
+    Change,
+    Donation,
+    DonationEvent,
+    Donor,
+    PickupSlot,
+    Receiver,
+    RecurringDonation,
+    Request,
+    SavedSearch,
+    WatchAlert,
+)
+from .ratelimit import ratelimit
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder.
+    orjson = None
+
+DEFAULT_PAGE_SIZE = 50
+MAX_PAGE_SIZE = 500
+MAX_BATCH_SIZE = 500
+
+# API field name -> ORM lookup, per resource.  Order is the default order
+# of keys in each object; foreign keys are exposed as their ids.
+DONATION_FIELDS = {
+    "id": "id",
+    "donor": "donor",
+    "donor_username": "donor__username",
+    "food_type": "food_type",
+    "quantity": "quantity",
+    "pickup_location": "pickup_location",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "pickup_time": "pickup_time",
+    "expiry_date": "expiry_date",
+    "status": "status",
+}
+ARCHIVED_DONATION_FIELDS = {**DONATION_FIELDS, "archived_at": "archived_at"}
+REQUEST_FIELDS = {
+    "id": "id",
+    "donation": "donation",
+    "donation_food_type": "donation__food_type",
+    "requester": "requester",
+    "requester_username": "requester__username",
+    "message": "message",
+    "status": "status",
+    "created_at": "created_at",
+    "decided_at": "decided_at",
+}
+RECURRING_FIELDS = {
+    "id": "id",
+    "food_type": "food_type",
+    "quantity": "quantity",
+    "pickup_location": "pickup_location",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "rule": "rule",
+    "pickup_time": "pickup_time",
+    "shelf_days": "shelf_days",
+    "starts_on": "starts_on",
+    "ends_on": "ends_on",
+    "active": "active",
+    "materialized_until": "materialized_until",
+}
+SLOT_FIELDS = {
+    "id": "id",
+    "donation": "donation",
+    "pickup_location": "donation__pickup_location",
+    "start": "start",
+    "end": "end",
+    "capacity": "capacity",
+    "booked": "booked",
+}
+SEARCH_FIELDS = {
+    "id": "id",
+    "name": "name",
+    "terms": "terms",
+    "location": "location",
+    "latitude": "latitude",
+    "longitude": "longitude",
+    "radius_km": "radius_km",
+    "min_days_left": "min_days_left",
+    "created_at": "created_at",
+}
+ALERT_FIELDS = {
+    "id": "id",
+    "search": "search",
+    "search_name": "search__name",
+    "donation": "donation",
+    "food_type": "donation__food_type",
+    "pickup_location": "donation__pickup_location",
+    "created_at": "created_at",
+    "sent_at": "sent_at",
+}
+PROFILE_FIELDS = {
+    "id": "id",
+    "user": "user",
+    "username": "user__username",
+    "email": "user__email",
+    "mobile_number": "mobile_number",
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400, **extra):
+        super().__init__(message)
+        self.status = status
+        self.extra = extra
+
+
+def dumps(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+
+
+def json_response(data, status=200):
+    return HttpResponse(dumps(data), status=status, content_type="application/json")
+
+
+def api_view(*methods):
+    """Require a logged-in user and turn ApiError into a JSON error body."""
+
+    def decorator(view):
+        @require_http_methods(methods)
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not request.user.is_authenticated:
+                return json_response({"error": "Authentication required."}, status=401)
+            try:
+                return view(request, *args, **kwargs)
+            except ApiError as e:
+                return json_response({"error": str(e), **e.extra}, status=e.status)
+
+        return wrapper
+
+    return decorator
+
+
+def require_user_type(request, user_type):
+    if request.user.user_type != user_type:
+        raise ApiError(f"Only {user_type}s can do this.", status=403)
+
+
+def read_json(request):
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        raise ApiError("Request body must be valid JSON.")
+    if not isinstance(data, dict):
+        raise ApiError("Request body must be a JSON object.")
+    return data
+
+
+def select_fields(request, available):
+    """Return the ``{name: lookup}`` mapping requested by ``?fields=``."""
+    requested = request.GET.get("fields")
+    if not requested:
+        return available
+    names = [name.strip() for name in requested.split(",") if name.strip()]
+    unknown = [name for name in names if name not in available]
+    if unknown:
+        raise ApiError(f"Unknown fields: {', '.join(unknown)}", available=list(available))
+    return {name: available[name] for name in names}
+
+
+def encode_cursor(last_id):
+    return base64.urlsafe_b64encode(str(last_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    try:
+        return int(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+    except (ValueError, binascii.Error):
+        raise ApiError("Invalid cursor.")
+
+
+def page_size(request):
+    try:
+        limit = min(int(request.GET.get("limit", DEFAULT_PAGE_SIZE)), MAX_PAGE_SIZE)
+    except ValueError:
+        raise ApiError("limit must be an integer.")
+    if limit < 1:
+        raise ApiError("limit must be positive.")
+    return limit
+
+
+def read_datetime(value, name):
+    """Parse an ISO 8601 datetime parameter; naive values are local time."""
+    try:
+        moment = parse_datetime(value)
+    except ValueError:
+        moment = None
+    if moment is None:
+        raise ApiError(f"{name} must be an ISO 8601 datetime.")
+    return timezone.make_aware(moment) if timezone.is_naive(moment) else moment
+
+
+def paginate(request, queryset, fields, everywhere=False):
+    """
+    Return one page of ``queryset`` as dicts plus the cursor for the next one.
+
+    Pages are keyed on the primary key, so each page is an indexed range scan
+    no matter how deep the client has paged.  With ``everywhere`` the page
+    is gathered from every regional database (see portal.sharding), whose
+    ids never overlap.
+    """
+    limit = page_size(request)
+    cursor = request.GET.get("cursor")
+    if cursor:
+        queryset = queryset.filter(pk__gt=decode_cursor(cursor))
+
+    rows = values(queryset.order_by("pk"), {"id": "id", **fields})
+    rows = list(sharding.scatter(rows, limit + 1) if everywhere else rows[: limit + 1])
+    next_cursor = encode_cursor(rows[limit - 1]["id"]) if len(rows) > limit else None
+    results = [{name: row[name] for name in fields} for row in rows[:limit]]
+    return {"results": results, "next": next_cursor}
+
+
+def values(queryset, fields):
+    """``queryset.values()`` keyed by API field names."""
+    plain = [name for name, path in fields.items() if name == path]
+    aliased = {name: F(path) for name, path in fields.items() if name != path}
+    return queryset.values(*plain, **aliased)
+
+
+def get_one(request, queryset, fields, pk):
+    row = values(queryset.filter(pk=pk), fields).first()
+    if row is None:
+        raise ApiError("Not found.", status=404)
+    return json_response({name: row[name] for name in fields})
+
+
+# Donations
+
+@api_view("GET", "POST")
+@idempotent("api-donations")
+def donations(request):
+    if request.method == "POST":
+        return create_donations(request)
+    queryset = Donation.objects.all()
+    status = request.GET.get("status")
+    if status:
+        queryset = queryset.filter(status=status)
+    mine = request.GET.get("mine")
+    if mine:
+        queryset = queryset.filter(donor=request.user)
+    # Staff list every region's donations; everyone else their own region's.
+    return json_response(paginate(
+        request, queryset, select_fields(request, DONATION_FIELDS), everywhere=request.user.is_staff and not mine
+    ))
+
+
+@api_view("GET")
+def donation_detail(request, id):
+    queryset = Donation.objects.all()
+    if request.user.is_staff:
+        queryset = queryset.using(sharding.locate(id))
+    return get_one(request, queryset, select_fields(request, DONATION_FIELDS), id)
+
+
+def create_donations(request):
+    """
+    Batch create: ``{"donations": [{...DonationForm fields...}, ...]}``.
+
+    Every item is validated first; nothing is written unless all are valid.
+    """
+    require_user_type(request, "donor")
+    items = read_json(request).get("donations")
+    if not isinstance(items, list) or not items:
+        raise ApiError('Expected a non-empty "donations" list.')
+    if len(items) > MAX_BATCH_SIZE:
+        raise ApiError(f"At most {MAX_BATCH_SIZE} donations per batch.")
+
+    objs, errors = [], {}
+    for index, item in enumerate(items):
+        form = DonationForm(item if isinstance(item, dict) else {})
+        if form.is_valid():
+            donation = form.save(commit=False)
+            donation.donor = request.user
+            objs.append(donation)
+        else:
+            errors[str(index)] = form.errors.get_json_data()
+    if errors:
+        raise ApiError("Invalid donations.", errors=errors)
+
+    with events.atomic():
+        created = Donation.objects.bulk_create(objs)
+        for donation in created:
+            events.log(
+                DonationEvent.CREATED, donation.pk, events.snapshot(donation), actor=request.user
+            )
+        watch.match(created)
+    return json_response({"created": [d.pk for d in created]}, status=201)
+
+
+# Recurring donations (see portal.recurring)
+
+@api_view("GET", "POST")
+def recurring_donations(request):
+    """
+    The donor's recurring donations.  POST the RecurringDonationForm fields
+    to add one; ``materialize_recurring`` posts its occurrences.
+    """
+    require_user_type(request, "donor")
+    queryset = RecurringDonation.objects.filter(donor=request.user)
+    if request.method == "GET":
+        return json_response(paginate(request, queryset, select_fields(request, RECURRING_FIELDS)))
+
+    data = read_json(request)
+    form = RecurringDonationForm(data)
+    if not form.is_valid():
+        raise ApiError("Invalid recurring donation.", errors=form.errors.get_json_data())
+    template = form.save(commit=False)
+    template.donor = request.user
+    template.save()
+    response = get_one(request, queryset, RECURRING_FIELDS, template.pk)
+    response.status_code = 201
+    return response
+
+
+@api_view("GET", "DELETE")
+def recurring_donation_detail(request, id):
+    """DELETE stops the schedule; donations already posted stay up."""
+    require_user_type(request, "donor")
+    queryset = RecurringDonation.objects.filter(donor=request.user)
+    if request.method == "DELETE":
+        if not queryset.filter(pk=id).update(active=False):
+            raise ApiError("Not found.", status=404)
+        return HttpResponse(status=204)
+    return get_one(request, queryset, select_fields(request, RECURRING_FIELDS), id)
+
+
+# Archived donations (see portal.archive)
+
+def visible_archive(user):
+    queryset = ArchivedDonation.objects.all()
+    if not user.is_staff:
+        queryset = queryset.filter(deleted_at__isnull=True)
+    return queryset
+
+
+@api_view("GET")
+def archived_donations(request):
+    queryset = visible_archive(request.user)
+    mine = request.GET.get("mine")
+    if mine:
+        queryset = queryset.filter(donor=request.user)
+    return json_response(paginate(
+        request, queryset, select_fields(request, ARCHIVED_DONATION_FIELDS),
+        everywhere=request.user.is_staff and not mine,
+    ))
+
+
+@api_view("GET")
+def archived_donation_detail(request, id):
+    return get_one(
+        request, visible_archive(request.user), select_fields(request, ARCHIVED_DONATION_FIELDS), id
+    )
+
+
+# Pickup slots (see portal.pickups)
+
+def after_slot(queryset, cursor):
+    """Slots after ``cursor``, a keyset on (start, id) as free_slots() orders."""
+    try:
+        start, _, pk = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)).decode().partition("|")
+        pk = int(pk)
+    except (ValueError, binascii.Error):
+        raise ApiError("Invalid cursor.")
+    start = read_datetime(start, "cursor")
+    return queryset.filter(Q(start__gt=start) | Q(start=start, pk__gt=pk))
+
+
+@api_view("GET")
+def slots(request):
+    """
+    Free pickup slots across all donations, earliest first, filtered by
+    ``?after=&before=&location=`` and paged with ``limit`` and ``cursor``.
+    """
+    after, before = (
+        read_datetime(request.GET[name], name) if request.GET.get(name) else None
+        for name in ("after", "before")
+    )
+    queryset = pickups.free_slots(after, before, request.GET.get("location"))
+    cursor = request.GET.get("cursor")
+    if cursor:
+        queryset = after_slot(queryset, cursor)
+    fields = select_fields(request, SLOT_FIELDS)
+    limit = page_size(request)
+    rows = list(values(queryset, {"id": "id", "start": "start", **fields})[: limit + 1])
+    next_cursor = None
+    if len(rows) > limit:
+        last = rows[limit - 1]
+        next_cursor = encode_cursor(f"{last['start'].isoformat()}|{last['id']}")
+    results = [{name: row[name] for name in fields} for row in rows[:limit]]
+    return json_response({"results": results, "next": next_cursor})
+
+
+@api_view("GET", "POST")
+def donation_slots(request, id):
+    """
+    A donation's slots.  Its donor can POST ``{"start": ..., "end": ...,
+    "minutes": 30, "capacity": 1}`` to split that window into slots.
+    """
+    if request.method == "GET":
+        queryset = PickupSlot.objects.filter(donation_id=id, donation__deleted_at__isnull=True)
+        return json_response({"results": list(values(queryset, select_fields(request, SLOT_FIELDS)))})
+
+    require_user_type(request, "donor")
+    donation = Donation.objects.filter(pk=id, donor=request.user).first()
+    if donation is None:
+        raise ApiError("Not found.", status=404)
+    data = read_json(request)
+    try:
+        start = read_datetime(str(data["start"]), "start")
+        end = read_datetime(str(data["end"]), "end")
+        minutes = int(data.get("minutes", 30))
+        capacity = int(data.get("capacity", 1))
+    except KeyError:
+        raise ApiError('Expected "start" and "end".')
+    except (TypeError, ValueError):
+        raise ApiError('"minutes" and "capacity" must be integers.')
+    try:
+        created = pickups.create_slots(donation, start, end, minutes, capacity)
+    except pickups.SlotError as e:
+        raise ApiError(str(e))
+    return json_response({"created": [slot.pk for slot in created]}, status=201)
+
+
+# Saved searches and alerts (see portal.watch)
+
+@api_view("GET", "POST")
+def searches(request):
+    """
+    The receiver's saved searches.  POST ``{"name": ..., "food": "vegetarian",
+    "location": ..., "min_days_left": 2}`` to save one; only ``name`` is
+    required.  ``"latitude"``, ``"longitude"`` and an optional
+    ``"radius_km"`` search around a point instead of a location.
+    """
+    require_user_type(request, "receiver")
+    queryset = SavedSearch.objects.filter(receiver=request.user)
+    if request.method == "GET":
+        return json_response(paginate(request, queryset, select_fields(request, SEARCH_FIELDS)))
+
+    data = read_json(request)
+    min_days_left = data.get("min_days_left")
+    try:
+        if min_days_left is not None:
+            min_days_left = int(min_days_left)
+    except (TypeError, ValueError):
+        raise ApiError('"min_days_left" must be an integer.')
+    near = radius_km = None
+    try:
+        if data.get("latitude") is not None or data.get("longitude") is not None:
+            near = float(data["latitude"]), float(data["longitude"])
+        if data.get("radius_km") is not None:
+            radius_km = float(data["radius_km"])
+    except (KeyError, TypeError, ValueError):
+        raise ApiError('"latitude", "longitude" and "radius_km" must be numbers, the first two together.')
+    try:
+        search = watch.save_search(
+            request.user,
+            str(data.get("name", "")),
+            food=str(data.get("food", "")),
+            location=str(data.get("location", "")),
+            min_days_left=min_days_left,
+            near=near,
+            radius_km=radius_km,
+        )
+    except watch.WatchError as e:
+        raise ApiError(str(e))
+    response = get_one(request, queryset, SEARCH_FIELDS, search.pk)
+    response.status_code = 201
+    return response
+
+
+@api_view("GET", "DELETE")
+def search_detail(request, id):
+    require_user_type(request, "receiver")
+    queryset = SavedSearch.objects.filter(receiver=request.user)
+    if request.method == "DELETE":
+        deleted, _ = queryset.filter(pk=id).delete()
+        if not deleted:
+            raise ApiError("Not found.", status=404)
+        return HttpResponse(status=204)
+    return get_one(request, queryset, select_fields(request, SEARCH_FIELDS), id)
+
+
+@api_view("GET")
+def alerts(request):
+    """Donations that matched the receiver's saved searches; ``?pending=1`` for unsent ones."""
+    queryset = WatchAlert.objects.filter(
+        search__receiver=request.user, donation__deleted_at__isnull=True
+    )
+    if request.GET.get("pending"):
+        queryset = queryset.filter(sent_at__isnull=True)
+    return json_response(paginate(request, queryset, select_fields(request, ALERT_FIELDS)))
+
+
+# Requests
+
+def visible_requests(user):
+    if user.user_type == "donor":
+        return Request.objects.filter(donation__donor=user)
+    return Request.objects.filter(requester=user)
+
+
+def sees_request(user, change):
+    """Whether ``user`` sees the request of ``change``, by visible_requests()'s rule."""
+    if user.user_type == "donor":
+        return change.donor_id == user.pk
+    return change.requester_id == user.pk
+
+
+@api_view("GET")
+def requests(request):
+    queryset = visible_requests(request.user)
+    donation = request.GET.get("donation")
+    if donation:
+        queryset = queryset.filter(donation_id=donation)
+    status = request.GET.get("status")
+    if status:
+        queryset = queryset.filter(status=status)
+    return json_response(paginate(request, queryset, select_fields(request, REQUEST_FIELDS)))
+
+
+@api_view("GET")
+def request_detail(request, id):
+    return get_one(request, visible_requests(request.user), select_fields(request, REQUEST_FIELDS), id)
+
+
+@api_view("POST")
+def request_decisions(request):
+    """
+    Bulk decision on received requests: ``{"action": "accept", "requests": [id, ...]}``
+    with action accept, decline or collect (see portal.inbox).  Requests not
+    in a state the action applies to are left alone.
+    """
+    require_user_type(request, "donor")
+    data = read_json(request)
+    ids = data.get("requests")
+    if not isinstance(ids, list) or not ids:
+        raise ApiError('Expected a non-empty "requests" list.')
+    if len(ids) > MAX_BATCH_SIZE:
+        raise ApiError(f"At most {MAX_BATCH_SIZE} requests per batch.")
+    try:
+        ids = [int(pk) for pk in ids]
+    except (TypeError, ValueError):
+        raise ApiError('"requests" must be a list of integer ids.')
+    try:
+        changed, siblings = inbox.decide(request.user, data.get("action"), ids)
+    except inbox.InboxError as e:
+        raise ApiError(str(e), actions=list(inbox.TRANSITIONS))
+    return json_response({"changed": changed, "declined_siblings": siblings})
+
+
+@api_view("POST")
+@idempotent("api-claims")
+@ratelimit("claim", keys=("user", "ip"), json=True)
+def claim_donations(request):
+    """
+    Batch claim: ``{"claims": [{"donation": id, "message": "...", "slot": id}, ...]}``.
+
+    Creates one Request per claim and marks the donations as Requested, the
+    same as ``request_food`` does for a single donation.  ``slot`` is
+    optional and books that pickup slot; if any booking fails, nothing is
+    claimed.
+    """
+    require_user_type(request, "receiver")
+    claims = read_json(request).get("claims")
+    if not isinstance(claims, list) or not claims:
+        raise ApiError('Expected a non-empty "claims" list.')
+    if len(claims) > MAX_BATCH_SIZE:
+        raise ApiError(f"At most {MAX_BATCH_SIZE} claims per batch.")
+    try:
+        ids = [int(claim["donation"]) for claim in claims]
+        slots = [int(claim["slot"]) if claim.get("slot") is not None else None for claim in claims]
+    except (KeyError, TypeError, ValueError):
+        raise ApiError('Every claim needs an integer "donation" and an optional integer "slot".')
+
+    existing = set(Donation.objects.filter(pk__in=ids).values_list("pk", flat=True))
+    missing = sorted(set(ids) - existing)
+    if missing:
+        raise ApiError("Unknown donations.", status=404, missing=missing)
+
+    if len(set(ids)) != len(ids):
+        raise ApiError("Each donation can be claimed once per batch.")
+    try:
+        with events.atomic():
+            created = Request.objects.bulk_create(
+                Request(
+                    donation_id=donation_id,
+                    requester=request.user,
+                    message=str(claim.get("message", "")),
+                )
+                for donation_id, claim in zip(ids, claims)
+            )
+            Donation.objects.filter(pk__in=ids).update(status="Requested", updated_at=timezone.now())
+            for claim, slot in zip(created, slots):
+                claimed = {"status": "Requested", "request": claim.pk}
+                if slot is not None:
+                    claimed["slot"] = pickups.book(slot, request.user, claim).slot_id
+                events.log(DonationEvent.CLAIMED, claim.donation_id, claimed, actor=request.user)
+    except pickups.SlotError as e:
+        raise ApiError(str(e), status=409)
+    except IntegrityError:
+        # unique_request_per_requester rejected a donation asked for before.
+        already = sorted(
+            Request.all_objects.filter(donation_id__in=ids, requester=request.user)
+            .values_list("donation_id", flat=True)
+        )
+        raise ApiError("Already requested.", status=409, donations=already)
+    return json_response({"created": [r.pk for r in created]}, status=201)
+
+
+# Pickup routes (see portal.routes)
+
+ROUTE_STOP_FIELDS = ("id", "pickup_location", "latitude", "longitude", "pickup_time")
+
+
+@api_view("GET")
+def pickup_routes(request):
+    """
+    Staff only: routes through the donations claimed for ``?date=``
+    (default today), optionally from ``?depot=lat,lon``, with
+    ``?max_stops=`` and ``?window_hours=``.
+    """
+    if not request.user.is_staff:
+        raise ApiError("Only staff can plan routes.", status=403)
+    day = timezone.localdate()
+    if request.GET.get("date"):
+        try:
+            day = parse_date(request.GET["date"])
+        except ValueError:
+            day = None
+        if day is None:
+            raise ApiError("date must be YYYY-MM-DD.")
+    try:
+        depot = request.GET.get("depot")
+        if depot:
+            depot = tuple(float(part) for part in depot.split(","))
+            if len(depot) != 2:
+                raise ValueError
+        max_stops = int(request.GET.get("max_stops", routes.DEFAULT_MAX_STOPS))
+        window = routes.DEFAULT_WINDOW
+        if request.GET.get("window_hours"):
+            window = datetime.timedelta(hours=float(request.GET["window_hours"]))
+    except ValueError:
+        raise ApiError("depot takes lat,lon; max_stops and window_hours take numbers.")
+    # Staff plan across every region.
+    stops = sharding.scatter(routes.claimed(day).only(*ROUTE_STOP_FIELDS))
+    try:
+        planned = routes.plan(stops, depot=depot or None, max_stops=max_stops, window=window)
+    except routes.PlanError as e:
+        raise ApiError(str(e))
+    return json_response({
+        "routes": [
+            {
+                "window": route.window,
+                "distance_km": round(route.distance, 3),
+                "stops": [{name: getattr(stop, name) for name in ROUTE_STOP_FIELDS} for stop in route.stops],
+            }
+            for route in planned
+        ]
+    })
+
+
+# Page cache (see portal.pagecache)
+
+@api_view("GET")
+def page_cache_stats(request):
+    """Staff only: hits, misses and bypasses of each page-cached view, with its hit ratio."""
+    if not request.user.is_staff:
+        raise ApiError("Only staff can see the page cache.", status=403)
+    return json_response(pagecache.stats())
+
+
+# Change feed (see portal.changes)
+
+@api_view("GET")
+def change_feed(request):
+    """
+    Donations and the user's requests that changed after ``?since=`` (the
+    ``next`` token of the previous call), oldest first.  Changed objects
+    carry their current fields; deleted ones come as
+    ``{"type": ..., "id": ..., "deleted": true}``.  Without a token the
+    feed starts with every current object.  Keep calling while ``more``.
+    """
+    since = request.GET.get("since")
+    rows, last, more = changes.read(decode_cursor(since) if since else 0, page_size(request))
+    ids = {
+        kind: [row.object_id for row in rows if row.kind == kind and not row.deleted]
+        for kind in changes.KIND_NAMES
+    }
+    current = {
+        Change.DONATION: {
+            row["id"]: row
+            for row in values(Donation.objects.filter(pk__in=ids[Change.DONATION]), DONATION_FIELDS)
+        },
+        Change.REQUEST: {
+            row["id"]: row
+            for row in values(visible_requests(request.user).filter(pk__in=ids[Change.REQUEST]), REQUEST_FIELDS)
+        },
+    }
+    results = []
+    for row in rows:
+        item = {"type": changes.KIND_NAMES[row.kind], "id": row.object_id}
+        data = current[row.kind].get(row.object_id)
+        if data is not None:
+            item["data"] = data
+        elif row.kind == Change.DONATION or sees_request(request.user, row):
+            # Deleted, or deleted since its change was read.  Request
+            # tombstones only go to the users who could see the request.
+            item["deleted"] = True
+        else:
+            # Another user's request.
+            continue
+        results.append(item)
+    return json_response({"changes": results, "next": encode_cursor(last), "more": more})
+
+
+# Profiles
+
+@api_view("GET")
+def donors(request):
+    return json_response(
+        paginate(request, Donor.objects.all(), select_fields(request, PROFILE_FIELDS))
+    )
+
+
+@api_view("GET")
+def receivers(request):
+    # Receivers are visible to themselves, to staff, and to donors they
+    # have requested food from.  Requests live in the shards and profiles
+    # in default, so the requesters are gathered first.
+    queryset = Receiver.objects.all()
+    if not request.user.is_staff:
+        requesters = {request.user.pk}
+        for alias in sharding.aliases() if request.user.user_type == "donor" else ():
+            requesters.update(
+                Request.objects.using(alias).filter(donation__donor=request.user).values_list("requester_id", flat=True)
+            )
+        queryset = queryset.filter(user_id__in=requesters)
+    return json_response(paginate(request, queryset, select_fields(request, PROFILE_FIELDS)))
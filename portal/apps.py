@@ -4,3 +4,8 @@ from django.apps import AppConfig
 class PortalConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'portal'
+
+    def ready(self):
+        from . import analytics  # noqa: F401  (registers signal handlers)
+        from . import checks  # noqa: F401  (registers system checks)
+        from . import sharding  # noqa: F401  (copies users to the shards)
@@ -0,0 +1,107 @@
+"""
+Archive tier for donations that are done with.
+
+Soft-deleted donations, expired ones and claimed ones whose pickup time has
+passed are moved, with their requests, from Donation/Request into
+ArchivedDonation/ArchivedRequest once they have been untouched for
+``PORTAL_ARCHIVE_AFTER_DAYS``.  The live tables then hold only the working
+set, and default queries never see archived rows.
+
+Historical lookups go through this module explicitly: ``get_donation`` and
+``donations`` look in both tiers.
+
+Archived donations keep no photos: the DonationPhoto rows are deleted with
+the live donation, and their files once the move has committed.
+"""
+
+import datetime
+from functools import partial
+from itertools import chain
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from . import photos, sharding
+from .models import ArchivedDonation, ArchivedRequest, Donation, DonationPhoto, Request
+
+BATCH_SIZE = 500
+
+DONATION_COLUMNS = (
+    "id", "donor_id", "food_type", "quantity", "pickup_location", "latitude", "longitude",
+    "pickup_time", "expiry_date", "status", "created_at", "updated_at", "deleted_at",
+)
+REQUEST_COLUMNS = (
+    "id", "donation_id", "requester_id", "message", "status", "created_at", "decided_at", "deleted_at",
+)
+
+
+def archivable(before):
+    """Donations ready to leave the live tables, untouched since ``before``."""
+    return Donation.all_objects.filter(
+        Q(deleted_at__isnull=False)
+        | Q(status="Expired")
+        | Q(status="Requested", pickup_time__lt=before),
+        updated_at__lt=before,
+    )
+
+
+def archive_donations(before=None, batch_size=BATCH_SIZE):
+    """
+    Move archivable donations and their requests to the archive tables,
+    ``batch_size`` donations per transaction.  Returns the number moved.
+    """
+    if before is None:
+        days = getattr(settings, "PORTAL_ARCHIVE_AFTER_DAYS", 30)
+        before = timezone.now() - datetime.timedelta(days=days)
+    moved = 0
+    while True:
+        ids = list(archivable(before).order_by("pk").values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return moved
+        _move(ids)
+        moved += len(ids)
+
+
+def _move(ids):
+    now = timezone.now()
+    with transaction.atomic(using=sharding.current()):
+        ArchivedDonation.objects.bulk_create(
+            ArchivedDonation(archived_at=now, **row)
+            for row in Donation.all_objects.filter(pk__in=ids).values(*DONATION_COLUMNS)
+        )
+        ArchivedRequest.objects.bulk_create(
+            ArchivedRequest(**row)
+            for row in Request.all_objects.filter(donation_id__in=ids).values(*REQUEST_COLUMNS)
+        )
+        files = list(DonationPhoto.objects.filter(donation_id__in=ids).values_list("image", "thumbnail"))
+        # Deleting through the ORM cascades to the requests and photos and
+        # sends the signals the analytics rollups listen to.
+        Donation.all_objects.filter(pk__in=ids).delete()
+        if files:
+            images, keys = zip(*files)
+            transaction.on_commit(partial(photos.delete_files, images, keys), using=sharding.current())
+
+
+def get_donation(pk):
+    """
+    The donation with ``pk`` from whichever tier holds it (soft-deleted
+    included), or None.
+    """
+    return (
+        Donation.all_objects.filter(pk=pk).first()
+        or ArchivedDonation.objects.filter(pk=pk).first()
+    )
+
+
+def donations(include_deleted=False, **filters):
+    """
+    Donations matching ``filters`` from both tiers, live ones first.  Only
+    fields the two models share may be filtered on.
+    """
+    live = Donation.all_objects if include_deleted else Donation.objects
+    archived = ArchivedDonation.objects.all()
+    if not include_deleted:
+        archived = archived.filter(deleted_at__isnull=True)
+    return chain(live.filter(**filters), archived.filter(**filters))
@@ -0,0 +1,41 @@
+"""
+The change feed: what happened to donations and requests after a point.
+
+Every INSERT, UPDATE and DELETE on the donation and request tables fires a
+database trigger (migration 0018) that replaces the row's entry in the
+Change table with a new one.  Triggers see every write however it is made
+(``save()``, ``QuerySet.update()``, ``bulk_create()``, cascades, the
+archive), so no code path can forget to record one.  The table holds one
+entry per object, the latest, so it grows with the number of objects, not
+the number of writes; entries of deleted objects stay as tombstones.  A
+request's entry also records its requester and donor, so the feed can keep
+its tombstone to the users who could see it.
+Django rebuilds a SQLite table for some schema changes, which drops its
+triggers: a migration that rebuilds either table must create them again
+(ChangeFeedTests fails if one is missing).
+
+``Change.seq`` is an AUTOINCREMENT key, and SQLite lets one writer in at a
+time, so seqs become visible in order: a client that has read up to seq N
+has seen, or will see, every later change.  ``read()`` is one range scan
+of the primary key, so a client that is up to date costs one empty index
+lookup.
+"""
+
+from .models import Change
+
+KIND_NAMES = {Change.DONATION: "donation", Change.REQUEST: "request"}
+
+
+def read(after=0, limit=500):
+    """
+    Up to ``limit`` changes after seq ``after``, oldest first, as
+    ``(changes, last_seq, more)``.  Reading from the start (``after=0``)
+    leaves out tombstones: a new client has nothing to delete.
+    """
+    changes = Change.objects.filter(seq__gt=after)
+    if not after:
+        changes = changes.filter(deleted=False)
+    rows = list(changes.order_by("seq")[: limit + 1])
+    more = len(rows) > limit
+    rows = rows[:limit]
+    return rows, rows[-1].seq if rows else after, more
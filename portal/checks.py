@@ -0,0 +1,187 @@
+"""
+System checks for settings that cost performance in production.
+
+They are tagged ``performance`` and registered as deployment checks, so they
+run under ``manage.py check --deploy`` and ``manage.py perfcheck`` (meant
+for process startup) but do not clutter every development command.
+"""
+
+import logging
+
+from django.conf import settings
+from django.contrib.staticfiles.storage import ManifestStaticFilesStorage
+from django.core.checks import Warning, register
+from django.utils.module_loading import import_string
+
+TAG = "performance"
+SHARED_CACHES = (
+    "django.core.cache.backends.filebased.FileBasedCache",
+    "django.core.cache.backends.redis.RedisCache",
+    "django.core.cache.backends.memcached.PyMemcacheCache",
+    "django.core.cache.backends.memcached.PyLibMCCache",
+)
+
+
+def _pragmas(database):
+    """``{name: value}`` of the PRAGMAs in a SQLite ``init_command``, lower-cased."""
+    pragmas = {}
+    for command in database.get("OPTIONS", {}).get("init_command", "").split(";"):
+        command = command.strip().lower()
+        if command.startswith("pragma "):
+            name, _, value = command[len("pragma "):].partition("=")
+            pragmas[name.strip()] = value.strip()
+    return pragmas
+
+
+@register(TAG, deploy=True)
+def check_debug(app_configs, **kwargs):
+    if settings.DEBUG:
+        return [
+            Warning(
+                "DEBUG is on: every connection keeps a copy of every query it "
+                "runs, so long-lived workers grow without bound.",
+                hint="Set DJANGO_DEBUG=0 or DJANGO_PROFILE=production.",
+                id="portal.W001",
+            )
+        ]
+    return []
+
+
+@register(TAG, deploy=True)
+def check_databases(app_configs, **kwargs):
+    warnings = []
+    for alias, database in settings.DATABASES.items():
+        if not database.get("CONN_MAX_AGE"):
+            warnings.append(
+                Warning(
+                    f"Database {alias!r} opens a new connection per request, "
+                    "losing its page cache and re-running its setup each time.",
+                    hint="Set DJANGO_DB_CONN_MAX_AGE, e.g. 600.",
+                    id="portal.W002",
+                )
+            )
+        if database["ENGINE"] != "django.db.backends.sqlite3":
+            continue
+        pragmas = _pragmas(database)
+        if pragmas.get("journal_mode") != "wal":
+            warnings.append(
+                Warning(
+                    f"SQLite database {alias!r} is not in WAL mode, so every "
+                    "write blocks all readers.",
+                    hint="Add journal_mode=WAL to DJANGO_DB_PRAGMAS.",
+                    id="portal.W003",
+                )
+            )
+        elif pragmas.get("synchronous") not in ("normal", "1", "off", "0"):
+            warnings.append(
+                Warning(
+                    f"SQLite database {alias!r} syncs to disk on every commit.",
+                    hint="In WAL mode, synchronous=NORMAL in DJANGO_DB_PRAGMAS is safe "
+                    "against crashes and much faster.",
+                    id="portal.W004",
+                )
+            )
+    return warnings
+
+
+@register(TAG, deploy=True)
+def check_caches(app_configs, **kwargs):
+    cache = settings.CACHES.get("default", {}).get("BACKEND", "")
+    warnings = []
+    if cache == "django.core.cache.backends.dummy.DummyCache":
+        warnings.append(
+            Warning(
+                "The default cache is DummyCache: nothing is ever cached.",
+                hint="Set DJANGO_CACHE_BACKEND.",
+                id="portal.W005",
+            )
+        )
+    session_engine = settings.SESSION_ENGINE
+    if session_engine == "django.contrib.sessions.backends.db":
+        warnings.append(
+            Warning(
+                "Sessions are stored in the database: every request reads a "
+                "session row.",
+                hint="With a shared cache, set DJANGO_SESSION_ENGINE=cached_db.",
+                id="portal.W006",
+            )
+        )
+    elif session_engine.startswith("django.contrib.sessions.backends.cache") and cache not in SHARED_CACHES:
+        warnings.append(
+            Warning(
+                "Sessions are read from a per-process cache, so each worker "
+                "process sees its own, possibly stale, copy.",
+                hint="Use a file, Redis or Memcached cache, or DJANGO_SESSION_ENGINE=db.",
+                id="portal.W007",
+            )
+        )
+    return warnings
+
+
+@register(TAG, deploy=True)
+def check_templates(app_configs, **kwargs):
+    warnings = []
+    for template in settings.TEMPLATES:
+        if template["BACKEND"] != "django.template.backends.django.DjangoTemplates":
+            continue
+        loaders = template.get("OPTIONS", {}).get("loaders")
+        if loaders is None:
+            # Django caches by default when no loaders are given.
+            continue
+        if not any(
+            isinstance(loader, (list, tuple)) and loader[0] == "django.template.loaders.cached.Loader"
+            for loader in loaders
+        ):
+            warnings.append(
+                Warning(
+                    "Templates are read and compiled again on every render.",
+                    hint="Set DJANGO_TEMPLATE_CACHE=1.",
+                    id="portal.W008",
+                )
+            )
+    return warnings
+
+
+@register(TAG, deploy=True)
+def check_static_storage(app_configs, **kwargs):
+    backend = settings.STORAGES["staticfiles"]["BACKEND"]
+    if not issubclass(import_string(backend), ManifestStaticFilesStorage):
+        return [
+            Warning(
+                "Static files are served under unhashed names, so browsers "
+                "cannot cache them for long.",
+                hint="Set DJANGO_STATIC_STORAGE=manifest.",
+                id="portal.W009",
+            )
+        ]
+    return []
+
+
+@register(TAG, deploy=True)
+def check_logging(app_configs, **kwargs):
+    if logging.getLogger("django").isEnabledFor(logging.DEBUG):
+        return [
+            Warning(
+                "Django logs at DEBUG level: a record for every failed template "
+                "variable lookup and, with DEBUG on, for every query.",
+                hint="Set DJANGO_LOG_LEVEL to INFO or higher.",
+                id="portal.W010",
+            )
+        ]
+    return []
+
+
+@register(TAG, deploy=True)
+def check_request_profiling(app_configs, **kwargs):
+    every = settings.PORTAL_REQUEST_PROFILE_EVERY
+    if 0 < every < 100:
+        return [
+            Warning(
+                f"One request in {every} is profiled: cProfile and tracemalloc "
+                "make each several times slower.",
+                hint="Sample at most one request in 100 (DJANGO_REQUEST_PROFILE_EVERY), "
+                "or profile on demand with DJANGO_REQUEST_PROFILE_TOKEN.",
+                id="portal.W011",
+            )
+        ]
+    return []
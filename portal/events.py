@@ -0,0 +1,156 @@
+"""
+Append-only log of the donation lifecycle.
+
+Every change the portal makes to a donation appends a DonationEvent:
+created, edited, claimed, expired or deleted.  An event stores only what
+changed (the full record for ``CREATED``) as compact JSON bytes, so the log
+replays into the state of every donation at any point in time, including
+donations that have since been deleted.
+
+Events are buffered and written with one bulk INSERT when the enclosing
+``events.atomic()`` block exits, inside the same transaction as the change:
+
+    with events.atomic():
+        donation.save()
+        events.log(DonationEvent.EDITED, donation.pk, changes, actor=request.user)
+"""
+
+import json
+import threading
+from contextlib import contextmanager
+from itertools import chain
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import transaction
+from django.utils import timezone
+
+from . import sharding
+from .models import ArchivedDonation, Donation, DonationEvent
+
+try:
+    import orjson
+except ImportError:  # orjson is optional; fall back to the stdlib encoder.
+    orjson = None
+
+# Donation attributes recorded by the log, and replayed from it.
+TRACKED_FIELDS = (
+    "donor_id", "food_type", "quantity", "pickup_location",
+    "pickup_time", "expiry_date", "status",
+)
+_FIELDS = {name: Donation._meta.get_field(name) for name in TRACKED_FIELDS}
+
+_local = threading.local()
+
+
+def encode(data):
+    if orjson is not None:
+        return orjson.dumps(data)
+    return json.dumps(data, cls=DjangoJSONEncoder, separators=(",", ":")).encode()
+
+
+def decode(data):
+    return json.loads(bytes(data))
+
+
+def snapshot(donation):
+    return {name: getattr(donation, name) for name in TRACKED_FIELDS}
+
+
+def diff(before, donation):
+    """The tracked fields of ``donation`` that differ from ``before``."""
+    after = snapshot(donation)
+    return {name: value for name, value in after.items() if before[name] != value}
+
+
+def log(kind, donation_id, changes=None, actor=None, at=None):
+    """
+    Record one event.  Inside ``atomic()`` it is written when the block
+    exits; otherwise it is written straight away.  Edits that changed
+    nothing are not recorded.
+    """
+    if kind == DonationEvent.EDITED and not changes:
+        return
+    event = DonationEvent(
+        donation_id=donation_id,
+        kind=kind,
+        at=at or timezone.now(),
+        actor_id=actor.pk if actor is not None else None,
+        data=encode(changes or {}),
+    )
+    buffers = getattr(_local, "buffers", None)
+    if not buffers:
+        DonationEvent.objects.bulk_create([event])
+    else:
+        buffers[-1].append(event)
+
+
+@contextmanager
+def atomic():
+    """
+    A ``transaction.atomic()`` block, on the current region's database,
+    that writes the events logged in it.
+
+    Each nested block buffers its own events: they join the enclosing
+    block's when it succeeds and are dropped with its savepoint when it
+    rolls back, so the outermost block writes only what was kept.
+    """
+    buffers = getattr(_local, "buffers", None)
+    if buffers is None:
+        buffers = _local.buffers = []
+    buffer = []
+    buffers.append(buffer)
+    try:
+        with transaction.atomic(using=sharding.current()):
+            yield
+            if len(buffers) == 1:
+                DonationEvent.objects.bulk_create(buffer, batch_size=500)
+    except BaseException:
+        buffers.pop()
+        raise
+    buffers.pop()
+    if buffers:
+        buffers[-1].extend(buffer)
+
+
+def replay(at=None, donation_ids=None):
+    """
+    Rebuild donation state from the log alone.
+
+    Returns ``{donation_id: {field: value}}`` for the donations that existed
+    at ``at`` (default: now), optionally limited to ``donation_ids``.
+    """
+    events = DonationEvent.objects.order_by("pk")
+    if at is not None:
+        events = events.filter(at__lte=at)
+    if donation_ids is not None:
+        events = events.filter(donation_id__in=donation_ids)
+    state = {}
+    for donation_id, kind, data in events.values_list("donation_id", "kind", "data").iterator(chunk_size=2000):
+        if kind == DonationEvent.DELETED:
+            state.pop(donation_id, None)
+        else:
+            fields = state.setdefault(donation_id, {})
+            for name, value in decode(data).items():
+                if name in _FIELDS:
+                    fields[name] = _FIELDS[name].to_python(value)
+    return state
+
+
+def verify():
+    """
+    Compare a replay of the whole log with the donations that have not been
+    deleted, live or archived.  Returns the ids that disagree.
+    """
+    replayed = replay()
+    mismatched = []
+    rows = chain(
+        Donation.objects.values("pk", *TRACKED_FIELDS).iterator(chunk_size=2000),
+        ArchivedDonation.objects.filter(deleted_at__isnull=True)
+        .values("pk", *TRACKED_FIELDS)
+        .iterator(chunk_size=2000),
+    )
+    for row in rows:
+        pk = row.pop("pk")
+        if replayed.pop(pk, None) != row:
+            mismatched.append(pk)
+    return sorted(mismatched + list(replayed))
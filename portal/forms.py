@@ -1,9 +1,13 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
-from .models import User, Donor, Receiver, Donation
+from . import sharding
+from .models import User, Donation, RecurringDonation
+from .signup import create_account
+
+# Shared signup form: user and profile are saved in one transaction
+class SignupForm(UserCreationForm):
+    user_type = None
 
-# Donor Signup Form
-class DonorSignupForm(UserCreationForm):
     email = forms.EmailField()
     mobile_number = forms.CharField(max_length=15)
 
@@ -11,31 +15,41 @@ class DonorSignupForm(UserCreationForm):
         model = User
         fields = ['username', 'email', 'password1', 'password2']
 
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # The region picks the database of the user's donations and requests.
+        if sharding.shards():
+            self.fields['region'] = forms.ChoiceField(
+                choices=[(region, region.title()) for region in sharding.shards()]
+            )
+
+    def validate_unique(self):
+        # clean_username() already rejected case-insensitive duplicates and the
+        # unique constraint catches races, so skip the second exact-match query.
+        exclude = {field.name for field in User._meta.fields if field.name not in self.fields}
+        exclude.add('username')
+        try:
+            self.instance.validate_unique(exclude=exclude)
+        except forms.ValidationError as e:
+            self.add_error(None, e)
+
     def save(self, commit=True):
         user = super().save(commit=False)
-        user.user_type = 'donor'
+        user.user_type = self.user_type
+        user.region = self.cleaned_data.get('region', '')
         if commit:
-            user.save()
-            Donor.objects.create(user=user, mobile_number=self.cleaned_data['mobile_number'])
+            create_account(user, self.user_type, self.cleaned_data['mobile_number'])
         return user
 
 
-# Receiver Signup Form
-class ReceiverSignupForm(UserCreationForm):
-    email = forms.EmailField()
-    mobile_number = forms.CharField(max_length=15)
+# Donor Signup Form
+class DonorSignupForm(SignupForm):
+    user_type = 'donor'
 
-    class Meta:
-        model = User
-        fields = ['username', 'email', 'password1', 'password2']
 
-    def save(self, commit=True):
-        user = super().save(commit=False)
-        user.user_type = 'receiver'
-        if commit:
-            user.save()
-            Receiver.objects.create(user=user, mobile_number=self.cleaned_data['mobile_number'])
-        return user
+# Receiver Signup Form
+class ReceiverSignupForm(SignupForm):
+    user_type = 'receiver'
 
 
 # Donor Login Form
@@ -54,8 +68,12 @@ class ReceiverLoginForm(forms.Form):
 class DonationForm(forms.ModelForm):
     class Meta:
         model = Donation
-        fields = ['food_type', 'quantity', 'pickup_location', 'pickup_time', 'expiry_date']
+        fields = [
+            'food_type', 'quantity', 'pickup_location', 'latitude', 'longitude', 'pickup_time', 'expiry_date',
+        ]
         widgets = {
+            'latitude': forms.NumberInput(attrs={'step': 'any', 'min': -90, 'max': 90}),
+            'longitude': forms.NumberInput(attrs={'step': 'any', 'min': -180, 'max': 180}),
             'pickup_time': forms.DateTimeInput(attrs={'type': 'datetime-local'}),
             'expiry_date': forms.DateInput(attrs={'type': 'date'}),
         }
@@ -67,3 +85,25 @@ class DonationForm(forms.ModelForm):
             'expiry_date': 'Expiry Date',
         }
 
+
+# Recurring Donation Form (see portal.recurring)
+class RecurringDonationForm(forms.ModelForm):
+    class Meta:
+        model = RecurringDonation
+        fields = [
+            'food_type', 'quantity', 'pickup_location', 'latitude', 'longitude', 'rule',
+            'pickup_time', 'shelf_days', 'starts_on', 'ends_on',
+        ]
+        widgets = {
+            'pickup_time': forms.TimeInput(attrs={'type': 'time'}),
+            'starts_on': forms.DateInput(attrs={'type': 'date'}),
+            'ends_on': forms.DateInput(attrs={'type': 'date'}),
+        }
+        labels = {
+            'food_type': 'Type of Food',
+            'rule': 'Repeat',
+            'shelf_days': 'Keeps for (days)',
+        }
+        help_texts = {
+            'rule': 'e.g. FREQ=DAILY or FREQ=WEEKLY;BYDAY=MO,WE,FR',
+        }
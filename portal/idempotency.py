@@ -0,0 +1,129 @@
+"""
+Idempotent POSTs for the views that create rows.
+
+Forms carry a random key (``{% idempotency_field %}`` from the
+``idempotency`` template library); API clients send an ``Idempotency-Key``
+header.  The first POST with a key runs the view and stores its response in
+IdempotencyKey.  A retry with the same key, after a double click or a
+dropped mobile connection, gets the stored response back without running
+the view again, and a retry that arrives while the first is still running
+gets a 409.  A key still in flight after ``PORTAL_IDEMPOTENCY_LEASE``
+seconds was left by a worker that crashed or timed out, and the next retry
+takes it over and runs the view.
+
+Keys are scoped to the user and the view and are kept for
+``PORTAL_IDEMPOTENCY_TTL`` seconds.  POSTs without a key behave as before.
+"""
+
+import datetime
+import secrets
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse
+from django.utils import timezone
+
+from . import sharding
+from .models import IdempotencyKey
+
+FIELD_NAME = "idempotency_key"
+HEADER = "HTTP_IDEMPOTENCY_KEY"
+MAX_KEY_LENGTH = 64
+DEFAULT_TTL = 24 * 60 * 60
+DEFAULT_LEASE = 5 * 60
+
+
+def new_key():
+    return secrets.token_urlsafe(16)
+
+
+def request_key(request, scope):
+    key = request.POST.get(FIELD_NAME) or request.META.get(HEADER)
+    if not key or len(key) > MAX_KEY_LENGTH:
+        return None
+    user = request.user.pk if request.user.is_authenticated else "-"
+    return f"{scope}:{user}:{key}"
+
+
+def _ttl():
+    return datetime.timedelta(seconds=getattr(settings, "PORTAL_IDEMPOTENCY_TTL", DEFAULT_TTL))
+
+
+def _lease():
+    return datetime.timedelta(seconds=getattr(settings, "PORTAL_IDEMPOTENCY_LEASE", DEFAULT_LEASE))
+
+
+def _claim(key):
+    """
+    Insert ``key`` as in flight, or take over an abandoned in-flight row;
+    return the existing row if it is neither.
+    """
+    now = timezone.now()
+    # Expired keys are dropped as new ones arrive (an indexed range delete),
+    # which keeps the table bounded by the TTL.
+    IdempotencyKey.objects.filter(created_at__lt=now - _ttl()).delete()
+    try:
+        with transaction.atomic(using=sharding.current()):
+            IdempotencyKey.objects.create(key=key, created_at=now, claimed_at=now)
+    except IntegrityError:
+        # Conditional, so only one of several retries takes the key over.
+        abandoned = IdempotencyKey.objects.filter(
+            key=key, status_code__isnull=True, claimed_at__lt=now - _lease()
+        )
+        if abandoned.update(claimed_at=now):
+            return None
+        return IdempotencyKey.objects.get(key=key)
+    return None
+
+
+def replay(stored):
+    if stored.status_code is None:
+        response = HttpResponse(
+            "This request is already being processed.", status=409, content_type="text/plain"
+        )
+        response["Retry-After"] = "1"
+        return response
+    response = HttpResponse(
+        bytes(stored.content), status=stored.status_code, content_type=stored.content_type
+    )
+    if stored.location:
+        response["Location"] = stored.location
+    response["Idempotent-Replay"] = "true"
+    return response
+
+
+def idempotent(scope):
+    """
+    Make POSTs to a view idempotent per key.  Responses below 400 are stored
+    and replayed; errors are not, so a retry after a failure runs again.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            key = request_key(request, scope) if request.method == "POST" else None
+            if key is None:
+                return view(request, *args, **kwargs)
+            stored = _claim(key)
+            if stored is not None:
+                return replay(stored)
+            try:
+                response = view(request, *args, **kwargs)
+            except BaseException:
+                IdempotencyKey.objects.filter(key=key).delete()
+                raise
+            if response.status_code >= 400 or response.streaming:
+                IdempotencyKey.objects.filter(key=key).delete()
+            else:
+                IdempotencyKey.objects.filter(key=key).update(
+                    status_code=response.status_code,
+                    content_type=response.get("Content-Type", ""),
+                    location=response.get("Location", ""),
+                    content=response.content,
+                )
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,115 @@
+"""
+The donor's request inbox: the Request state machine and bulk decisions.
+
+    pending --accept--> accepted --collect--> collected
+       |                   |
+       +-----decline-------+--> declined
+
+Decisions are made on whatever set of requests the donor ticks.  One
+query picks the ticked requests the donor received that are in the
+transition's source states, and one UPDATE moves exactly those; requests
+that already moved on, or belong to another donor, are skipped by the
+database instead of checked one by one.  A donation has one receiver: an
+accept may hold one request per donation, and none for a donation already
+accepted.  Accepting also declines the still-pending siblings of the
+accepted requests (the other receivers who asked for the same donations)
+in one more UPDATE, and declined requests give their pickup slot bookings
+back.
+"""
+
+from django.db import transaction
+from django.db.models import Count, Exists, F, OuterRef, Prefetch, Q, Subquery
+from django.utils import timezone
+
+from . import sharding
+from .models import Donation, PickupBooking, PickupSlot, Request
+
+# action -> (new status, statuses it may move from)
+TRANSITIONS = {
+    "accept": (Request.ACCEPTED, (Request.PENDING,)),
+    "decline": (Request.DECLINED, (Request.PENDING, Request.ACCEPTED)),
+    "collect": (Request.COLLECTED, (Request.ACCEPTED,)),
+}
+
+
+class InboxError(Exception):
+    pass
+
+
+def decide(donor, action, ids):
+    """
+    Apply ``action`` to the requests in ``ids`` that ``donor`` received.
+
+    Returns ``(changed, siblings_declined)``: how many of ``ids`` moved, and
+    how many other pending requests an accept declined.  Raises InboxError
+    for an accept of two requests for the same donation.
+    """
+    if action not in TRANSITIONS:
+        raise InboxError(f"Unknown action {action!r}.")
+    status, sources = TRANSITIONS[action]
+    now = timezone.now()
+    with transaction.atomic(using=sharding.current()):
+        # The ids are read and updated in one transaction; SQLite lets no
+        # other write in between, or fails this one.
+        movable = Request.objects.filter(pk__in=ids, donation__donor=donor, status__in=sources)
+        if action == "accept":
+            taken = Request.objects.filter(
+                donation=OuterRef("donation"), status__in=(Request.ACCEPTED, Request.COLLECTED)
+            )
+            movable = movable.exclude(Exists(taken))
+        rows = dict(movable.values_list("pk", "donation_id"))
+        if action == "accept" and len(set(rows.values())) < len(rows):
+            raise InboxError("Accept one request per donation.")
+        changed = Request.objects.filter(pk__in=rows, status__in=sources).update(status=status, decided_at=now)
+        declined = list(rows) if action == "decline" else []
+        siblings = 0
+        if action == "accept" and changed:
+            pending = list(
+                Request.objects.filter(donation_id__in=rows.values(), status=Request.PENDING)
+                .values_list("pk", flat=True)
+            )
+            siblings = Request.objects.filter(pk__in=pending).update(status=Request.DECLINED, decided_at=now)
+            declined = pending
+        if declined:
+            release_bookings(Request.objects.filter(pk__in=declined))
+    return changed, siblings
+
+
+def release_bookings(requests):
+    """Drop the pickup bookings of ``requests`` and free their slot places."""
+    bookings = PickupBooking.objects.filter(request__in=requests)
+    released = (
+        bookings.filter(slot=OuterRef("pk")).values("slot").annotate(count=Count("pk")).values("count")
+    )
+    PickupSlot.objects.filter(pk__in=bookings.values("slot_id")).update(
+        booked=F("booked") - Subquery(released)
+    )
+    bookings.delete()
+
+
+def inbox(donor, status=None):
+    """
+    The donor's donations that have requests, newest first, each annotated
+    with its request count per status (one aggregate query) and carrying
+    its requests as ``inbox_requests`` (one more).  ``status`` keeps only
+    donations with requests in that status.
+    """
+    live = Q(request__deleted_at__isnull=True)
+    counts = {
+        value: Count("request", filter=live & Q(request__status=value))
+        for value, _ in Request.STATUS_CHOICES
+    }
+    donations = (
+        Donation.objects.filter(donor=donor)
+        .annotate(total_requests=Count("request", filter=live), **counts)
+        .filter(total_requests__gt=0)
+    )
+    if status in counts:
+        donations = donations.filter(**{f"{status}__gt": 0})
+    return donations.order_by("-pk").prefetch_related(
+        Prefetch(
+            "request_set",
+            queryset=Request.objects.select_related("requester").order_by("created_at"),
+            to_attr="inbox_requests",
+        )
+    )
@@ -0,0 +1,268 @@
+"""
+Upkeep of the SQLite databases: consistent backups, planner statistics
+and reclaiming free pages, each done in short steps so writers are never
+held up for long.
+
+- ``backup()`` copies a database with SQLite's online backup API,
+  ``pages`` pages per step with a ``pause`` between steps, into
+  ``PORTAL_BACKUP_DIR``.  Each step holds a read lock only; under WAL the
+  copy reads one pinned snapshot, so it is consistent however much is
+  written meanwhile, and writers never wait for it.  In rollback-journal
+  mode a write between steps makes SQLite restart the copy, which is also
+  consistent but slower on a busy database.  The copy is written beside
+  its final name, checked with ``PRAGMA quick_check`` and then renamed, so
+  a backup file is always complete.  The newest ``PORTAL_BACKUPS_KEPT``
+  are kept.
+- ``optimize()`` runs ``ANALYZE`` the first time (sqlite_stat1 does not
+  exist yet), then ``PRAGMA optimize``, which only re-analyzes tables
+  whose statistics went stale; ``analysis_limit`` bounds either.
+- ``vacuum()`` returns free pages to the file system ``pages`` at a time
+  with ``PRAGMA incremental_vacuum``.  That needs ``auto_vacuum =
+  INCREMENTAL``, which only a full ``VACUUM`` (``full=True``, blocking
+  every writer while it rewrites the file) can switch on.
+
+Each returns a ``Result`` saying how long the task's steps held locks, in
+total and at most.  ``manage.py maintain_db`` runs them over every
+database, shards included; ``--scheduled`` runs only the tasks due by
+``PORTAL_MAINTENANCE_SCHEDULE`` and ``--loop`` keeps doing so.  The last
+run of each task is remembered in ``maintenance.json`` in the backup
+directory.
+"""
+
+import json
+import os
+import sqlite3
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.db import connections
+from django.utils import timezone
+
+TASKS = ("optimize", "vacuum", "backup")
+DEFAULT_PAGES = 256
+DEFAULT_PAUSE = 0.01
+ANALYSIS_LIMIT = 1000
+STATE_FILE = "maintenance.json"
+
+# seconds: wall time; steps: how many; held: seconds the steps held locks
+# in total; longest: the longest one; detail: what was done.
+Result = namedtuple("Result", "alias task seconds steps held longest detail")
+
+
+class MaintenanceError(Exception):
+    pass
+
+
+class _Holds:
+    """Times the stretches a task holds a lock."""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.steps = []
+        self._since = None
+
+    def start(self):
+        self._since = time.perf_counter()
+
+    def stop(self):
+        if self._since is not None:
+            self.steps.append(time.perf_counter() - self._since)
+            self._since = None
+
+    def result(self, alias, task, detail):
+        return Result(
+            alias, task, time.perf_counter() - self.started, len(self.steps),
+            sum(self.steps), max(self.steps, default=0.0), detail,
+        )
+
+
+def _connection(alias):
+    connection = connections[alias]
+    if connection.vendor != "sqlite":
+        raise MaintenanceError(f"{alias} is not a SQLite database.")
+    if connection.in_atomic_block:
+        raise MaintenanceError("Database maintenance cannot run inside a transaction.")
+    connection.ensure_connection()
+    return connection
+
+
+def _pragma(cursor, name):
+    cursor.execute(f"PRAGMA {name}")
+    return cursor.fetchone()[0]
+
+
+# Backups
+
+def backups(alias, directory=None):
+    """Paths of ``alias``'s backups, oldest first."""
+    directory = str(directory or settings.PORTAL_BACKUP_DIR)
+    if not os.path.isdir(directory):
+        return []
+    prefix = f"{alias}-"
+    names = sorted(n for n in os.listdir(directory) if n.startswith(prefix) and n.endswith(".sqlite3"))
+    return [os.path.join(directory, name) for name in names]
+
+
+def backup(alias, directory=None, pages=DEFAULT_PAGES, pause=DEFAULT_PAUSE, keep=None):
+    directory = str(directory or settings.PORTAL_BACKUP_DIR)
+    keep = settings.PORTAL_BACKUPS_KEPT if keep is None else keep
+    connection = _connection(alias)
+    source = connection.connection
+    with connection.cursor() as cursor:
+        wal = _pragma(cursor, "journal_mode") == "wal"
+
+    os.makedirs(directory, exist_ok=True)
+    path = os.path.join(directory, f"{alias}-{timezone.now():%Y%m%dT%H%M%S%f}.sqlite3")
+    partial = path + ".part"
+    holds = _Holds()
+
+    def progress(status, remaining, total):
+        holds.stop()
+        if remaining and pause:
+            time.sleep(pause)
+        holds.start()
+
+    target = sqlite3.connect(partial)
+    try:
+        if wal:
+            # Readers do not block writers under WAL: pin one snapshot for
+            # the whole copy so that writes between steps cannot restart it.
+            source.execute("BEGIN")
+            source.execute("SELECT count(*) FROM sqlite_master")
+        try:
+            holds.start()
+            source.backup(target, pages=pages, progress=progress)
+            holds.stop()
+        finally:
+            if wal:
+                source.execute("COMMIT")
+        check = target.execute("PRAGMA quick_check").fetchone()[0]
+        if check != "ok":
+            raise MaintenanceError(f"The backup of {alias} failed its check: {check}")
+    except BaseException:
+        target.close()
+        os.remove(partial)
+        raise
+    target.close()
+    os.replace(partial, path)
+
+    if keep:
+        for old in backups(alias, directory)[:-keep]:
+            os.remove(old)
+    size = os.path.getsize(path) / (1024 * 1024)
+    return holds.result(alias, "backup", f"{path} ({size:.1f} MiB)")
+
+
+# Statistics and free pages
+
+def optimize(alias, limit=ANALYSIS_LIMIT):
+    connection = _connection(alias)
+    holds = _Holds()
+    with connection.cursor() as cursor:
+        cursor.execute(f"PRAGMA analysis_limit={int(limit)}")
+        cursor.execute("SELECT 1 FROM sqlite_master WHERE name = 'sqlite_stat1'")
+        analyzed = cursor.fetchone() is not None
+        # Writing the statistics holds the write lock for the statement.
+        holds.start()
+        if analyzed:
+            # 0x10002: consider every table, not just those this connection used.
+            cursor.execute("PRAGMA optimize=0x10002")
+        else:
+            cursor.execute("ANALYZE")
+        holds.stop()
+    return holds.result(alias, "optimize", "PRAGMA optimize" if analyzed else "first ANALYZE")
+
+
+def vacuum(alias, pages=DEFAULT_PAGES, pause=DEFAULT_PAUSE, full=False):
+    connection = _connection(alias)
+    holds = _Holds()
+    with connection.cursor() as cursor:
+        if full:
+            holds.start()
+            cursor.execute("PRAGMA auto_vacuum=INCREMENTAL")
+            cursor.execute("VACUUM")
+            holds.stop()
+            return holds.result(alias, "vacuum", "full VACUUM, auto_vacuum is now INCREMENTAL")
+        if _pragma(cursor, "auto_vacuum") != 2:
+            return holds.result(
+                alias, "vacuum", "skipped: auto_vacuum is not INCREMENTAL (switch it with a full vacuum once)"
+            )
+        free = _pragma(cursor, "freelist_count")
+        freed = 0
+        while free:
+            holds.start()
+            # execute() would step the pragma once, freeing a single page;
+            # executescript() runs it to the end.
+            cursor.executescript(f"PRAGMA incremental_vacuum({int(pages)});")
+            holds.stop()
+            left = _pragma(cursor, "freelist_count")
+            if left >= free:
+                break
+            freed, free = freed + free - left, left
+            if free and pause:
+                time.sleep(pause)
+    return holds.result(alias, "vacuum", f"{freed} pages freed")
+
+
+# Scheduling
+
+def _state_path(directory=None):
+    return os.path.join(str(directory or settings.PORTAL_BACKUP_DIR), STATE_FILE)
+
+
+def last_runs(directory=None):
+    """``{alias: {task: timestamp}}`` of the last scheduled runs."""
+    try:
+        with open(_state_path(directory), encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def due(aliases, now=None, directory=None):
+    """``(alias, task)`` pairs whose interval in PORTAL_MAINTENANCE_SCHEDULE has passed."""
+    now = time.time() if now is None else now
+    runs = last_runs(directory)
+    schedule = settings.PORTAL_MAINTENANCE_SCHEDULE
+    return [
+        (alias, task)
+        for alias in aliases
+        for task in TASKS
+        if schedule.get(task) and now - runs.get(alias, {}).get(task, 0) >= schedule[task]
+    ]
+
+
+def run(alias, task, pages=DEFAULT_PAGES, pause=DEFAULT_PAUSE):
+    if task == "backup":
+        return backup(alias, pages=pages, pause=pause)
+    if task == "optimize":
+        return optimize(alias)
+    if task == "vacuum":
+        return vacuum(alias, pages=pages, pause=pause)
+    raise MaintenanceError(f"Unknown task {task!r}.")
+
+
+def run_due(aliases, directory=None, pages=DEFAULT_PAGES, pause=DEFAULT_PAUSE):
+    """Run and record every task that is due; yields each ``Result``."""
+    for alias, task in due(aliases, directory=directory):
+        started = time.time()
+        yield run(alias, task, pages, pause)
+        runs = last_runs(directory)
+        runs.setdefault(alias, {})[task] = started
+        os.makedirs(os.path.dirname(_state_path(directory)), exist_ok=True)
+        with open(_state_path(directory), "w", encoding="utf-8") as f:
+            json.dump(runs, f, indent=2)
+
+
+def next_due(aliases, directory=None):
+    """Seconds until the next task is due."""
+    runs = last_runs(directory)
+    schedule = settings.PORTAL_MAINTENANCE_SCHEDULE
+    waits = [
+        runs.get(alias, {}).get(task, 0) + schedule[task] - time.time()
+        for alias in aliases
+        for task in TASKS
+        if schedule.get(task)
+    ]
+    return max(0, min(waits, default=60))
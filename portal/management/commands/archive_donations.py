@@ -0,0 +1,26 @@
+import datetime
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from portal.archive import BATCH_SIZE, archive_donations
+
+
+class Command(BaseCommand):
+    help = (
+        "Move completed, expired and deleted donations, with their requests, "
+        "from the live tables to the archive tables."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--older-than", type=int, metavar="DAYS",
+            help="Only rows untouched for DAYS days (default: PORTAL_ARCHIVE_AFTER_DAYS).",
+        )
+        parser.add_argument("--batch-size", type=int, default=BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        before = None
+        if options["older_than"] is not None:
+            before = timezone.now() - datetime.timedelta(days=options["older_than"])
+        moved = archive_donations(before, batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Archived {moved} donations."))
@@ -0,0 +1,34 @@
+import csv
+
+from django.core.management.base import BaseCommand, CommandError
+from portal.signup import PROFILE_MODELS, bulk_signup
+
+
+class Command(BaseCommand):
+    help = (
+        "Create donor or receiver accounts in bulk from a CSV file with "
+        "username, email, mobile_number and optional password and region columns."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("user_type", choices=sorted(PROFILE_MODELS))
+        parser.add_argument("csv_file")
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        try:
+            with open(options["csv_file"], newline="", encoding="utf-8") as f:
+                created, skipped, invalid = bulk_signup(
+                    csv.DictReader(f), options["user_type"], options["batch_size"]
+                )
+        except (OSError, KeyError) as e:
+            raise CommandError(f"Could not import accounts: {e}")
+
+        self.stdout.write(self.style.SUCCESS(f"Created {created} accounts."))
+        if skipped:
+            self.stdout.write(
+                self.style.WARNING(f"Skipped {len(skipped)} existing usernames: ")
+                + ", ".join(skipped)
+            )
+        for username, messages in invalid:
+            self.stdout.write(self.style.ERROR(f"Invalid account {username!r}: ") + " ".join(messages))
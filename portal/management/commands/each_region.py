@@ -0,0 +1,23 @@
+import argparse
+
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from portal import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Run a management command once for default and once per regional shard, "
+        "with that region current: manage.py each_region archive_donations --older-than 30"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("command_name")
+        parser.add_argument("arguments", nargs=argparse.REMAINDER)
+
+    def handle(self, *args, **options):
+        for region in [None, *sharding.shards()]:
+            self.stdout.write(f"[{region or 'default'}]")
+            with sharding.region(region):
+                call_command(options["command_name"], *options["arguments"], stdout=self.stdout, stderr=self.stderr)
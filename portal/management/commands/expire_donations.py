@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from portal import events
+from portal.models import Donation, DonationEvent
+
+
+class Command(BaseCommand):
+    help = "Mark unclaimed donations past their expiry date as Expired."
+
+    def handle(self, *args, **options):
+        expired = Donation.objects.filter(status="Available", expiry_date__lt=timezone.localdate())
+        with events.atomic():
+            ids = list(expired.values_list("pk", flat=True))
+            count = expired.update(status="Expired", updated_at=timezone.now())
+            for pk in ids:
+                events.log(DonationEvent.EXPIRED, pk, {"status": "Expired"})
+        self.stdout.write(self.style.SUCCESS(f"Marked {count} donations as expired."))
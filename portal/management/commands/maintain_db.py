@@ -0,0 +1,65 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import maintenance, sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Back up, re-analyze and vacuum the SQLite databases (default and every shard) "
+        "in short steps, reporting how long each task held locks.  With --scheduled, "
+        "only the tasks due by PORTAL_MAINTENANCE_SCHEDULE run; --loop keeps running them."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "tasks", nargs="*", help=f"Tasks to run now (default: {', '.join(maintenance.TASKS)}).",
+        )
+        parser.add_argument("--database", action="append", help="Only this database alias (repeatable).")
+        parser.add_argument("--scheduled", action="store_true", help="Run only the tasks that are due.")
+        parser.add_argument("--loop", action="store_true", help="Keep running the tasks as they fall due.")
+        parser.add_argument(
+            "--pages", type=int, default=maintenance.DEFAULT_PAGES,
+            help="Pages copied or freed per step.",
+        )
+        parser.add_argument(
+            "--pause", type=float, default=maintenance.DEFAULT_PAUSE,
+            help="Seconds between steps, for writers to get in.",
+        )
+        parser.add_argument(
+            "--full-vacuum", action="store_true",
+            help="Rewrite the file with VACUUM, switching on incremental vacuum.  Blocks writers throughout.",
+        )
+
+    def handle(self, *args, **options):
+        aliases = options["database"] or sharding.aliases()
+        unknown = set(options["tasks"]) - set(maintenance.TASKS)
+        if unknown:
+            raise CommandError(f"Unknown task(s): {', '.join(sorted(unknown))}.")
+        try:
+            if options["full_vacuum"]:
+                for alias in aliases:
+                    self.report(maintenance.vacuum(alias, full=True))
+            elif options["loop"]:
+                while True:
+                    self.run_due(aliases, options)
+                    time.sleep(min(max(maintenance.next_due(aliases), 1), 60 * 60))
+            elif options["scheduled"]:
+                self.run_due(aliases, options)
+            else:
+                for alias in aliases:
+                    for task in options["tasks"] or maintenance.TASKS:
+                        self.report(maintenance.run(alias, task, options["pages"], options["pause"]))
+        except maintenance.MaintenanceError as e:
+            raise CommandError(e)
+
+    def run_due(self, aliases, options):
+        for result in maintenance.run_due(aliases, pages=options["pages"], pause=options["pause"]):
+            self.report(result)
+
+    def report(self, result):
+        self.stdout.write(
+            f"{result.alias} {result.task}: {result.seconds:.2f}s, {result.steps} step(s) holding locks "
+            f"{result.held * 1000:.1f}ms in total, {result.longest * 1000:.1f}ms at most; {result.detail}"
+        )
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand, CommandError
+from portal import photos
+
+
+class Command(BaseCommand):
+    help = "Render the thumbnails of donation photos still waiting for them."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, help="Processes to render with (default: one per CPU).")
+        parser.add_argument("--batch-size", type=int, default=100)
+        parser.add_argument("--retry-failed", action="store_true", help="Also retry photos that failed before.")
+
+    def handle(self, *args, **options):
+        try:
+            done = photos.render_pending(options["workers"], options["batch_size"], options["retry_failed"])
+        except photos.PhotoError as e:
+            raise CommandError(str(e))
+        self.stdout.write(self.style.SUCCESS(f"Rendered thumbnails of {done} photos."))
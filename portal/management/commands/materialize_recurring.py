@@ -0,0 +1,17 @@
+from django.core.management.base import BaseCommand
+from portal import recurring
+
+
+class Command(BaseCommand):
+    help = "Post the upcoming occurrences of recurring donations as donations."
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--days", type=int, default=recurring.DEFAULT_HORIZON,
+            help="How many days ahead to post donations.",
+        )
+        parser.add_argument("--batch-size", type=int, default=recurring.DEFAULT_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        created = recurring.materialize(options["days"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Created {created} donations."))
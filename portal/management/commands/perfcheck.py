@@ -0,0 +1,26 @@
+from django.core import checks
+from django.core.management.base import BaseCommand
+from portal.checks import TAG
+
+
+class Command(BaseCommand):
+    help = (
+        "Warn about settings that hurt performance (DEBUG, per-request "
+        "connections, SQLite journal mode, caches, sessions, templates, static "
+        "files, logging, request profiling).  Run it when a deployment starts."
+    )
+    requires_system_checks = []
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fail-level", default="ERROR", choices=["CRITICAL", "ERROR", "WARNING"],
+            help="Exit with an error when a check at this level or above fails (default: ERROR).",
+        )
+
+    def handle(self, *args, **options):
+        self.check(
+            tags=[TAG],
+            include_deployment_checks=True,
+            display_num_errors=True,
+            fail_level=getattr(checks, options["fail_level"]),
+        )
@@ -0,0 +1,50 @@
+import datetime
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+from portal import routes
+
+
+def coordinates(value):
+    try:
+        latitude, longitude = (float(part) for part in value.split(","))
+    except ValueError:
+        raise CommandError("--depot takes latitude,longitude.")
+    return latitude, longitude
+
+
+class Command(BaseCommand):
+    help = "Print pickup routes through the donations claimed for a day."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--date", help="YYYY-MM-DD (default: today).")
+        parser.add_argument("--depot", type=coordinates, help="Where routes start and end, as latitude,longitude.")
+        parser.add_argument("--max-stops", type=int, default=routes.DEFAULT_MAX_STOPS)
+        parser.add_argument(
+            "--window-hours", type=float, default=routes.DEFAULT_WINDOW.total_seconds() / 3600,
+            help="Length of the pickup-time windows routes are planned in.",
+        )
+
+    def handle(self, *args, **options):
+        day = parse_date(options["date"]) if options["date"] else timezone.localdate()
+        if day is None:
+            raise CommandError("--date takes YYYY-MM-DD.")
+        try:
+            planned = routes.plan(
+                routes.claimed(day),
+                depot=options["depot"],
+                max_stops=options["max_stops"],
+                window=datetime.timedelta(hours=options["window_hours"]),
+            )
+        except routes.PlanError as e:
+            raise CommandError(str(e))
+        for number, route in enumerate(planned, 1):
+            self.stdout.write(
+                f"Route {number}, from {route.window:%H:%M}: {len(route.stops)} stops, {route.distance:.1f} km"
+            )
+            for donation in route.stops:
+                self.stdout.write(
+                    f"  #{donation.pk} {donation.pickup_location} at {timezone.localtime(donation.pickup_time):%H:%M}"
+                )
+        self.stdout.write(self.style.SUCCESS(f"Planned {len(planned)} routes for {day}."))
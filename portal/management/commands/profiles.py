@@ -0,0 +1,67 @@
+import io
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from portal import profiling
+
+
+def _kib(size):
+    return f"{size / 1024:.1f} KiB"
+
+
+class Command(BaseCommand):
+    help = (
+        "Summarise the requests profiled by portal.profiling: each view's samples, "
+        "then across them the lines that kept the most memory and the hottest functions."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--view", help="Only this view's samples (its URL name).")
+        parser.add_argument("--limit", type=int, default=15, help="Allocators and functions to list.")
+        parser.add_argument(
+            "--sort", default="tottime", choices=["tottime", "cumulative", "ncalls"],
+            help="Order of the functions: own time (default), time including callees, or calls.",
+        )
+        parser.add_argument(
+            "--portal", action="store_true",
+            help="Charge each allocation to the project code that led to it, not the line that made it.",
+        )
+        parser.add_argument("--directory", help="Samples directory (default: PORTAL_REQUEST_PROFILE_DIR).")
+
+    def handle(self, *args, **options):
+        found = profiling.samples(options["directory"], options["view"])
+        if not found:
+            raise CommandError("No profiled requests found.")
+
+        self.stdout.write("Samples")
+        views = {}
+        for sample in found:
+            views.setdefault(sample.name, []).append(sample.meta)
+        for name, metas in views.items():
+            seconds = sorted(meta["seconds"] for meta in metas)
+            self.stdout.write(
+                f"  {name}: {len(metas)} sample(s), median {seconds[len(seconds) // 2] * 1000:.1f}ms, "
+                f"peak {_kib(max(meta['peak'] for meta in metas))}, "
+                f"retained {_kib(max(meta['retained'] for meta in metas))} at most"
+            )
+
+        root = str(settings.BASE_DIR) if options["portal"] else None
+        self.stdout.write("\nTop allocators (memory still held when the request finished)")
+        for allocator in profiling.allocators(found, root)[:options["limit"]]:
+            self.stdout.write(
+                f"  {_kib(allocator.size):>12} {allocator.count:>7} blocks "
+                f"{allocator.samples:>4}/{len(found)}  {allocator.where}"
+            )
+            line = profiling.source(allocator.where)
+            if line:
+                self.stdout.write(f"{'':>34}{line}")
+
+        self.stdout.write(f"\nHottest functions (by {options['sort']})")
+        # pstats writes partial lines, which the command's output wrapper
+        # would end one by one.
+        out = io.StringIO()
+        stats = profiling.stats(found, stream=out)
+        stats.files = []  # one heading line per sample file otherwise
+        stats.sort_stats(options["sort"]).print_stats(options["limit"])
+        self.stdout.write(out.getvalue(), ending="")
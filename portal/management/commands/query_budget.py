@@ -0,0 +1,44 @@
+import json
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.test.utils import setup_databases, setup_test_environment, teardown_databases, teardown_test_environment
+
+from portal import querybudget
+
+
+class Command(BaseCommand):
+    help = (
+        "Crawl every portal URL as each role on growing data in a throwaway test "
+        "database, and write the queries each view ran as a JSON report.  Fails "
+        "when a view's queries grow with the data or go over its budget."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--sizes", type=int, nargs="+", default=list(querybudget.DEFAULT_SIZES),
+            help="Units of data to crawl at, in increasing order.",
+        )
+        parser.add_argument("--output", help="Write the report to this file instead of standard output.")
+
+    def handle(self, *args, **options):
+        sizes = sorted(set(options["sizes"]))
+        setup_test_environment(debug=False)
+        old_config = setup_databases(verbosity=0, interactive=False, aliases={DEFAULT_DB_ALIAS})
+        try:
+            report = querybudget.report(querybudget.crawl(sizes), sizes)
+        finally:
+            teardown_databases(old_config, verbosity=0)
+            teardown_test_environment()
+
+        text = json.dumps(report, indent=2) + "\n"
+        if options["output"]:
+            with open(options["output"], "w", encoding="utf-8") as f:
+                f.write(text)
+        else:
+            self.stdout.write(text, ending="")
+        if report["problems"]:
+            for view in report["views"]:
+                for problem in view["problems"]:
+                    self.stderr.write(f"{view['route']} as {view['role']}: {problem}")
+            raise CommandError(f"{report['problems']} query budget problem(s).")
@@ -0,0 +1,65 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+from portal import events
+from portal.models import DonationEvent
+
+
+def parse_moment(value):
+    moment = parse_datetime(value)
+    if moment is None:
+        day = parse_date(value)
+        if day is None:
+            raise CommandError(f"Invalid date or datetime: {value!r}")
+        # A bare date means the end of that day.
+        moment = parse_datetime(f"{value}T23:59:59.999999")
+    if timezone.is_naive(moment):
+        moment = timezone.make_aware(moment)
+    return moment
+
+
+class Command(BaseCommand):
+    help = (
+        "Rebuild donation state from the append-only event log, as of now or "
+        "any earlier moment, and optionally check it against the live table."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--at", help="Replay up to this ISO date or datetime.")
+        parser.add_argument(
+            "--donation", type=int, action="append", dest="donations",
+            help="Only this donation; prints its history. May be repeated.",
+        )
+        parser.add_argument(
+            "--verify", action="store_true",
+            help="Fail if replaying the whole log does not reproduce the Donation table.",
+        )
+
+    def handle(self, *args, **options):
+        at = parse_moment(options["at"]) if options["at"] else None
+        donation_ids = options["donations"]
+
+        if options["verify"]:
+            mismatched = events.verify()
+            if mismatched:
+                raise CommandError(
+                    f"{len(mismatched)} donations differ from the log: "
+                    + ", ".join(map(str, mismatched[:20]))
+                )
+            self.stdout.write(self.style.SUCCESS("The event log reproduces every donation."))
+            return
+
+        state = events.replay(at, donation_ids)
+        if donation_ids:
+            history = DonationEvent.objects.filter(donation_id__in=donation_ids).order_by("pk")
+            if at is not None:
+                history = history.filter(at__lte=at)
+            for event in history:
+                self.stdout.write(
+                    f"{event.at.isoformat()}  #{event.donation_id}  {event.get_kind_display():<8}"
+                    f"  actor={event.actor_id}  {events.decode(event.data)}"
+                )
+            for donation_id in donation_ids:
+                self.stdout.write(f"#{donation_id}: {state.get(donation_id, 'deleted or not yet created')}")
+        moment = at.isoformat() if at else "now"
+        self.stdout.write(self.style.SUCCESS(f"{len(state)} donations existed as of {moment}."))
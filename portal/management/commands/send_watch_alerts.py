@@ -0,0 +1,44 @@
+from collections import defaultdict
+
+from django.conf import settings
+from django.core.mail import send_mass_mail
+from django.core.management.base import BaseCommand
+from portal import watch
+
+
+class Command(BaseCommand):
+    help = "Email receivers the queued alerts for donations matching their saved searches."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        sent = 0
+        while True:
+            alerts = list(watch.pending(options["batch_size"]))
+            if not alerts:
+                break
+            by_receiver = defaultdict(list)
+            for alert in alerts:
+                by_receiver[alert.search.receiver].append(alert)
+            # Receivers without an email address still see their alerts
+            # through the API, so theirs are marked sent as well.
+            send_mass_mail(
+                [
+                    (
+                        f"{len(matched)} new donation(s) match your saved searches",
+                        "\n".join(
+                            f"{alert.search.name}: {alert.donation.food_type}, "
+                            f"{alert.donation.quantity} at {alert.donation.pickup_location}"
+                            for alert in matched
+                        ),
+                        settings.DEFAULT_FROM_EMAIL,
+                        [receiver.email],
+                    )
+                    for receiver, matched in by_receiver.items()
+                    if receiver.email
+                ]
+            )
+            watch.mark_sent(alerts)
+            sent += len(alerts)
+        self.stdout.write(self.style.SUCCESS(f"Sent {sent} alerts."))
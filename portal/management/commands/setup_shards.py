@@ -0,0 +1,23 @@
+from django.core.management import call_command
+from django.core.management.base import BaseCommand
+
+from portal import sharding
+
+
+class Command(BaseCommand):
+    help = (
+        "Create or update the regional shard databases: apply the migrations, "
+        "start their ids at the region's block and copy every account into them."
+    )
+
+    def handle(self, *args, **options):
+        if not sharding.shards():
+            self.stdout.write("No shards configured (DJANGO_DB_SHARDS).")
+            return
+        for region, alias in sharding.shards().items():
+            call_command("migrate", database=alias, verbosity=0, interactive=False)
+            sharding.seed_ids(alias)
+            copied = sharding.copy_accounts(alias)
+            self.stdout.write(self.style.SUCCESS(
+                f"{region}: {alias} ready, ids from {sharding.first_id(alias)}, {copied} users copied."
+            ))
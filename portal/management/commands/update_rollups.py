@@ -0,0 +1,22 @@
+from django.core.management.base import BaseCommand
+from portal.analytics import rebuild_rollups, update_rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Refresh the daily donation analytics rollups, processing only rows "
+        "changed since the previous run."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--full", action="store_true", help="Recompute every rollup from scratch."
+        )
+
+    def handle(self, *args, **options):
+        if options["full"]:
+            groups = rebuild_rollups()
+            self.stdout.write(self.style.SUCCESS(f"Rebuilt {groups} rollup groups."))
+        else:
+            groups = update_rollups()
+            self.stdout.write(self.style.SUCCESS(f"Refreshed {groups} rollup groups."))
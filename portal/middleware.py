@@ -0,0 +1,246 @@
+import secrets
+import string
+from gzip import GzipFile
+from itertools import chain
+
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.middleware.csrf import CsrfViewMiddleware
+from django.middleware.gzip import GZipMiddleware
+from django.urls import Resolver404, resolve
+from django.utils.cache import patch_vary_headers
+from django.utils.regex_helper import _lazy_re_compile
+from django.utils.text import StreamingBuffer
+
+from . import pagecache, profiling, sharding
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available.
+    brotli = None
+
+re_accepts_br = _lazy_re_compile(r"\bbr\b")
+re_accepts_gzip = _lazy_re_compile(r"\bgzip\b")
+# Already compressed: compressing them again costs CPU and saves nothing.
+PRECOMPRESSED_TYPES = ("image/jpeg", "image/png", "image/webp", "image/gif")
+CSRF_FIELD = b'name="csrfmiddlewaretoken"'
+
+
+def _random_filename(max_random_bytes):
+    # Same BREACH mitigation as django.utils.text.compress_sequence: a random
+    # length gzip filename header varies the compressed size.
+    length = 1 + secrets.randbelow(max_random_bytes)
+    return "".join(secrets.choice(string.ascii_letters) for _ in range(length))
+
+
+def gzip_stream(sequence, max_random_bytes=None):
+    """
+    Gzip an iterable of byte chunks, flushing after every chunk.
+
+    Unlike django.utils.text.compress_sequence, each input chunk is emitted as
+    soon as it is written, so a streamed page keeps its time to first byte.
+    """
+    buf = StreamingBuffer()
+    filename = _random_filename(max_random_bytes) if max_random_bytes else None
+    with GzipFile(filename=filename, mode="wb", compresslevel=6, fileobj=buf, mtime=0) as zfile:
+        yield buf.read()
+        for item in sequence:
+            zfile.write(item)
+            zfile.flush()
+            data = buf.read()
+            if data:
+                yield data
+    yield buf.read()
+
+
+def brotli_stream(sequence):
+    """Brotli-compress an iterable of byte chunks, flushing after every chunk."""
+    compressor = brotli.Compressor(quality=5)
+    for item in sequence:
+        data = compressor.process(item) + compressor.flush()
+        if data:
+            yield data
+    yield compressor.finish()
+
+
+def holds_csrf_token(response):
+    """
+    Whether the body shows a CSRF form field, whoever the visitor is.  A
+    stream is judged by its first chunk, which is peeked at and put back.
+    """
+    if not response.streaming:
+        return CSRF_FIELD in response.content
+    if response.is_async:
+        # Gzipped by Django's middleware whatever the answer.
+        return True
+    chunks = iter(response.streaming_content)
+    first = next(chunks, b"")
+    response.streaming_content = chain([first], chunks)
+    return CSRF_FIELD in first
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Compress responses with Brotli when the client accepts it and the
+    ``Brotli`` package is installed, falling back to gzip.
+
+    Streaming responses are compressed chunk by chunk with a flush after each
+    one, so pages rendered with portal.streaming still reach the browser
+    incrementally.
+
+    Brotli has nothing like the random-length gzip filename Django adds
+    against BREACH, so a response whose body has a CSRF form field is always
+    gzipped, whether or not the visitor already had a token.  A streamed
+    page renders its forms with the header, in the first chunk (see
+    portal.streaming.render_feed).
+    """
+
+    def process_response(self, request, response):
+        if response.get("Content-Type", "").startswith(PRECOMPRESSED_TYPES):
+            return response
+        encoding = self.choose_encoding(request, response)
+        # Buffered gzip and async streams are handled by Django's middleware.
+        if (response.streaming and response.is_async) or (
+            not response.streaming and encoding != "br"
+        ):
+            return super().process_response(request, response)
+
+        if not response.streaming and len(response.content) < 200:
+            return response
+        if response.has_header("Content-Encoding"):
+            return response
+        patch_vary_headers(response, ("Accept-Encoding",))
+        if encoding is None:
+            return response
+
+        if response.streaming:
+            if encoding == "br":
+                response.streaming_content = brotli_stream(response.streaming_content)
+            else:
+                response.streaming_content = gzip_stream(
+                    response.streaming_content, max_random_bytes=self.max_random_bytes
+                )
+            del response.headers["Content-Length"]
+        else:
+            compressed_content = brotli.compress(response.content, quality=5)
+            if len(compressed_content) >= len(response.content):
+                return response
+            response.content = compressed_content
+            response.headers["Content-Length"] = str(len(response.content))
+
+        etag = response.get("ETag")
+        if etag and etag.startswith('"'):
+            response.headers["ETag"] = "W/" + etag
+        response.headers["Content-Encoding"] = encoding
+        return response
+
+    def choose_encoding(self, request, response):
+        ae = request.META.get("HTTP_ACCEPT_ENCODING", "")
+        if brotli is not None and re_accepts_br.search(ae) and not holds_csrf_token(response):
+            return "br"
+        if re_accepts_gzip.search(ae):
+            return "gzip"
+        return None
+
+
+class RegionMiddleware:
+    """
+    Make the logged-in user's region current (see portal.sharding), so the
+    view's queries go to that region's database.  It stays current until
+    the response is closed, since a streamed page runs its queries after
+    the view has returned.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PORTAL_SHARDS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        user = request.user
+        sharding.activate(user.region if user.is_authenticated else None)
+        return self.get_response(request)
+
+
+class ProfilingMiddleware:
+    """
+    Profile the requests portal.profiling picks: asked for with the
+    ``X-Portal-Profile`` header or sampled.  A streamed page is profiled
+    until its last chunk is sent.
+    """
+
+    def __init__(self, get_response):
+        if not (settings.PORTAL_REQUEST_PROFILE_EVERY or settings.PORTAL_REQUEST_PROFILE_TOKEN):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        profile = profiling.Profile.start() if profiling.wanted(request) else None
+        if profile is None:
+            return self.get_response(request)
+        try:
+            response = self.get_response(request)
+        except BaseException:
+            profile.pause()
+            profile.finish(request, None)
+            raise
+        if response.streaming and not response.is_async:
+            profile.pause()
+            response.streaming_content = profiling.profiled(response.streaming_content, profile, request, response)
+        else:
+            profile.finish(request, response)
+        return response
+
+
+class PageCacheMiddleware:
+    """
+    Answer anonymous GETs of page-cached views (portal.pagecache) from the
+    page cache before the session, CSRF, auth and message middleware below
+    run, and store the pages they produce for the next visitor.  Only the
+    CSRF middleware is asked for the visitor's token and cookie.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PORTAL_PAGE_CACHE_TIMEOUT:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.csrf = CsrfViewMiddleware(get_response)
+
+    def __call__(self, request):
+        policy = self.policy(request) if request.method == "GET" else None
+        if policy is None or not pagecache.timeout_for(policy):
+            return self.get_response(request)
+        if not pagecache.is_early(request):
+            response = self.get_response(request)
+            # Per-role views count their own.
+            if not policy.per_role:
+                pagecache.counters.add(policy.name, "bypass")
+                response.headers[pagecache.HEADER] = "bypass"
+            return response
+
+        setattr(request, pagecache.HANDLED, True)
+        key = "page:" + pagecache.request_key(request, "anonymous")
+        page = pagecache.store.get(key)
+        if page is not None:
+            self.csrf.process_request(request)
+            response = self.csrf.process_response(request, pagecache.thaw(page, request))
+            pagecache.counters.add(policy.name, "hit")
+            return response
+
+        response = self.get_response(request)
+        # Only what every anonymous visitor gets: nothing that started a
+        # session or left a message.
+        if set(response.cookies) <= {settings.CSRF_COOKIE_NAME}:
+            page = pagecache.freeze(response)
+            if page is not None:
+                pagecache.store.set(key, page, pagecache.timeout_for(policy))
+        pagecache.counters.add(policy.name, "miss")
+        response.headers[pagecache.HEADER] = "miss"
+        return response
+
+    def policy(self, request):
+        try:
+            match = resolve(request.path_info)
+        except Resolver404:
+            return None
+        return getattr(match.func, "page_cache", None)
@@ -0,0 +1,66 @@
+# Generated by Django 5.1.15 on 2026-10-18 23:44
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0007_receiver'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RollupInvalidation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('donor_id', models.BigIntegerField()),
+                ('pickup_location', models.CharField(max_length=255)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='Watermark',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True)),
+                ('value', models.DateTimeField()),
+            ],
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='request',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True),
+        ),
+        migrations.CreateModel(
+            name='DonationRollup',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('day', models.DateField()),
+                ('pickup_location', models.CharField(max_length=255)),
+                ('donations', models.PositiveIntegerField(default=0)),
+                ('meals', models.PositiveIntegerField(default=0)),
+                ('claimed', models.PositiveIntegerField(default=0)),
+                ('claim_seconds', models.BigIntegerField(default=0)),
+                ('expired_unclaimed', models.PositiveIntegerField(default=0)),
+                ('donor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('day', 'donor', 'pickup_location'), name='unique_rollup_group')],
+            },
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-18 23:47
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0008_analytics_rollups'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='donation',
+            name='food_type',
+            field=models.CharField(db_index=True, max_length=100),
+        ),
+        migrations.AlterField(
+            model_name='donation',
+            name='pickup_time',
+            field=models.DateTimeField(db_index=True),
+        ),
+        migrations.AlterField(
+            model_name='donation',
+            name='status',
+            field=models.CharField(choices=[('Available', 'Available'), ('Requested', 'Requested')], db_index=True, default='Available', max_length=20),
+        ),
+    ]
@@ -0,0 +1,59 @@
+# Generated by Django 5.1.15 on 2026-10-19 00:00
+
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import migrations, models
+from django.utils import timezone
+
+TRACKED_FIELDS = (
+    'donor_id', 'food_type', 'quantity', 'pickup_location',
+    'pickup_time', 'expiry_date', 'status',
+)
+
+
+def backfill_created_events(apps, schema_editor):
+    # Start the log with a CREATED event holding each existing donation's
+    # current state, so replaying it reproduces the table.
+    Donation = apps.get_model('portal', 'Donation')
+    DonationEvent = apps.get_model('portal', 'DonationEvent')
+    now = timezone.now()
+    batch = []
+    for row in Donation.objects.order_by('pk').values('pk', 'created_at', *TRACKED_FIELDS).iterator(chunk_size=2000):
+        batch.append(DonationEvent(
+            donation_id=row.pop('pk'),
+            kind=1,
+            at=row.pop('created_at') or now,
+            data=json.dumps(row, cls=DjangoJSONEncoder, separators=(',', ':')).encode(),
+        ))
+        if len(batch) == 2000:
+            DonationEvent.objects.bulk_create(batch)
+            batch = []
+    DonationEvent.objects.bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0009_admin_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonationEvent',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('donation_id', models.BigIntegerField(db_index=True)),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Created'), (2, 'Edited'), (3, 'Claimed'), (4, 'Expired'), (5, 'Deleted')])),
+                ('at', models.DateTimeField()),
+                ('actor_id', models.BigIntegerField(null=True)),
+                ('data', models.BinaryField()),
+            ],
+        ),
+        migrations.AlterField(
+            model_name='donation',
+            name='status',
+            field=models.CharField(choices=[('Available', 'Available'), ('Requested', 'Requested'), ('Expired', 'Expired')], db_index=True, default='Available', max_length=20),
+        ),
+        migrations.RunPython(backfill_created_events, migrations.RunPython.noop),
+    ]
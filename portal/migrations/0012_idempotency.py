@@ -0,0 +1,45 @@
+# Generated by Django 5.1.15 on 2026-10-19 00:09
+
+from django.db import migrations, models
+from django.db.models import Count, Min
+
+
+def delete_duplicate_requests(apps, schema_editor):
+    # Keep the first request each receiver made for a donation.
+    Request = apps.get_model('portal', 'Request')
+    duplicates = (
+        Request.objects.values('donation', 'requester')
+        .annotate(first=Min('id'), total=Count('id'))
+        .filter(total__gt=1)
+    )
+    for group in duplicates.iterator():
+        Request.objects.filter(
+            donation=group['donation'], requester=group['requester'], id__gt=group['first']
+        ).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0011_archive_tier'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyKey',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=255, unique=True)),
+                ('created_at', models.DateTimeField(db_index=True)),
+                ('status_code', models.PositiveSmallIntegerField(null=True)),
+                ('content_type', models.CharField(blank=True, max_length=100)),
+                ('location', models.CharField(blank=True, max_length=2000)),
+                ('content', models.BinaryField(blank=True)),
+            ],
+        ),
+        migrations.RunPython(delete_duplicate_requests, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='request',
+            constraint=models.UniqueConstraint(fields=('donation', 'requester'), name='unique_request_per_requester'),
+        ),
+    ]
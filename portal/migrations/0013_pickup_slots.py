@@ -0,0 +1,61 @@
+# Generated by Django 5.1.15 on 2026-10-19 00:11
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0012_idempotency'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PickupSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('capacity', models.PositiveSmallIntegerField(default=1)),
+                ('booked', models.PositiveSmallIntegerField(default=0)),
+                ('donation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='slots', to='portal.donation')),
+            ],
+            options={
+                'ordering': ['start'],
+            },
+        ),
+        migrations.CreateModel(
+            name='PickupBooking',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('start', models.DateTimeField()),
+                ('end', models.DateTimeField()),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to=settings.AUTH_USER_MODEL)),
+                ('request', models.OneToOneField(null=True, on_delete=django.db.models.deletion.CASCADE, related_name='booking', to='portal.request')),
+                ('slot', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='bookings', to='portal.pickupslot')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='pickupslot',
+            index=models.Index(fields=['start'], name='pickup_slot_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='pickupslot',
+            constraint=models.CheckConstraint(condition=models.Q(('end__gt', models.F('start'))), name='slot_ends_after_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='pickupslot',
+            constraint=models.CheckConstraint(condition=models.Q(('booked__lte', models.F('capacity'))), name='slot_within_capacity'),
+        ),
+        migrations.AddIndex(
+            model_name='pickupbooking',
+            index=models.Index(fields=['receiver', 'start'], name='pickup_booking_receiver_start'),
+        ),
+        migrations.AddConstraint(
+            model_name='pickupbooking',
+            constraint=models.UniqueConstraint(fields=('slot', 'receiver'), name='unique_booking_per_receiver'),
+        ),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 5.1.15 on 2026-10-19 00:16
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0013_pickup_slots'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SavedSearch',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=100)),
+                ('terms', models.CharField(blank=True, max_length=200)),
+                ('location', models.CharField(blank=True, max_length=255)),
+                ('min_days_left', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('token', models.CharField(blank=True, max_length=100)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('receiver', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='saved_searches', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.CreateModel(
+            name='WatchAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('sent_at', models.DateTimeField(blank=True, db_index=True, null=True)),
+                ('donation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='portal.donation')),
+                ('search', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='alerts', to='portal.savedsearch')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='savedsearch',
+            index=models.Index(fields=['token', 'location'], name='saved_search_key'),
+        ),
+        migrations.AddConstraint(
+            model_name='watchalert',
+            constraint=models.UniqueConstraint(fields=('search', 'donation'), name='unique_alert_per_search'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.15 on 2026-10-19 00:57
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0014_saved_searches'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='archivedrequest',
+            name='decided_at',
+            field=models.DateTimeField(null=True),
+        ),
+        migrations.AddField(
+            model_name='archivedrequest',
+            name='status',
+            field=models.CharField(default='pending', max_length=10),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='decided_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='request',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pending'), ('accepted', 'Accepted'), ('declined', 'Declined'), ('collected', 'Collected')], default='pending', max_length=10),
+        ),
+    ]
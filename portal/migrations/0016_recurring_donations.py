@@ -0,0 +1,51 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:04
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0015_request_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='donation',
+            name='occurrence',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='RecurringDonation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('food_type', models.CharField(max_length=100)),
+                ('quantity', models.CharField(max_length=50)),
+                ('pickup_location', models.CharField(max_length=255)),
+                ('rule', models.CharField(default='FREQ=DAILY', max_length=200)),
+                ('pickup_time', models.TimeField()),
+                ('shelf_days', models.PositiveSmallIntegerField(default=1)),
+                ('starts_on', models.DateField()),
+                ('ends_on', models.DateField(blank=True, null=True)),
+                ('active', models.BooleanField(default=True)),
+                ('materialized_until', models.DateField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('donor', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recurring_donations', to=settings.AUTH_USER_MODEL)),
+            ],
+        ),
+        migrations.AddField(
+            model_name='donation',
+            name='recurrence',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='donations', to='portal.recurringdonation'),
+        ),
+        migrations.AddConstraint(
+            model_name='donation',
+            constraint=models.UniqueConstraint(fields=('recurrence', 'occurrence'), name='unique_occurrence_per_recurrence'),
+        ),
+        migrations.AddIndex(
+            model_name='recurringdonation',
+            index=models.Index(fields=['active', 'materialized_until'], name='recurring_due'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:18
+
+import django.db.models.deletion
+import portal.models
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0016_recurring_donations'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DonationPhoto',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('image', models.FileField(max_length=200, upload_to=portal.models.photo_path)),
+                ('content_type', models.CharField(max_length=20)),
+                ('size', models.PositiveIntegerField()),
+                ('status', models.CharField(choices=[('pending', 'Pending'), ('ready', 'Ready'), ('failed', 'Failed')], default='pending', max_length=10)),
+                ('thumbnail', models.CharField(blank=True, max_length=100)),
+                ('width', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('height', models.PositiveSmallIntegerField(blank=True, null=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('donation', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='photos', to='portal.donation')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['status', 'id'], name='photo_status')],
+            },
+        ),
+    ]
@@ -0,0 +1,62 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:23
+
+from django.db import migrations, models
+
+# (kind, table) pairs; kinds match Change.DONATION and Change.REQUEST.
+TRACKED_TABLES = ((1, 'portal_donation'), (2, 'portal_request'))
+
+
+def trigger_sql(kind, table):
+    # Every write replaces the row's Change with a new one, which the
+    # AUTOINCREMENT key puts after every change made before it.
+    def body(row, deleted):
+        return (
+            f'DELETE FROM portal_change WHERE kind = {kind} AND object_id = {row}.id; '
+            f'INSERT INTO portal_change (kind, object_id, deleted) VALUES ({kind}, {row}.id, {deleted}); '
+        )
+
+    soft_deleted = 'NEW.deleted_at IS NOT NULL'
+    return [
+        f'CREATE TRIGGER {table}_change_insert AFTER INSERT ON {table} BEGIN {body("NEW", soft_deleted)}END;',
+        f'CREATE TRIGGER {table}_change_update AFTER UPDATE ON {table} BEGIN {body("NEW", soft_deleted)}END;',
+        f'CREATE TRIGGER {table}_change_delete AFTER DELETE ON {table} BEGIN {body("OLD", 1)}END;',
+    ]
+
+
+def drop_trigger_sql(table):
+    return [f'DROP TRIGGER IF EXISTS {table}_change_{event};' for event in ('insert', 'update', 'delete')]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0017_donation_photos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Change',
+            fields=[
+                ('seq', models.BigAutoField(primary_key=True, serialize=False)),
+                ('kind', models.PositiveSmallIntegerField(choices=[(1, 'Donation'), (2, 'Request')])),
+                ('object_id', models.BigIntegerField()),
+                ('deleted', models.BooleanField(default=False)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='one_change_per_object')],
+            },
+        ),
+        # Existing rows start the feed, in id order.
+        migrations.RunSQL(
+            [
+                f'INSERT INTO portal_change (kind, object_id, deleted) '
+                f'SELECT {kind}, id, deleted_at IS NOT NULL FROM {table} ORDER BY id;'
+                for kind, table in TRACKED_TABLES
+            ],
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            [sql for kind, table in TRACKED_TABLES for sql in trigger_sql(kind, table)],
+            [sql for kind, table in TRACKED_TABLES for sql in drop_trigger_sql(table)],
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-19 01:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0019_donation_coordinates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='user',
+            name='region',
+            field=models.CharField(blank=True, default='', max_length=50),
+        ),
+    ]
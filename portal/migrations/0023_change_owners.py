@@ -0,0 +1,66 @@
+# Generated by Django 5.1.15 on 2026-10-19 02:37
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+change_feed = import_module('portal.migrations.0018_change_feed')
+
+# Kind 2 is Change.REQUEST.
+REQUEST_KIND, REQUEST_TABLE = 2, 'portal_request'
+DONOR = 'SELECT donor_id FROM portal_donation WHERE id = {row}.donation_id'
+
+
+def trigger_sql():
+    # As in 0018, and the change also records who may see the request, so
+    # its tombstone outlives the row.  A cascade deletes the requests before
+    # their donation, so the donor is still there to look up.
+    def body(row, deleted):
+        return (
+            f'DELETE FROM portal_change WHERE kind = {REQUEST_KIND} AND object_id = {row}.id; '
+            f'INSERT INTO portal_change (kind, object_id, deleted, requester_id, donor_id) '
+            f'VALUES ({REQUEST_KIND}, {row}.id, {deleted}, {row}.requester_id, ({DONOR.format(row=row)})); '
+        )
+
+    soft_deleted = 'NEW.deleted_at IS NOT NULL'
+    table = REQUEST_TABLE
+    return [
+        f'CREATE TRIGGER {table}_change_insert AFTER INSERT ON {table} BEGIN {body("NEW", soft_deleted)}END;',
+        f'CREATE TRIGGER {table}_change_update AFTER UPDATE ON {table} BEGIN {body("NEW", soft_deleted)}END;',
+        f'CREATE TRIGGER {table}_change_delete AFTER DELETE ON {table} BEGIN {body("OLD", 1)}END;',
+    ]
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('portal', '0022_savedsearch_radius'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='change',
+            name='donor_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        migrations.AddField(
+            model_name='change',
+            name='requester_id',
+            field=models.BigIntegerField(null=True),
+        ),
+        # Existing tombstones keep no owners and go to nobody.
+        migrations.RunSQL(
+            [
+                f'UPDATE portal_change SET '
+                f'requester_id = (SELECT requester_id FROM {REQUEST_TABLE} r WHERE r.id = object_id), '
+                f'donor_id = (SELECT d.donor_id FROM {REQUEST_TABLE} r JOIN portal_donation d '
+                f'ON d.id = r.donation_id WHERE r.id = object_id) '
+                f'WHERE kind = {REQUEST_KIND};'
+            ],
+            migrations.RunSQL.noop,
+        ),
+        migrations.RunSQL(
+            change_feed.drop_trigger_sql(REQUEST_TABLE) + trigger_sql(),
+            change_feed.drop_trigger_sql(REQUEST_TABLE) + change_feed.trigger_sql(REQUEST_KIND, REQUEST_TABLE),
+        ),
+    ]
@@ -1,5 +1,9 @@
+import uuid
+
 from django.contrib.auth.models import AbstractUser
+from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
+from django.utils import timezone
 
 # Custom User model
 class User(AbstractUser):
@@ -7,6 +11,8 @@ class User(AbstractUser):
     user_type = models.CharField(
         max_length=10, choices=USER_TYPE_CHOICES, default="donor"
     )
+    # Picks the database of the user's donations and requests (portal.sharding)
+    region = models.CharField(max_length=50, blank=True, default="")
 
     def __str__(self):
         return self.username
@@ -30,26 +36,420 @@ class Receiver(models.Model):
         return f"Receiver: {self.user.username}"
 
 
+# Default manager of soft-deletable models: hides deleted rows
+class LiveManager(models.Manager):
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True)
+
+
 # Donation model
 class Donation(models.Model):
+    STATUS_CHOICES = [
+        ("Available", "Available"),
+        ("Requested", "Requested"),
+        ("Expired", "Expired"),
+    ]
     donor = models.ForeignKey(User, on_delete=models.CASCADE)
-    food_type = models.CharField(max_length=100)
+    food_type = models.CharField(max_length=100, db_index=True)
     quantity = models.CharField(max_length=50)
     pickup_location = models.CharField(max_length=255)
-    pickup_time = models.DateTimeField()
+    # Where pickup_location is, for route planning (portal.routes)
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    pickup_time = models.DateTimeField(db_index=True)
     expiry_date = models.DateField()
-    status = models.CharField(default="Available", max_length=20)
+    status = models.CharField(
+        choices=STATUS_CHOICES, default="Available", max_length=20, db_index=True
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True, db_index=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+    # Set on donations generated from a RecurringDonation (portal.recurring)
+    recurrence = models.ForeignKey(
+        "RecurringDonation", on_delete=models.SET_NULL, null=True, blank=True, related_name="donations"
+    )
+    occurrence = models.DateField(null=True, blank=True)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["recurrence", "occurrence"], name="unique_occurrence_per_recurrence"
+            )
+        ]
 
     def __str__(self):
         return f"{self.food_type} by {self.donor.username}"
 
+    def soft_delete(self):
+        """Hide the donation and its requests; portal.archive moves them out later."""
+        self.deleted_at = timezone.now()
+        self.save(update_fields=["deleted_at", "updated_at"])
+        Request.objects.filter(donation=self).update(deleted_at=self.deleted_at)
 
-# Request model
+
+# Request model; status moves through portal.inbox's state machine
 class Request(models.Model):
+    PENDING = "pending"
+    ACCEPTED = "accepted"
+    DECLINED = "declined"
+    COLLECTED = "collected"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (ACCEPTED, "Accepted"),
+        (DECLINED, "Declined"),
+        (COLLECTED, "Collected"),
+    ]
     donation = models.ForeignKey(Donation, on_delete=models.CASCADE)
     requester = models.ForeignKey(User, on_delete=models.CASCADE)
     message = models.TextField()
-    created_at = models.DateTimeField(auto_now_add=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    decided_at = models.DateTimeField(null=True, blank=True)
+    deleted_at = models.DateTimeField(null=True, blank=True)
+
+    objects = LiveManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["donation", "requester"], name="unique_request_per_requester"
+            )
+        ]
 
     def __str__(self):
         return f"Request by {self.requester.username} on {self.donation.food_type}"
+
+
+# A donation posted on a schedule; portal.recurring materialises its
+# upcoming occurrences as Donation rows
+class RecurringDonation(models.Model):
+    donor = models.ForeignKey(User, on_delete=models.CASCADE, related_name="recurring_donations")
+    food_type = models.CharField(max_length=100)
+    quantity = models.CharField(max_length=50)
+    pickup_location = models.CharField(max_length=255)
+    latitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-90), MaxValueValidator(90)]
+    )
+    longitude = models.FloatField(
+        null=True, blank=True, validators=[MinValueValidator(-180), MaxValueValidator(180)]
+    )
+    # RRULE subset, e.g. "FREQ=WEEKLY;BYDAY=MO,WE,FR" (see portal.recurring)
+    rule = models.CharField(max_length=200, default="FREQ=DAILY")
+    pickup_time = models.TimeField()
+    shelf_days = models.PositiveSmallIntegerField(default=1)
+    starts_on = models.DateField()
+    ends_on = models.DateField(null=True, blank=True)
+    active = models.BooleanField(default=True)
+    # Occurrences up to this date have been generated
+    materialized_until = models.DateField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["active", "materialized_until"], name="recurring_due"),
+        ]
+
+    def __str__(self):
+        return f"{self.food_type} by {self.donor.username} ({self.rule})"
+
+    def clean(self):
+        from django.core.exceptions import ValidationError
+
+        from .recurring import RuleError, parse_rule
+
+        try:
+            parse_rule(self.rule)
+        except RuleError as e:
+            raise ValidationError({"rule": str(e)})
+        if self.ends_on and self.ends_on < self.starts_on:
+            raise ValidationError({"ends_on": "The schedule must end after it starts."})
+
+
+def photo_path(photo, filename):
+    # Random names: nothing about the upload reaches the file system, and a
+    # name is never reused, so the file can be cached forever.
+    return f"photos/originals/{uuid.uuid4().hex}{photo.extension()}"
+
+
+# Photo of a donation; portal.photos renders its thumbnails off the request path
+class DonationPhoto(models.Model):
+    PENDING = "pending"
+    READY = "ready"
+    FAILED = "failed"
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (READY, "Ready"),
+        (FAILED, "Failed"),
+    ]
+    EXTENSIONS = {"image/jpeg": ".jpg", "image/png": ".png", "image/webp": ".webp"}
+
+    donation = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name="photos")
+    image = models.FileField(upload_to=photo_path, max_length=200)
+    content_type = models.CharField(max_length=20)
+    size = models.PositiveIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    # Thumbnails are "<thumbnail>-<width>.webp" and ".jpg" next to each other;
+    # width and height are those of the smallest.
+    thumbnail = models.CharField(max_length=100, blank=True)
+    width = models.PositiveSmallIntegerField(null=True, blank=True)
+    height = models.PositiveSmallIntegerField(null=True, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "id"], name="photo_status"),
+        ]
+
+    def __str__(self):
+        return f"Photo {self.pk} of {self.donation_id}"
+
+    def extension(self):
+        return self.EXTENSIONS.get(self.content_type, "")
+
+
+# Bookable pickup window for a donation (see portal.pickups)
+class PickupSlot(models.Model):
+    donation = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name="slots")
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    capacity = models.PositiveSmallIntegerField(default=1)
+    booked = models.PositiveSmallIntegerField(default=0)
+
+    class Meta:
+        ordering = ["start"]
+        indexes = [models.Index(fields=["start"], name="pickup_slot_start")]
+        constraints = [
+            models.CheckConstraint(
+                condition=models.Q(end__gt=models.F("start")), name="slot_ends_after_start"
+            ),
+            models.CheckConstraint(
+                condition=models.Q(booked__lte=models.F("capacity")), name="slot_within_capacity"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.donation.food_type}: {self.start:%Y-%m-%d %H:%M}-{self.end:%H:%M}"
+
+
+# A receiver's place in a pickup slot, made together with their Request
+class PickupBooking(models.Model):
+    slot = models.ForeignKey(PickupSlot, on_delete=models.CASCADE, related_name="bookings")
+    receiver = models.ForeignKey(User, on_delete=models.CASCADE)
+    request = models.OneToOneField(Request, on_delete=models.CASCADE, null=True, related_name="booking")
+    # Copied from the slot: a receiver's bookings, ordered by start, form the
+    # interval index that conflict checks scan (see portal.pickups).
+    start = models.DateTimeField()
+    end = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["receiver", "start"], name="pickup_booking_receiver_start")]
+        constraints = [
+            models.UniqueConstraint(fields=["slot", "receiver"], name="unique_booking_per_receiver")
+        ]
+
+    def __str__(self):
+        return f"{self.receiver.username} at {self.slot}"
+
+
+# A receiver's saved search, matched against new donations by portal.watch
+class SavedSearch(models.Model):
+    receiver = models.ForeignKey(User, on_delete=models.CASCADE, related_name="saved_searches")
+    name = models.CharField(max_length=100)
+    # Normalised by portal.watch: lower-case words the food type must all
+    # contain, and the pickup location ("" matches anything).
+    terms = models.CharField(max_length=200, blank=True)
+    location = models.CharField(max_length=255, blank=True)
+    min_days_left = models.PositiveSmallIntegerField(null=True, blank=True)
+    # Or a point and a radius instead of a location, with the bounding box
+    # of that circle for the candidate query.
+    latitude = models.FloatField(null=True, blank=True)
+    longitude = models.FloatField(null=True, blank=True)
+    radius_km = models.FloatField(null=True, blank=True)
+    min_latitude = models.FloatField(null=True, blank=True)
+    max_latitude = models.FloatField(null=True, blank=True)
+    min_longitude = models.FloatField(null=True, blank=True)
+    max_longitude = models.FloatField(null=True, blank=True)
+    # Index keys: one of the terms and the location.  A donation can only
+    # match searches whose token is one of its words (or "") and whose
+    # location is its own (or "", which radius searches use).
+    token = models.CharField(max_length=100, blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["token", "location"], name="saved_search_key")]
+
+    def __str__(self):
+        return f"{self.receiver.username}: {self.name}"
+
+
+# Queued notification that a new donation matched a saved search
+class WatchAlert(models.Model):
+    search = models.ForeignKey(SavedSearch, on_delete=models.CASCADE, related_name="alerts")
+    donation = models.ForeignKey(Donation, on_delete=models.CASCADE, related_name="+")
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["search", "donation"], name="unique_alert_per_search")
+        ]
+
+    def __str__(self):
+        return f"{self.search} -> {self.donation_id}"
+
+
+# Archive tier: completed, expired and deleted donations moved out of the
+# live tables by portal.archive, keeping their original ids
+class ArchivedDonation(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    donor = models.ForeignKey(User, on_delete=models.CASCADE)
+    food_type = models.CharField(max_length=100)
+    quantity = models.CharField(max_length=50)
+    pickup_location = models.CharField(max_length=255)
+    latitude = models.FloatField(null=True)
+    longitude = models.FloatField(null=True)
+    pickup_time = models.DateTimeField(db_index=True)
+    expiry_date = models.DateField()
+    status = models.CharField(max_length=20)
+    created_at = models.DateTimeField()
+    updated_at = models.DateTimeField()
+    deleted_at = models.DateTimeField(null=True)
+    archived_at = models.DateTimeField(db_index=True)
+
+    def __str__(self):
+        return f"{self.food_type} by {self.donor.username} (archived)"
+
+
+class ArchivedRequest(models.Model):
+    id = models.BigIntegerField(primary_key=True)
+    donation = models.ForeignKey(ArchivedDonation, on_delete=models.CASCADE, related_name="requests")
+    requester = models.ForeignKey(User, on_delete=models.CASCADE)
+    message = models.TextField()
+    status = models.CharField(max_length=10, default=Request.PENDING)
+    created_at = models.DateTimeField()
+    decided_at = models.DateTimeField(null=True)
+    deleted_at = models.DateTimeField(null=True)
+
+    def __str__(self):
+        return f"Request by {self.requester.username} on {self.donation.food_type} (archived)"
+
+
+# Append-only donation lifecycle log, written and replayed by portal.events.
+# No foreign keys, so history outlives the donations and users it mentions.
+class DonationEvent(models.Model):
+    CREATED, EDITED, CLAIMED, EXPIRED, DELETED = range(1, 6)
+    KIND_CHOICES = [
+        (CREATED, "Created"),
+        (EDITED, "Edited"),
+        (CLAIMED, "Claimed"),
+        (EXPIRED, "Expired"),
+        (DELETED, "Deleted"),
+    ]
+    donation_id = models.BigIntegerField(db_index=True)
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    at = models.DateTimeField()
+    actor_id = models.BigIntegerField(null=True)
+    # Changed fields as compact JSON (the full record for CREATED)
+    data = models.BinaryField()
+
+    def save(self, *args, **kwargs):
+        if not self._state.adding:
+            raise ValueError("Donation events are append-only.")
+        super().save(*args, **kwargs)
+
+    def delete(self, *args, **kwargs):
+        raise ValueError("Donation events are append-only.")
+
+    def __str__(self):
+        return f"{self.get_kind_display()} donation {self.donation_id} at {self.at}"
+
+
+# Latest change to each donation and request, written by database triggers
+# (see portal.changes); seq orders the change feed
+class Change(models.Model):
+    DONATION, REQUEST = 1, 2
+    KIND_CHOICES = [
+        (DONATION, "Donation"),
+        (REQUEST, "Request"),
+    ]
+    seq = models.BigAutoField(primary_key=True)
+    kind = models.PositiveSmallIntegerField(choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    deleted = models.BooleanField(default=False)
+    # A request's requester and donation donor, kept so its tombstone only
+    # goes to the users who could see it.
+    requester_id = models.BigIntegerField(null=True)
+    donor_id = models.BigIntegerField(null=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=["kind", "object_id"], name="one_change_per_object"),
+        ]
+
+    def __str__(self):
+        state = "deleted" if self.deleted else "changed"
+        return f"{self.get_kind_display()} {self.object_id} {state} (#{self.seq})"
+
+
+# Stored results of idempotent POSTs (see portal.idempotency); status_code
+# stays null while the first request is still running
+class IdempotencyKey(models.Model):
+    key = models.CharField(max_length=255, unique=True)
+    created_at = models.DateTimeField(db_index=True)
+    # When the request now running with this key started; see portal.idempotency
+    claimed_at = models.DateTimeField(default=timezone.now)
+    status_code = models.PositiveSmallIntegerField(null=True)
+    content_type = models.CharField(max_length=100, blank=True)
+    location = models.CharField(max_length=2000, blank=True)
+    content = models.BinaryField(blank=True)
+
+    def __str__(self):
+        return self.key
+
+
+# Daily analytics rollup per donor and pickup location, maintained by the
+# update_rollups management command (see portal.analytics)
+class DonationRollup(models.Model):
+    day = models.DateField()
+    donor = models.ForeignKey(User, on_delete=models.CASCADE)
+    pickup_location = models.CharField(max_length=255)
+    donations = models.PositiveIntegerField(default=0)
+    meals = models.PositiveIntegerField(default=0)
+    claimed = models.PositiveIntegerField(default=0)
+    claim_seconds = models.BigIntegerField(default=0)
+    expired_unclaimed = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["day", "donor", "pickup_location"], name="unique_rollup_group"
+            )
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.donor_id} {self.pickup_location}"
+
+
+# Rollup groups whose donations moved away or were deleted since the last run
+class RollupInvalidation(models.Model):
+    day = models.DateField()
+    donor_id = models.BigIntegerField()
+    pickup_location = models.CharField(max_length=255)
+
+
+# High-water marks for incremental jobs
+class Watermark(models.Model):
+    name = models.CharField(max_length=50, unique=True)
+    value = models.DateTimeField()
+
+    def __str__(self):
+        return f"{self.name}: {self.value}"
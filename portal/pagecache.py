@@ -0,0 +1,281 @@
+"""
+Full-page cache for pages that are the same for every visitor, or for
+every user of a role.
+
+Views opt in with ``@page_cache()``.  Only GETs answered with a plain 200
+are stored, in a per-process LRU (``store``) for
+``PORTAL_PAGE_CACHE_TIMEOUT`` seconds, at most
+``PORTAL_PAGE_CACHE_MAX_PAGES`` pages.  Two layers serve from it:
+
+- ``portal.middleware.PageCacheMiddleware`` answers anonymous visitors
+  without a session or pending messages before the session, CSRF, auth
+  and message middleware run at all, with the headers those added when
+  the page was stored.
+- With ``per_role=True`` the decorator also answers everyone else, keyed
+  on their role (anonymous, donor, receiver, staff), after the middleware
+  but without running the view or rendering its template.  Only use it
+  where nothing in the page depends on who the user is beyond their role,
+  and where the page costs more to render than loading the session and
+  user does (benchmarks/bench_page_cache.py).  A request with messages
+  to show is never cached.
+
+CSRF tokens are masked per request, so the stored page holds a
+placeholder where the ``{% csrf_token %}`` field's value was and every
+hit fills in a token for the visitor's own CSRF cookie (setting the
+cookie when they have none).  A page that shows its token anywhere else
+is not stored.
+
+Every response of a cached view says ``X-Page-Cache: hit``, ``miss`` or
+``bypass``.  The counts are added up per view in this process and flushed
+to the default cache every ``FLUSH_INTERVAL`` seconds, so with a shared
+cache ``stats()`` (``/api/v1/page-cache/`` for staff) covers every worker.
+"""
+
+import re
+import threading
+import time
+from collections import namedtuple
+from functools import wraps
+
+from django.conf import settings
+from django.contrib.messages import get_messages
+from django.contrib.messages.storage.cookie import CookieStorage
+from django.core.cache import cache
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from django.http import HttpResponse
+from django.middleware.csrf import get_token
+from django.utils.autoreload import file_changed
+
+HEADER = "X-Page-Cache"
+OUTCOMES = ("hit", "miss", "bypass")
+FLUSH_INTERVAL = 10.0
+CSRF_PLACEHOLDER = b"\x00portal-csrf-token\x00"
+# Set by the middleware on requests it looks after, so the decorator
+# leaves them alone.
+HANDLED = "_page_cache_handled"
+
+_csrf_field = re.compile(rb'(name="csrfmiddlewaretoken" value=")([A-Za-z0-9]+)(")')
+# Recomputed for each hit; Set-Cookie is never part of response.items().
+_unstored_headers = {"content-length", HEADER.lower()}
+
+# name: the view, for the stats; timeout: seconds, None for the setting.
+Policy = namedtuple("Policy", "name per_role timeout")
+Page = namedtuple("Page", "status content headers csrf")
+
+
+class PageStore:
+    """
+    Thread-safe in-process pages with an expiry, the least recently used
+    dropped once ``max_pages`` are held.
+    """
+
+    def __init__(self, max_pages=None, clock=time.monotonic):
+        self.max_pages = max_pages
+        self.clock = clock
+        self._pages = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            found = self._pages.pop(key, None)
+            if found is None or found[0] <= self.clock():
+                return None
+            self._pages[key] = found
+            return found[1]
+
+    def set(self, key, page, timeout):
+        max_pages = self.max_pages or settings.PORTAL_PAGE_CACHE_MAX_PAGES
+        with self._lock:
+            self._pages.pop(key, None)
+            self._pages[key] = (self.clock() + timeout, page)
+            while len(self._pages) > max_pages:
+                del self._pages[next(iter(self._pages))]
+
+    def __len__(self):
+        return len(self._pages)
+
+    def clear(self):
+        with self._lock:
+            self._pages.clear()
+
+
+store = PageStore()
+
+
+@receiver(setting_changed)
+def clear_pages(**kwargs):
+    # Pages render from settings too: the signup form's regions, static URLs.
+    store.clear()
+
+
+@receiver(file_changed)
+def clear_pages_on_edit(sender, file_path, **kwargs):
+    # Under runserver, Django's own template_changed receiver drops the
+    # compiled templates when one is edited; drop the pages rendered from
+    # them too.  A changed .py file restarts the server anyway.
+    store.clear()
+
+
+# Hit metrics
+
+class Counters:
+    """Outcomes per view, added to the default cache at most every ``interval`` seconds."""
+
+    def __init__(self, interval=FLUSH_INTERVAL, clock=time.monotonic):
+        self.interval = interval
+        self.clock = clock
+        self.views = set()
+        self._pending = {}
+        self._flushed = clock()
+        self._lock = threading.Lock()
+
+    def add(self, view, outcome):
+        with self._lock:
+            self.views.add(view)
+            self._pending[view, outcome] = self._pending.get((view, outcome), 0) + 1
+            due = self.clock() - self._flushed >= self.interval
+        if due:
+            self.flush()
+
+    def flush(self):
+        with self._lock:
+            pending, self._pending = self._pending, {}
+            self._flushed = self.clock()
+        for (view, outcome), count in pending.items():
+            key = _stat_key(view, outcome)
+            cache.add(key, 0, timeout=None)
+            try:
+                cache.incr(key, count)
+            except ValueError:  # Evicted in between.
+                cache.set(key, count, timeout=None)
+
+    def totals(self):
+        """``{view: {outcome: count}}`` across every process that flushed."""
+        self.flush()
+        keys = {_stat_key(view, outcome): (view, outcome) for view in self.views for outcome in OUTCOMES}
+        found = cache.get_many(list(keys))
+        totals = {view: dict.fromkeys(OUTCOMES, 0) for view in sorted(self.views)}
+        for key, count in found.items():
+            view, outcome = keys[key]
+            totals[view][outcome] = count
+        return totals
+
+    def clear(self):
+        with self._lock:
+            self._pending = {}
+        cache.delete_many([_stat_key(view, outcome) for view in self.views for outcome in OUTCOMES])
+
+
+def _stat_key(view, outcome):
+    return f"portal:page-cache:{view}:{outcome}"
+
+
+counters = Counters()
+
+
+def stats():
+    """Outcomes and hit ratio per cached view, plus the pages this process holds."""
+    views = {}
+    for view, counts in counters.totals().items():
+        served = counts["hit"] + counts["miss"]
+        views[view] = {**counts, "hit_ratio": round(counts["hit"] / served, 4) if served else None}
+    return {"views": views, "pages": len(store)}
+
+
+# Storing and serving
+
+def freeze(response):
+    """A ``Page`` of ``response``, or ``None`` if it must not be stored."""
+    cache_control = response.get("Cache-Control", "")
+    if response.status_code != 200 or response.streaming or "private" in cache_control or "no-store" in cache_control:
+        return None
+    content = response.content
+    tokens = {match.group(2) for match in _csrf_field.finditer(content)}
+    if len(tokens) > 1:
+        return None
+    content, fields = _csrf_field.subn(rb"\1" + CSRF_PLACEHOLDER + rb"\3", content)
+    # The token shown anywhere but the form field cannot be swapped.
+    if tokens and tokens.pop() in content:
+        return None
+    headers = [(name, value) for name, value in response.items() if name.lower() not in _unstored_headers]
+    return Page(response.status_code, content, headers, bool(fields))
+
+
+def thaw(page, request):
+    content = page.content
+    if page.csrf:
+        content = content.replace(CSRF_PLACEHOLDER, get_token(request).encode())
+    response = HttpResponse(content, status=page.status)
+    for name, value in page.headers:
+        response.headers[name] = value
+    response.headers["Content-Length"] = str(len(content))
+    response.headers[HEADER] = "hit"
+    return response
+
+
+def timeout_for(policy):
+    return settings.PORTAL_PAGE_CACHE_TIMEOUT if policy.timeout is None else policy.timeout
+
+
+def request_key(request, role):
+    return f"{role}:{request.get_host()}{request.get_full_path()}"
+
+
+def role_for(request, policy):
+    """The role ``request``'s page is cached under, or ``None`` when it is not cacheable."""
+    if not timeout_for(policy):
+        return None
+    user = request.user
+    if user.is_authenticated:
+        role = "staff" if user.is_staff else user.user_type
+    else:
+        role = "anonymous"
+    if len(get_messages(request)):
+        return None
+    return role
+
+
+def is_early(request):
+    """Whether the middleware may answer ``request``: anonymous, with no session or messages."""
+    return (
+        settings.SESSION_COOKIE_NAME not in request.COOKIES
+        and CookieStorage.cookie_name not in request.COOKIES
+        and not settings.CSRF_USE_SESSIONS
+    )
+
+
+def page_cache(per_role=False, timeout=None):
+    """Serve the view's GETs from the page cache; see the module docstring."""
+
+    def decorator(view):
+        policy = Policy(view.__name__, per_role, timeout)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if not per_role or request.method != "GET" or getattr(request, HANDLED, False):
+                return view(request, *args, **kwargs)
+            role = role_for(request, policy)
+            if role is None:
+                response = view(request, *args, **kwargs)
+                counters.add(policy.name, "bypass")
+                response.headers[HEADER] = "bypass"
+                return response
+            key = "view:" + request_key(request, role)
+            page = store.get(key)
+            if page is not None:
+                counters.add(policy.name, "hit")
+                return thaw(page, request)
+            response = view(request, *args, **kwargs)
+            page = freeze(response)
+            if page is not None:
+                store.set(key, page, timeout_for(policy))
+            counters.add(policy.name, "miss")
+            response.headers[HEADER] = "miss"
+            return response
+
+        wrapper.page_cache = policy
+        counters.views.add(policy.name)
+        return wrapper
+
+    return decorator
@@ -0,0 +1,171 @@
+"""
+Donation photos.
+
+Uploads are streamed to a temporary file as they arrive (see
+``views.donation_photos``) and moved into ``MEDIA_ROOT`` with a rename, so
+a photo is never held in memory whole.  The type is checked from the
+file's first bytes, not its name or the browser's word.
+
+Thumbnails (portal.thumbnails) are rendered after the upload's transaction
+commits, by a pool of ``PORTAL_THUMBNAIL_WORKERS`` processes: the request
+returns as soon as the file is stored, and decoding large images never
+holds the GIL of a web worker.  Photos stay ``pending`` until their
+thumbnails exist; ``manage.py make_thumbnails`` renders whatever is left
+pending, e.g. after a restart or with the pool turned off.
+"""
+
+import logging
+import multiprocessing
+import os
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db import transaction
+
+from . import sharding, thumbnails
+from .models import DonationPhoto
+
+logger = logging.getLogger(__name__)
+
+THUMBNAIL_DIR = "photos/thumbs"
+SIGNATURES = (
+    (b"\xff\xd8\xff", "image/jpeg"),
+    (b"\x89PNG\r\n\x1a\n", "image/png"),
+)
+
+_pool = None
+_pool_lock = threading.Lock()
+
+
+class PhotoError(Exception):
+    pass
+
+
+def sniff(upload):
+    """The content type of ``upload`` from its magic bytes, or None."""
+    upload.seek(0)
+    head = upload.read(12)
+    upload.seek(0)
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    for signature, content_type in SIGNATURES:
+        if head.startswith(signature):
+            return content_type
+    return None
+
+
+def add(donation, upload):
+    """Store ``upload`` as a photo of ``donation`` and queue its thumbnails."""
+    if upload.size > settings.PORTAL_PHOTO_MAX_SIZE:
+        raise PhotoError(f"Photos can be at most {settings.PORTAL_PHOTO_MAX_SIZE // 2**20} MB.")
+    content_type = sniff(upload)
+    if content_type is None:
+        raise PhotoError("Upload a JPEG, PNG or WebP image.")
+    with transaction.atomic(using=donation._state.db):
+        if donation.photos.count() >= settings.PORTAL_PHOTOS_PER_DONATION:
+            raise PhotoError(f"At most {settings.PORTAL_PHOTOS_PER_DONATION} photos per donation.")
+        photo = DonationPhoto(donation=donation, content_type=content_type, size=upload.size)
+        photo.image.save(upload.name, upload, save=False)
+        photo.save()
+        transaction.on_commit(partial(schedule, [photo]), using=donation._state.db)
+    return photo
+
+
+def delete_files(images, keys):
+    """
+    Delete the originals ``images`` and the thumbnails named by ``keys``
+    that no photo in any region still uses (identical uploads share them).
+    """
+    for name in images:
+        default_storage.delete(name)
+    keys = set(keys) - {""}
+    for alias in sharding.aliases():
+        keys -= set(DonationPhoto.objects.using(alias).filter(thumbnail__in=keys).values_list("thumbnail", flat=True))
+    for key in keys:
+        for width in settings.PORTAL_THUMBNAIL_WIDTHS:
+            for extension in (".webp", ".jpg"):
+                default_storage.delete(f"{THUMBNAIL_DIR}/{key}-{width}{extension}")
+
+
+def thumbnail_urls(photo):
+    """``{"jpeg"|"webp": srcset, "src": smallest JPEG}`` for a ready photo."""
+    def url(width, extension):
+        return default_storage.url(f"{THUMBNAIL_DIR}/{photo.thumbnail}-{width}{extension}")
+
+    widths = settings.PORTAL_THUMBNAIL_WIDTHS
+    srcset = {
+        name: ", ".join(f"{url(width, extension)} {width / widths[0]:g}x" for width in widths)
+        for name, extension in (("webp", ".webp"), ("jpeg", ".jpg"))
+    }
+    return {**srcset, "src": url(widths[0], ".jpg")}
+
+
+def render_job(photo):
+    """Arguments for ``thumbnails.render``; workers see paths, not models."""
+    return (
+        photo.image.path,
+        default_storage.path(THUMBNAIL_DIR),
+        tuple(settings.PORTAL_THUMBNAIL_WIDTHS),
+    )
+
+
+def finish(photo_id, future, using=None):
+    """Record the outcome of a render job for the photo in database ``using``."""
+    photos = DonationPhoto.objects.db_manager(using).filter(pk=photo_id)
+    try:
+        key, width, height = future.result()
+    except Exception:
+        logger.exception("Could not render thumbnails of photo %s", photo_id)
+        photos.update(status=DonationPhoto.FAILED)
+        return
+    photos.update(
+        status=DonationPhoto.READY, thumbnail=key, width=width, height=height
+    )
+
+
+def pool():
+    """The process pool shared by this process's requests."""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            # Spawned, not forked: forking a threaded web server can copy
+            # locks in a held state, and workers need nothing from it.
+            _pool = ProcessPoolExecutor(
+                settings.PORTAL_THUMBNAIL_WORKERS,
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def schedule(photos):
+    """Render the thumbnails of ``photos`` in the background, if a pool is configured."""
+    if thumbnails.Image is None or not settings.PORTAL_THUMBNAIL_WORKERS:
+        return
+    for photo in photos:
+        future = pool().submit(thumbnails.render, *render_job(photo))
+        # Callbacks run on a pool thread, outside the request's region.
+        future.add_done_callback(partial(finish, photo.pk, using=photo._state.db))
+
+
+def render_pending(workers=None, batch_size=100, retry_failed=False):
+    """Render the thumbnails of every pending photo with a pool of our own; returns how many."""
+    if thumbnails.Image is None:
+        raise PhotoError("Rendering thumbnails needs Pillow.")
+    statuses = [DonationPhoto.PENDING] + ([DonationPhoto.FAILED] if retry_failed else [])
+    done, after = 0, 0
+    context = multiprocessing.get_context("spawn")
+    with ProcessPoolExecutor(workers or os.cpu_count(), mp_context=context) as executor:
+        while True:
+            batch = list(
+                DonationPhoto.objects.filter(status__in=statuses, pk__gt=after).order_by("pk")[:batch_size]
+            )
+            if not batch:
+                return done
+            after = batch[-1].pk
+            futures = [(photo.pk, executor.submit(thumbnails.render, *render_job(photo))) for photo in batch]
+            for photo_id, future in futures:
+                finish(photo_id, future)
+            done += len(batch)
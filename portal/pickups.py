@@ -0,0 +1,103 @@
+"""
+Pickup slots and bookings.
+
+Donors split a donation's pickup window into PickupSlots with a capacity;
+receivers book one when they request the donation.  A booking must fit the
+slot's capacity and must not overlap another booking of the same receiver.
+
+Capacity is taken with a conditional ``UPDATE ... SET booked = booked + 1
+WHERE booked < capacity``, so concurrent bookings can never overfill a
+slot whatever the isolation level.  That write comes first, so the overlap
+check runs under SQLite's write lock.  Overlaps are checked against the
+receiver's bookings through the (receiver, start) index: slots are at most
+``MAX_SLOT_LENGTH`` long, so any booking overlapping [start, end) starts in
+(start - MAX_SLOT_LENGTH, end), which is one short index range.
+"""
+
+import datetime
+import math
+
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from . import sharding
+from .models import PickupBooking, PickupSlot
+
+MAX_SLOT_LENGTH = datetime.timedelta(hours=4)
+MAX_SLOTS_PER_DONATION = 96
+
+
+class SlotError(Exception):
+    pass
+
+
+def create_slots(donation, start, end, minutes=30, capacity=1):
+    """Split [start, end) into slots of ``minutes`` minutes for ``donation``."""
+    # Checked before building anything, so a years-long window costs nothing.
+    if not 0 < minutes <= MAX_SLOT_LENGTH / datetime.timedelta(minutes=1):
+        raise SlotError(f"Slots must be between 1 minute and {MAX_SLOT_LENGTH} long.")
+    if end <= start:
+        raise SlotError("The pickup window must end after it starts.")
+    if capacity < 1:
+        raise SlotError("Capacity must be at least 1.")
+    length = datetime.timedelta(minutes=minutes)
+    if math.ceil((end - start) / length) > MAX_SLOTS_PER_DONATION:
+        raise SlotError(f"At most {MAX_SLOTS_PER_DONATION} slots per donation.")
+    slots = []
+    while start < end:
+        slots.append(PickupSlot(donation=donation, start=start, end=min(start + length, end), capacity=capacity))
+        start += length
+    return PickupSlot.objects.bulk_create(slots)
+
+
+def free_slots(after=None, before=None, pickup_location=None):
+    """Bookable slots starting in [after, before), earliest first."""
+    slots = PickupSlot.objects.filter(
+        start__gte=after or timezone.now(),
+        booked__lt=F("capacity"),
+        donation__deleted_at__isnull=True,
+    )
+    if before is not None:
+        slots = slots.filter(start__lt=before)
+    if pickup_location:
+        slots = slots.filter(donation__pickup_location=pickup_location)
+    return slots.order_by("start", "pk")
+
+
+def conflicts(receiver, start, end):
+    """The receiver's bookings overlapping [start, end)."""
+    return PickupBooking.objects.filter(
+        receiver=receiver,
+        start__gt=start - MAX_SLOT_LENGTH,
+        start__lt=end,
+        end__gt=start,
+    )
+
+
+def book(slot_id, receiver, request=None):
+    """
+    Book ``slot_id`` for ``receiver``, attached to their ``request`` for the
+    slot's donation.  Raises SlotError if the slot is unknown, belongs to
+    another donation, is full, or overlaps one of the receiver's bookings.
+    Call it inside the transaction that creates the request.
+    """
+    with transaction.atomic(using=sharding.current()):
+        # Take the place first: on SQLite that write holds the database's
+        # single write lock (IMMEDIATE transactions hold it from the start),
+        # so no other booking can commit between the overlap check and the
+        # insert.  Django ignores select_for_update() there.
+        slots = PickupSlot.objects.filter(pk=slot_id)
+        if request is not None:
+            slots = slots.filter(donation_id=request.donation_id)
+        taken = slots.filter(booked__lt=F("capacity")).update(booked=F("booked") + 1)
+        slot = slots.first()
+        if slot is None:
+            raise SlotError("That pickup slot does not exist.")
+        if not taken:
+            raise SlotError("That pickup slot is full.")
+        if conflicts(receiver, slot.start, slot.end).exists():
+            raise SlotError("You already have a pickup booked at that time.")
+        return PickupBooking.objects.create(
+            slot=slot, receiver=receiver, request=request, start=slot.start, end=slot.end
+        )
@@ -0,0 +1,209 @@
+"""
+Opt-in profiling of single requests, to find what makes workers slow or
+grow.
+
+``portal.middleware.ProfilingMiddleware`` profiles one request in
+``PORTAL_REQUEST_PROFILE_EVERY`` at random, and any request whose
+``X-Portal-Profile`` header carries ``PORTAL_REQUEST_PROFILE_TOKEN``.  With
+neither set (the default) it is not installed at all.  A profiled request
+runs under cProfile and tracemalloc, a streamed page until its last chunk,
+and leaves three files in ``PORTAL_REQUEST_PROFILE_DIR/<view name>/``:
+
+- ``<sample>.json``: path, status, seconds, and the peak and retained
+  bytes the request allocated;
+- ``<sample>.prof``: the cProfile stats, for pstats or snakeviz;
+- ``<sample>.heap``: a tracemalloc snapshot of what the request allocated
+  and had not freed when it finished: caches, leaks and the DEBUG query
+  log, the memory that stays in the worker.
+
+``manage.py profiles`` lists the samples and, across them, the lines that
+kept the most memory and the hottest functions.
+
+Only one request per process is profiled at a time: tracemalloc traces
+every thread, so requests served alongside a profiled one in a threaded
+worker are counted in its memory, though not in its cProfile stats.
+"""
+
+import cProfile
+import itertools
+import json
+import linecache
+import os
+import pstats
+import random
+import re
+import secrets
+import threading
+import time
+import tracemalloc
+from collections import namedtuple
+
+from django.conf import settings
+
+HEADER = "X-Portal-Profile"
+FRAMES = 16
+
+_lock = threading.Lock()
+_counter = itertools.count()
+_unsafe = re.compile(r"[^\w.-]+")
+
+# name: the view; path: the sample's files without their extension.
+Sample = namedtuple("Sample", "name path meta")
+# where: "file:line" of the allocating code; size and count: summed over
+# every sample; samples: how many samples it appears in.
+Allocator = namedtuple("Allocator", "where size count samples")
+
+
+def wanted(request):
+    """Whether to profile ``request``: asked for by header or picked by sampling."""
+    token = settings.PORTAL_REQUEST_PROFILE_TOKEN
+    header = request.headers.get(HEADER)
+    if token and header and secrets.compare_digest(header, token):
+        return True
+    every = settings.PORTAL_REQUEST_PROFILE_EVERY
+    return every > 0 and random.randrange(every) == 0
+
+
+class Profile:
+    """cProfile and tracemalloc around one request; ``None`` from ``start()`` when one is running."""
+
+    @classmethod
+    def start(cls):
+        if not _lock.acquire(blocking=False):
+            return None
+        return cls()
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.was_tracing = tracemalloc.is_tracing()
+        if self.was_tracing:
+            tracemalloc.reset_peak()
+        else:
+            tracemalloc.start(FRAMES)
+        self.baseline = tracemalloc.get_traced_memory()[0]
+        self.profiler = cProfile.Profile()
+        self.profiler.enable()
+
+    def pause(self):
+        self.profiler.disable()
+
+    def resume(self):
+        self.profiler.enable()
+
+    def finish(self, request, response):
+        """Stop profiling and write the sample (``response`` is None if the view raised); returns its path."""
+        self.profiler.disable()
+        try:
+            seconds = time.perf_counter() - self.started
+            current, peak = tracemalloc.get_traced_memory()
+            snapshot = tracemalloc.take_snapshot()
+            if not self.was_tracing:
+                tracemalloc.stop()
+            match = request.resolver_match
+            name = _unsafe.sub("_", match.view_name if match else "unresolved")
+            directory = os.path.join(settings.PORTAL_REQUEST_PROFILE_DIR, name)
+            os.makedirs(directory, exist_ok=True)
+            path = os.path.join(
+                directory, f"{time.strftime('%Y%m%dT%H%M%S')}-{os.getpid()}-{next(_counter)}"
+            )
+            self.profiler.dump_stats(path + ".prof")
+            snapshot.dump(path + ".heap")
+            # Written last: a sample is listed once its other files exist.
+            with open(path + ".json", "w", encoding="utf-8") as f:
+                json.dump({
+                    "view": name,
+                    "method": request.method,
+                    "path": request.path,
+                    "status": response.status_code if response is not None else None,
+                    "seconds": round(seconds, 6),
+                    "peak": peak - self.baseline,
+                    "retained": current - self.baseline,
+                    "time": time.time(),
+                }, f)
+            return path
+        finally:
+            _lock.release()
+
+
+def profiled(content, profile, request, response):
+    """Stream ``content`` under ``profile``, finishing it after the last chunk."""
+    chunks = iter(content)
+    try:
+        while True:
+            profile.resume()
+            try:
+                chunk = next(chunks)
+            except StopIteration:
+                return
+            finally:
+                profile.pause()
+            yield chunk
+    finally:
+        profile.finish(request, response)
+
+
+# Reading samples
+
+def samples(directory=None, view=None):
+    """Every sample in ``directory``, oldest first, of one ``view`` or all."""
+    directory = directory or settings.PORTAL_REQUEST_PROFILE_DIR
+    found = []
+    if not os.path.isdir(directory):
+        return found
+    for name in sorted(os.listdir(directory)):
+        if view is not None and name != view:
+            continue
+        folder = os.path.join(directory, name)
+        if not os.path.isdir(folder):
+            continue
+        for filename in os.listdir(folder):
+            if filename.endswith(".json"):
+                path = os.path.join(folder, filename[:-len(".json")])
+                with open(path + ".json", encoding="utf-8") as f:
+                    found.append(Sample(name, path, json.load(f)))
+    found.sort(key=lambda sample: sample.meta["time"])
+    return found
+
+
+def _frame(traceback, root):
+    """The frame to charge an allocation to: the newest one under ``root``, else the newest."""
+    if root:
+        for frame in reversed(traceback):
+            if frame.filename.startswith(root) and frame.filename != __file__ and "site-packages" not in frame.filename:
+                return frame
+    return traceback[-1]
+
+
+def allocators(found, root=None):
+    """
+    The lines that allocated what ``found`` samples retained, most bytes
+    first.  With ``root``, each allocation is charged to the newest frame
+    under that directory, so Django's internals point back at the portal
+    code that called them.
+    """
+    ignored = [tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)]
+    totals = {}
+    for sample in found:
+        snapshot = tracemalloc.Snapshot.load(sample.path + ".heap").filter_traces(ignored)
+        seen = set()
+        for trace in snapshot.traces:
+            frame = _frame(trace.traceback, root)
+            where = f"{frame.filename}:{frame.lineno}"
+            size, count, appearances = totals.get(where, (0, 0, 0))
+            totals[where] = (size + trace.size, count + 1, appearances + (where not in seen))
+            seen.add(where)
+    ranked = [Allocator(where, *total) for where, total in totals.items()]
+    ranked.sort(key=lambda allocator: allocator.size, reverse=True)
+    return ranked
+
+
+def source(where):
+    filename, _, lineno = where.rpartition(":")
+    return linecache.getline(filename, int(lineno)).strip()
+
+
+def stats(found, stream=None):
+    """The samples' cProfile stats added together, or ``None`` without samples."""
+    if not found:
+        return None
+    return pstats.Stats(*(sample.path + ".prof" for sample in found), stream=stream)
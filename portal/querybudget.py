@@ -0,0 +1,258 @@
+"""
+Query budgets: how many SQL queries a GET of each portal page may run.
+
+``crawl()`` requests every route in ``portal/urls.py`` as each role
+(anonymous, donor, receiver, staff) against growing datasets and counts
+the queries each response ran, the streamed pages included.  A view has a
+problem when
+
+- its count grows with the data: an N+1 that will scale with the tables;
+- its count is over its budget in ``BUDGETS``; or
+- it has no budget at all, so adding a URL means declaring one; or
+- it failed with a server error.
+
+Every size adds the same shape of data (donations with photos, pickup
+slots, bookings, requests, alerts, recurring and archived donations, for
+the crawling users and for others), and every request starts with cold
+caches, so the counts do not depend on crawl order.  The datasets stay
+below the API page size and the feed's chunk size, whose fixed number of
+queries per page or chunk is by design.
+
+``report()`` gives the results as JSON-ready data, so two commits'
+reports can be diffed; ``manage.py query_budget`` writes it.  Run it in a
+test database only: seeding writes to whatever database is configured.
+"""
+
+import datetime
+import re
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from . import archive, pagecache, pickups, urls, watch
+from .models import ArchivedDonation, Donation, DonationPhoto, RecurringDonation, Request, SavedSearch, User
+
+ROLES = ("anonymous", "donor", "receiver", "staff")
+DEFAULT_SIZES = (2, 8)
+
+# Most queries a GET of each URL name may run, for any role.  Logged-in
+# requests start with two: the session and the user.
+BUDGETS = {
+    "home": 0,
+    # The page cache looks up a logged-in user's role (portal.pagecache).
+    "donor_signup": 2,
+    "receiver_signup": 2,
+    "donorLogin": 0,
+    "logout": 4,
+    "RecieverLogin": 0,
+    "donor_dashboard": 5,
+    "donor_requests": 3,
+    "donor_inbox": 4,
+    "edit_donation": 3,
+    "delete_donation": 3,
+    "donation_photos": 3,
+    "media": 0,
+    "receiver_dashboard": 5,
+    "request_food": 3,
+    "donation_report": 3,
+    "api_donations": 3,
+    "api_donation_detail": 3,
+    "api_donation_slots": 3,
+    "api_slots": 3,
+    "api_recurring_donations": 3,
+    "api_recurring_donation_detail": 3,
+    "api_archived_donations": 3,
+    "api_archived_donation_detail": 3,
+    "api_searches": 3,
+    "api_search_detail": 3,
+    "api_alerts": 3,
+    "api_requests": 3,
+    "api_request_detail": 3,
+    "api_request_decisions": 0,
+    "api_claims": 0,
+    "api_changes": 5,
+    "api_routes": 3,
+    "api_page_cache": 2,
+    "api_donors": 3,
+    # A donor's requesters are gathered from each database first.
+    "api_receivers": 4,
+}
+
+# What each URL argument points at, from the crawling users' data.
+ARGUMENTS = {
+    "edit_donation": "donation",
+    "delete_donation": "donation",
+    "donation_photos": "donation",
+    "request_food": "donation",
+    "api_donation_detail": "donation",
+    "api_donation_slots": "donation",
+    "api_recurring_donation_detail": "recurring",
+    "api_archived_donation_detail": "archived",
+    "api_search_detail": "search",
+    "api_request_detail": "request",
+    "media": "photo",
+}
+
+_ARGUMENT = re.compile(r"<(?:\w+:)?(\w+)>")
+# Static files are served from their plain names, no collectstatic needed.
+_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+def users():
+    """The crawling users, created on first use: ``{role: user or None}``."""
+    def user(username, **fields):
+        found = User.objects.filter(username=username).first()
+        return found or User.objects.create_user(username, password="x", **fields)
+
+    return {
+        "anonymous": None,
+        "donor": user("budget-donor", user_type="donor"),
+        "receiver": user("budget-receiver", user_type="receiver"),
+        "staff": user("budget-staff", user_type="receiver", is_staff=True),
+    }
+
+
+def grow(count):
+    """
+    Add ``count`` units of data, each a donation of the crawling donor and
+    one of another donor, with everything that hangs off a donation.
+    """
+    role = users()
+    receiver = role["receiver"]
+    now = timezone.now()
+    start = User.objects.filter(username__startswith="budget-donor-").count()
+    for i in range(start, start + count):
+        other = User.objects.create_user(f"budget-donor-{i}", user_type="donor")
+        for n, donor in enumerate((role["donor"], other)):
+            # A receiver books one pickup at a time, so the slots never overlap.
+            pickup = now + datetime.timedelta(days=1, hours=2 * i + n)
+            donation = Donation.objects.create(
+                donor=donor, food_type=f"Rice {i}", quantity="10 plates", pickup_location="Main Street",
+                pickup_time=pickup, expiry_date=(pickup + datetime.timedelta(days=1)).date(),
+                latitude=12.9 + i / 1000, longitude=77.6,
+            )
+            DonationPhoto.objects.create(
+                donation=donation, image=f"photos/{i}.jpg", content_type="image/jpeg", size=1,
+                status=DonationPhoto.READY, thumbnail=f"budget{i}", width=320, height=240,
+            )
+            slot = pickups.create_slots(donation, pickup, pickup + datetime.timedelta(minutes=30), capacity=3)[0]
+            claim = Request.objects.create(donation=donation, requester=receiver, message="Please")
+            pickups.book(slot.pk, receiver, claim)
+            Request.objects.create(donation=donation, requester=role["staff"], message="Also")
+            watch.match([donation])
+        RecurringDonation.objects.create(
+            donor=role["donor"], food_type="Bread", quantity="5", pickup_location="Bakery",
+            pickup_time=datetime.time(9), starts_on=now.date(),
+        )
+        done = Donation.objects.create(
+            donor=role["donor"], food_type=f"Soup {i}", quantity="1", pickup_location="x",
+            pickup_time=now, expiry_date=now.date(), status="Expired",
+        )
+        Request.objects.create(donation=done, requester=receiver, message="Done")
+        watch.save_search(receiver, f"Rice {i}", food="rice")
+    archive.archive_donations(before=now + datetime.timedelta(days=1))
+
+
+def routes():
+    """``(route, URL name)`` for every pattern of portal/urls.py."""
+    return [("/" + str(pattern.pattern), pattern.name) for pattern in urls.urlpatterns]
+
+
+def path_for(route, name, targets):
+    if not _ARGUMENT.search(route):
+        return route
+    target = targets[ARGUMENTS[name]]
+    value = target.image.name if name == "media" else target.pk
+    return _ARGUMENT.sub(str(value), route)
+
+
+def targets_for(role):
+    """The objects the URL arguments point at, as seen by ``role``'s own data."""
+    donor, receiver = role["donor"], role["receiver"]
+    donation = Donation.objects.filter(donor=donor, status="Available").order_by("pk").first()
+    return {
+        "donation": donation,
+        "photo": donation.photos.order_by("pk").first(),
+        "recurring": RecurringDonation.objects.filter(donor=donor).order_by("pk").first(),
+        "archived": ArchivedDonation.objects.filter(donor=donor).order_by("pk").first(),
+        "search": SavedSearch.objects.filter(receiver=receiver).order_by("pk").first(),
+        "request": Request.objects.filter(donation=donation, requester=receiver).first(),
+    }
+
+
+def count_queries(client, path):
+    """``(status, queries)`` for a GET of ``path``, streamed content included."""
+    cache.clear()
+    pagecache.store.clear()
+    with CaptureQueriesContext(connection) as queries:
+        response = client.get(path)
+        if response.streaming:
+            b"".join(response.streaming_content)
+    return response.status_code, len(queries)
+
+
+@override_settings(STORAGES=_STORAGES)
+def crawl(sizes=DEFAULT_SIZES):
+    """
+    ``{(route, role): {"name", "status", "queries": [count per size]}}``,
+    growing the data to each of ``sizes`` (units) in turn.
+    """
+    results = {}
+    grown = 0
+    for size in sizes:
+        grow(size - grown)
+        grown = size
+        role = users()
+        targets = targets_for(role)
+        for route, name in routes():
+            path = path_for(route, name, targets)
+            for role_name in ROLES:
+                client = Client(raise_request_exception=False)
+                if role[role_name] is not None:
+                    client.force_login(role[role_name])
+                status, count = count_queries(client, path)
+                result = results.setdefault((route, role_name), {"name": name, "status": [], "queries": []})
+                result["status"].append(status)
+                result["queries"].append(count)
+    return results
+
+
+def problems(name, statuses, counts):
+    """What is wrong with a view's query ``counts`` over the growing sizes."""
+    found = []
+    if any(status >= 500 for status in statuses):
+        found.append(f"server error: {', '.join(map(str, statuses))}")
+    if any(later > earlier for earlier, later in zip(counts, counts[1:])):
+        found.append(f"grows with the data: {' -> '.join(map(str, counts))} queries")
+    budget = BUDGETS.get(name)
+    if budget is None:
+        found.append("no budget declared")
+    elif max(counts) > budget:
+        found.append(f"over budget: {max(counts)} > {budget} queries")
+    return found
+
+
+def report(results, sizes=DEFAULT_SIZES):
+    """The crawl as JSON-ready data, one entry per route and role in a stable order."""
+    views = []
+    for (route, role), result in sorted(results.items()):
+        views.append({
+            "route": route,
+            "name": result["name"],
+            "role": role,
+            "status": result["status"],
+            "queries": result["queries"],
+            "budget": BUDGETS.get(result["name"]),
+            "problems": problems(result["name"], result["status"], result["queries"]),
+        })
+    return {
+        "sizes": list(sizes),
+        "views": views,
+        "problems": sum(len(view["problems"]) for view in views),
+    }
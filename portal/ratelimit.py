@@ -0,0 +1,153 @@
+"""
+Token-bucket rate limiting for expensive or abusable views.
+
+Each scope (``"login"``, ``"signup"``, ``"claim"``) has a rate such as
+``"10/m"`` from ``PORTAL_RATE_LIMITS``: a bucket holds up to 10 tokens and
+refills continuously at 10 per minute, so limits slide smoothly instead of
+resetting on window boundaries.  Buckets live in process memory, keyed by
+scope plus client IP, user id or a posted field, and every check is O(1).
+Over-limit requests get a 429 response with ``Retry-After``.
+"""
+
+import math
+import threading
+import time
+from functools import lru_cache, wraps
+
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+
+PERIODS = {"s": 1, "m": 60, "h": 3600, "d": 86400}
+
+DEFAULT_RATES = {
+    "login": "10/m",
+    "signup": "10/h",
+    "claim": "30/m",
+}
+
+
+@lru_cache(maxsize=None)
+def parse_rate(rate):
+    """``"10/m"`` -> ``(10, 10 / 60)``: bucket capacity and tokens per second."""
+    count, _, period = rate.partition("/")
+    count = int(count)
+    seconds = PERIODS[period[-1]] * int(period[:-1] or 1)
+    return count, count / seconds
+
+
+class TokenBucketStore:
+    """
+    Thread-safe in-process token buckets.
+
+    The store keeps at most ``max_keys`` buckets; the least recently touched
+    one is dropped when it is full, which only ever forgets a client's debt.
+    """
+
+    def __init__(self, max_keys=100_000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def hit(self, key, capacity, refill):
+        """
+        Take one token from ``key``'s bucket.
+
+        Return 0 if the request is allowed, otherwise the number of seconds
+        until a token becomes available.
+        """
+        return self.hit_all((key,), capacity, refill)
+
+    def hit_all(self, keys, capacity, refill):
+        """
+        Take one token from each of ``keys``' buckets if every one has a
+        token to give, and none otherwise, so a request turned away by one
+        bucket is not charged to the others.  Returns as ``hit`` does.
+        """
+        now = self.clock()
+        with self._lock:
+            buckets = {}
+            for key in keys:
+                tokens, stamp = self._buckets.pop(key, (capacity, now))
+                buckets[key] = min(capacity, tokens + (now - stamp) * refill)
+            wait = max(((1 - tokens) / refill for tokens in buckets.values() if tokens < 1), default=0)
+            for key, tokens in buckets.items():
+                self._buckets[key] = (tokens if wait else tokens - 1, now)
+            while len(self._buckets) > self.max_keys:
+                del self._buckets[next(iter(self._buckets))]
+        return wait
+
+    def clear(self):
+        with self._lock:
+            self._buckets.clear()
+
+
+store = TokenBucketStore()
+
+
+def client_ip(request):
+    return request.META.get("REMOTE_ADDR", "")
+
+
+def request_keys(request, keys):
+    """Yield the bucket keys for ``request``; see ``ratelimit`` for the spec."""
+    for key in keys:
+        if key == "ip":
+            yield f"ip:{client_ip(request)}"
+        elif key == "user":
+            if request.user.is_authenticated:
+                yield f"user:{request.user.pk}"
+        elif key.startswith("post:"):
+            value = request.POST.get(key[5:], "").strip().lower()
+            if value:
+                yield f"{key}:{value}"
+        else:
+            raise ValueError(f"Unknown rate limit key: {key!r}")
+
+
+def check(request, scope, keys):
+    """Return seconds to wait (0 if allowed) for ``request`` in ``scope``."""
+    if not getattr(settings, "PORTAL_RATE_LIMIT_ENABLED", True):
+        return 0
+    rate = getattr(settings, "PORTAL_RATE_LIMITS", {}).get(scope, DEFAULT_RATES[scope])
+    capacity, refill = parse_rate(rate)
+    return store.hit_all([f"{scope}:{key}" for key in request_keys(request, keys)], capacity, refill)
+
+
+def too_many_requests(wait, json=False):
+    retry_after = max(1, math.ceil(wait))
+    message = f"Too many requests. Please try again in {retry_after} seconds."
+    if json:
+        response = JsonResponse({"error": message}, status=429)
+    else:
+        response = HttpResponse(message, status=429, content_type="text/plain")
+    response["Retry-After"] = str(retry_after)
+    return response
+
+
+def ratelimit(scope, keys=("ip",), methods=("POST",), json=False):
+    """
+    Limit a view to the ``scope`` rate for each of ``keys``.
+
+    ``keys`` may contain ``"ip"`` (client address), ``"user"`` (logged-in user)
+    and ``"post:<field>"`` (a submitted value).  Every key has its own bucket
+    and the request must fit all of them; it is charged to them only when it
+    does.  Only ``methods`` are counted, so viewing a form is never limited.
+
+    Anyone can send any value, so a bucket keyed on a submitted value alone
+    lets them use up someone else's: login is limited per IP, not per
+    username, or bad passwords would lock the account's owner out.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            if request.method in methods:
+                wait = check(request, scope, keys)
+                if wait:
+                    return too_many_requests(wait, json=json)
+            return view(request, *args, **kwargs)
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,171 @@
+"""
+Recurring donations.
+
+A RecurringDonation is a donation posted on a schedule: the bakery that has
+bread left every evening, the canteen that cooks too much on Fridays.  The
+schedule is a subset of the iCalendar RRULE syntax:
+
+    FREQ=DAILY                       every day
+    FREQ=DAILY;INTERVAL=2            every other day
+    FREQ=WEEKLY;BYDAY=MO,WE,FR       three days a week
+    FREQ=WEEKLY;INTERVAL=2;UNTIL=20270101
+
+counted from the template's ``starts_on``.  ``materialize()`` (run by the
+``materialize_recurring`` command) turns the occurrences of the next few
+days into ordinary Donation rows, so receivers see and request them like
+any other.
+
+Templates are read in keyset-paginated chunks and each chunk's donations
+are written with one bulk INSERT, so a run over tens of thousands of
+templates holds one chunk in memory at a time.  Each template remembers
+how far it has been generated (``materialized_until``); a unique
+constraint on (recurrence, occurrence) makes regenerating an occurrence a
+no-op rather than a duplicate, should two runs overlap.
+"""
+
+import datetime
+from collections import namedtuple
+from functools import lru_cache
+
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from . import events, watch
+from .models import Donation, DonationEvent, RecurringDonation
+
+WEEKDAYS = ("MO", "TU", "WE", "TH", "FR", "SA", "SU")
+DEFAULT_HORIZON = 7
+DEFAULT_BATCH_SIZE = 1000
+
+
+class RuleError(ValueError):
+    pass
+
+
+# byday holds weekday numbers (Monday is 0); empty means the start's weekday.
+Rule = namedtuple("Rule", "freq interval byday until")
+
+
+@lru_cache(maxsize=256)
+def parse_rule(text):
+    """Parse an RRULE subset (FREQ, INTERVAL, BYDAY, UNTIL) into a Rule."""
+    parts = {}
+    for part in text.upper().replace(" ", "").split(";"):
+        if not part:
+            continue
+        name, sep, value = part.partition("=")
+        if not sep or not value:
+            raise RuleError(f"Expected NAME=VALUE, got {part!r}.")
+        if name in parts:
+            raise RuleError(f"{name} is given twice.")
+        parts[name] = value
+    unknown = set(parts) - {"FREQ", "INTERVAL", "BYDAY", "UNTIL"}
+    if unknown:
+        raise RuleError(f"Unsupported rule parts: {', '.join(sorted(unknown))}.")
+    freq = parts.get("FREQ")
+    if freq not in ("DAILY", "WEEKLY"):
+        raise RuleError("FREQ must be DAILY or WEEKLY.")
+    try:
+        interval = int(parts.get("INTERVAL", 1))
+    except ValueError:
+        raise RuleError("INTERVAL must be a number.")
+    if not 1 <= interval <= 365:
+        raise RuleError("INTERVAL must be between 1 and 365.")
+    byday = frozenset()
+    if "BYDAY" in parts:
+        if freq != "WEEKLY":
+            raise RuleError("BYDAY needs FREQ=WEEKLY.")
+        days = parts["BYDAY"].split(",")
+        if not set(days) <= set(WEEKDAYS):
+            raise RuleError(f"BYDAY takes {','.join(WEEKDAYS)}.")
+        byday = frozenset(WEEKDAYS.index(day) for day in days)
+    until = None
+    if "UNTIL" in parts:
+        try:
+            until = datetime.datetime.strptime(parts["UNTIL"][:8], "%Y%m%d").date()
+        except ValueError:
+            raise RuleError("UNTIL must be a date, YYYYMMDD.")
+    return Rule(freq, interval, byday, until)
+
+
+def occurrences(rule, starts_on, first, last):
+    """The dates in [first, last] on which ``rule``, counted from ``starts_on``, fires."""
+    first = max(first, starts_on)
+    if rule.until is not None:
+        last = min(last, rule.until)
+    byday = rule.byday or {starts_on.weekday()}
+    week_zero = starts_on - datetime.timedelta(days=starts_on.weekday())
+    day = first
+    while day <= last:
+        if rule.freq == "DAILY":
+            fires = (day - starts_on).days % rule.interval == 0
+        else:
+            fires = day.weekday() in byday and ((day - week_zero).days // 7) % rule.interval == 0
+        if fires:
+            yield day
+        day += datetime.timedelta(days=1)
+
+
+def due(until):
+    """Active templates not yet generated up to ``until``."""
+    return RecurringDonation.objects.filter(
+        Q(materialized_until__isnull=True) | Q(materialized_until__lt=until),
+        active=True,
+    )
+
+
+def build(template, first, last):
+    """Unsaved Donations for the occurrences of ``template`` in [first, last]."""
+    rule = parse_rule(template.rule)
+    if template.materialized_until is not None:
+        first = max(first, template.materialized_until + datetime.timedelta(days=1))
+    if template.ends_on is not None:
+        last = min(last, template.ends_on)
+    return [
+        Donation(
+            donor_id=template.donor_id,
+            food_type=template.food_type,
+            quantity=template.quantity,
+            pickup_location=template.pickup_location,
+            latitude=template.latitude,
+            longitude=template.longitude,
+            pickup_time=timezone.make_aware(datetime.datetime.combine(day, template.pickup_time)),
+            expiry_date=day + datetime.timedelta(days=template.shelf_days),
+            recurrence_id=template.pk,
+            occurrence=day,
+        )
+        for day in occurrences(rule, template.starts_on, first, last)
+    ]
+
+
+def materialize(horizon=DEFAULT_HORIZON, batch_size=DEFAULT_BATCH_SIZE, today=None):
+    """
+    Generate the donations of every active template up to ``horizon`` days
+    ahead.  Returns how many were created.
+    """
+    today = today or timezone.localdate()
+    last = today + datetime.timedelta(days=horizon)
+    created, after = 0, 0
+    while True:
+        templates = list(due(last).filter(pk__gt=after).order_by("pk")[:batch_size])
+        if not templates:
+            return created
+        after = templates[-1].pk
+        with events.atomic():
+            # Moving the watermark first takes the write lock, so the ids
+            # inserted below are exactly those greater than the current
+            # maximum.
+            RecurringDonation.objects.filter(pk__in=[t.pk for t in templates]).update(
+                materialized_until=last
+            )
+            before = Donation.all_objects.aggregate(top=Max("pk"))["top"] or 0
+            Donation.objects.bulk_create(
+                [donation for template in templates for donation in build(template, today, last)],
+                ignore_conflicts=True,
+            )
+            # ignore_conflicts gives no primary keys back; read the new rows.
+            new = list(Donation.objects.filter(pk__gt=before, recurrence__isnull=False))
+            for donation in new:
+                events.log(DonationEvent.CREATED, donation.pk, events.snapshot(donation))
+            watch.match(new)
+        created += len(new)
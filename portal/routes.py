@@ -0,0 +1,176 @@
+"""
+Pickup routes for volunteers.
+
+``plan()`` turns the day's claimed donations into ordered multi-stop
+routes in three steps:
+
+1. Stops are grouped by pickup-time window (``window`` long, counted from
+   midnight), so a route never mixes a morning pickup with an evening one.
+2. Within a window, stops are swept by bearing around the depot and cut
+   into groups of at most ``max_stops``: neighbouring stops share a route,
+   and the sweep starts at the widest empty sector so no route straddles
+   the whole map.
+3. Each group is ordered by nearest neighbour from the depot and improved
+   with 2-opt (reverse a stretch of the route whenever that shortens it)
+   over a great-circle distance matrix computed once, in NumPy.  Each 2-opt
+   step scores every candidate reversal for a position in one vectorised
+   expression instead of a Python loop.
+
+Routes start and end at the depot.  Without one, they are open paths: the
+depot is then a stand-in whose distance to every stop is zero, at the
+stops' centre for the sweep.
+
+NumPy is optional for the rest of the portal; planning needs it.
+"""
+
+import datetime
+import math
+from collections import namedtuple
+from itertools import groupby
+
+from django.utils import timezone
+
+from .models import Donation
+
+try:
+    import numpy as np
+except ImportError:  # NumPy is optional; only route planning needs it.
+    np = None
+
+EARTH_RADIUS_KM = 6371.0088
+DEFAULT_MAX_STOPS = 25
+DEFAULT_WINDOW = datetime.timedelta(hours=2)
+MAX_PASSES = 50
+
+# window: when the window starts; stops: donations in visiting order;
+# distance: kilometres, from the depot and back when there is one.
+Route = namedtuple("Route", "window stops distance")
+
+
+class PlanError(Exception):
+    pass
+
+
+def claimed(day):
+    """The donations claimed for pickup on ``day`` that have a location."""
+    return Donation.objects.filter(
+        status="Requested",
+        pickup_time__date=day,
+        latitude__isnull=False,
+        longitude__isnull=False,
+    ).order_by("pickup_time", "pk")
+
+
+def distance_matrix(points):
+    """Great-circle distances in km between every pair of ``(lat, lon)`` points."""
+    radians = np.radians(np.asarray(points, dtype=float).reshape(-1, 2))
+    lat, lon = radians[:, 0], radians[:, 1]
+    a = (
+        np.sin((lat[:, None] - lat[None, :]) / 2) ** 2
+        + np.cos(lat)[:, None] * np.cos(lat)[None, :] * np.sin((lon[:, None] - lon[None, :]) / 2) ** 2
+    )
+    return 2 * EARTH_RADIUS_KM * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+def nearest_neighbour(matrix):
+    """A tour from node 0 that always drives to the closest unvisited node, back to 0."""
+    n = len(matrix)
+    visited = np.zeros(n, dtype=bool)
+    visited[0] = True
+    order = [0]
+    for _ in range(n - 1):
+        candidates = np.where(visited, np.inf, matrix[order[-1]])
+        nearest = int(np.argmin(candidates))
+        visited[nearest] = True
+        order.append(nearest)
+    order.append(0)
+    return np.array(order)
+
+
+def two_opt(matrix, order, max_passes=MAX_PASSES):
+    """
+    Improve the closed tour ``order`` (starting and ending at node 0) by
+    reversing stretches while that shortens it.
+    """
+    order = order.copy()
+    n = len(order)
+    for _ in range(max_passes):
+        improved = False
+        for i in range(1, n - 2):
+            a, b = order[i - 1], order[i]
+            # Reversing order[i:j + 1] swaps edges (a, b) and (c, d) for
+            # (a, c) and (b, d); score every j at once.
+            c, d = order[i + 1:n - 1], order[i + 2:n]
+            delta = matrix[a, c] + matrix[b, d] - matrix[a, b] - matrix[c, d]
+            best = int(np.argmin(delta))
+            if delta[best] < -1e-9:
+                j = i + 1 + best
+                order[i:j + 1] = order[i:j + 1][::-1].copy()
+                improved = True
+        if not improved:
+            break
+    return order
+
+
+def tour_length(matrix, order):
+    return float(matrix[order[:-1], order[1:]].sum())
+
+
+def sweep(points, centre, max_stops):
+    """Indices of ``points`` cut into groups of ``max_stops`` by bearing from ``centre``."""
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    # Equirectangular projection: plenty for bearings across a city.
+    dy = points[:, 0] - centre[0]
+    dx = (points[:, 1] - centre[1]) * math.cos(math.radians(centre[0]))
+    bearings = np.arctan2(dy, dx)
+    by_bearing = np.argsort(bearings, kind="stable")
+    if len(by_bearing) > max_stops:
+        sorted_bearings = bearings[by_bearing]
+        gaps = np.diff(np.append(sorted_bearings, sorted_bearings[0] + 2 * math.pi))
+        by_bearing = np.roll(by_bearing, -(int(np.argmax(gaps)) + 1))
+    return [by_bearing[start:start + max_stops] for start in range(0, len(by_bearing), max_stops)]
+
+
+def order_stops(points, depot=None):
+    """``(indices in visiting order, km)`` for a route through ``points``."""
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    if depot is None:
+        matrix = np.zeros((len(points) + 1, len(points) + 1))
+        matrix[1:, 1:] = distance_matrix(points)
+    else:
+        matrix = distance_matrix(np.vstack([depot, points]))
+    order = two_opt(matrix, nearest_neighbour(matrix))
+    return order[1:-1] - 1, tour_length(matrix, order)
+
+
+def window_start(moment, window):
+    moment = timezone.localtime(moment)
+    midnight = moment.replace(hour=0, minute=0, second=0, microsecond=0)
+    return midnight + ((moment - midnight) // window) * window
+
+
+def plan(donations, depot=None, max_stops=DEFAULT_MAX_STOPS, window=DEFAULT_WINDOW):
+    """
+    Routes through ``donations`` (anything with ``latitude``, ``longitude``
+    and ``pickup_time``), earliest window first.  ``depot`` is a
+    ``(latitude, longitude)`` pair.
+    """
+    if np is None:
+        raise PlanError("Route planning needs NumPy.")
+    if max_stops < 1:
+        raise PlanError("Routes need at least one stop.")
+    if window <= datetime.timedelta(0):
+        raise PlanError("The pickup window must be positive.")
+    stops = sorted(
+        (d for d in donations if d.latitude is not None and d.longitude is not None),
+        key=lambda d: d.pickup_time,
+    )
+    routes = []
+    for start, group in groupby(stops, key=lambda d: window_start(d.pickup_time, window)):
+        group = list(group)
+        points = np.array([(d.latitude, d.longitude) for d in group])
+        centre = depot if depot is not None else points.mean(axis=0)
+        for cluster in sweep(points, centre, max_stops):
+            order, distance = order_stops(points[cluster], depot)
+            routes.append(Route(start, [group[i] for i in cluster[order]], distance))
+    return routes
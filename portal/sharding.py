@@ -0,0 +1,281 @@
+"""
+Regional shards: each region's donations, requests and everything hanging
+off them live in a SQLite database of their own, so writers in different
+cities never wait for each other's lock.
+
+``settings.PORTAL_SHARDS`` maps a region to its database alias (see
+``DJANGO_DB_SHARDS``); with none configured every model lives in
+``default`` as before.  Users with a blank or unknown ``User.region`` stay
+in ``default`` too.
+
+How rows find their database:
+
+- Accounts (``User``, ``Donor``, ``Receiver``) and the other apps always
+  live in ``default``.  Every shard keeps a copy of the account tables,
+  written by ``replicate()`` whenever an account is saved, so the foreign
+  keys and joins of regional rows (``donor``, ``donor__donor``,
+  ``requester``) work inside the shard.
+- Every other portal model is regional.  ``RegionRouter`` sends an object
+  related to a user to that user's shard (``user.donation_set``,
+  ``Donation(donor=user)``), an object related to a regional row to that
+  row's database (a Request follows its Donation), and anything else to
+  the *current* region: the one ``region()`` or ``activate()`` selected.
+  ``portal.middleware.RegionMiddleware`` activates the logged-in user's
+  region for each request, so views stay unaware of shards.
+- Transactions are opened on the current region's database (``current()``).
+- Each shard hands out ids from its own block (``ID_BLOCK`` times the
+  region's position in PORTAL_SHARDS, so append new regions at the end),
+  which keeps ids unique across shards: ``locate()`` maps an id back to its
+  database, and ``scatter()`` can merge shards by id for staff lists.
+- Staff views cover every region: the API lists and pickup routes
+  scatter, and the donation report adds up each region's rollups.  Admin
+  changelists cannot merge databases, so they show one region at a time,
+  picked in their region filter (portal.admin.RegionalAdmin).
+
+Maintenance commands act on the current region; ``manage.py each_region
+<command>`` runs one over ``default`` and every shard.  ``manage.py
+setup_shards`` creates the shard databases.  Moving a user to another
+region does not move the rows they already have.
+"""
+
+import heapq
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import partial, total_ordering
+from itertools import islice
+
+from django.conf import settings
+from django.core.signals import request_finished
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from .models import Donor, Receiver, User
+
+ID_BLOCK = 10**12
+ACCOUNT_MODELS = (User, Donor, Receiver)
+# Saving only these fields is not worth a write to every shard.
+UNREPLICATED_FIELDS = frozenset({"last_login"})
+
+_current = ContextVar("portal_region", default=None)
+
+
+def shards():
+    """``{region: alias}``, in id-block order."""
+    return settings.PORTAL_SHARDS
+
+
+def alias_for(region):
+    return shards().get(region or "", DEFAULT_DB_ALIAS)
+
+
+def region_of(alias):
+    """The region whose database ``alias`` is; "" for ``default``."""
+    return next((name for name, shard in shards().items() if shard == alias), "")
+
+
+def aliases():
+    """``default`` followed by every shard."""
+    return [DEFAULT_DB_ALIAS, *shards().values()]
+
+
+def current():
+    """The database of the current region."""
+    return alias_for(_current.get())
+
+
+def activate(region):
+    """Make ``region`` current until the next ``activate()``."""
+    _current.set(region or None)
+
+
+@receiver(request_finished)
+def deactivate(**kwargs):
+    # Sent once the response is closed, after a streamed page's queries.
+    activate(None)
+
+
+@contextmanager
+def region(name):
+    token = _current.set(name or None)
+    try:
+        yield
+    finally:
+        _current.reset(token)
+
+
+def first_id(alias):
+    """The first id a shard hands out: its position times ``ID_BLOCK``."""
+    if alias == DEFAULT_DB_ALIAS:
+        return 1
+    return (list(shards().values()).index(alias) + 1) * ID_BLOCK
+
+
+def locate(pk):
+    """The database an id was handed out by."""
+    block = int(pk) // ID_BLOCK
+    regional = list(shards().values())
+    if 0 < block <= len(regional):
+        return regional[block - 1]
+    return DEFAULT_DB_ALIAS
+
+
+def is_regional(model):
+    return model._meta.app_label == "portal" and model not in ACCOUNT_MODELS
+
+
+class RegionRouter:
+    def db_for_read(self, model, **hints):
+        if not is_regional(model):
+            return DEFAULT_DB_ALIAS
+        instance = hints.get("instance")
+        if isinstance(instance, User):
+            return alias_for(instance.region)
+        if instance is not None and instance._state.db:
+            return instance._state.db
+        return current()
+
+    db_for_write = db_for_read
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Users are copied to every shard, so any regional row may point at one.
+        if isinstance(obj1, User) or isinstance(obj2, User):
+            return True
+        return None
+
+
+# Scatter-gather
+
+@total_ordering
+class Descending:
+    __slots__ = ("value",)
+
+    def __init__(self, value):
+        self.value = value
+
+    def __eq__(self, other):
+        return self.value == other.value
+
+    def __lt__(self, other):
+        return other.value < self.value
+
+
+def _sort_key(queryset, ordering):
+    fields = []
+    for name in ordering:
+        if not isinstance(name, str) or name == "?":
+            raise ValueError(f"scatter() cannot merge on {name!r}.")
+        descending = name.startswith("-")
+        name = name.lstrip("-")
+        attname = queryset.model._meta.pk.attname if name == "pk" else name
+        fields.append((name, attname, descending))
+
+    def key(row):
+        parts = []
+        for name, attname, descending in fields:
+            if isinstance(row, dict):
+                value = row[name] if name in row else row[attname]
+            else:
+                value = getattr(row, attname)
+            # SQLite sorts NULL before every value.
+            part = (True, value) if value is not None else (False,)
+            parts.append(Descending(part) if descending else part)
+        return parts
+
+    return key
+
+
+def scatter(queryset, limit=None, chunk_size=2000):
+    """
+    Rows of ``queryset`` from ``default`` and every shard, merged in its
+    ordering (the model's, or the primary key's without one) and cut to
+    ``limit``.  Each database runs the query once, limited to ``limit``
+    rows, and is read as a stream, so memory stays at one chunk per shard.
+    """
+    ordering = queryset.query.order_by or queryset.model._meta.ordering or ["pk"]
+    queryset = queryset.order_by(*ordering)
+    if limit is not None:
+        queryset = queryset[:limit]
+    streams = [queryset.using(alias).iterator(chunk_size=chunk_size) for alias in aliases()]
+    merged = heapq.merge(*streams, key=_sort_key(queryset, ordering))
+    return islice(merged, limit)
+
+
+# Shard setup and account copies
+
+def _copy(row):
+    model = type(row)
+    return model(**{field.attname: getattr(row, field.attname) for field in model._meta.concrete_fields})
+
+
+def replicate(rows, aliases=None):
+    """
+    Write ``rows`` of one account model into every shard (or ``aliases``),
+    replacing older copies.  Copy users before their profiles.
+    """
+    copies = [_copy(row) for row in rows]
+    if not copies:
+        return
+    model = type(copies[0])
+    fields = [field.name for field in model._meta.concrete_fields if not field.primary_key]
+    for alias in shards().values() if aliases is None else aliases:
+        model.objects.using(alias).bulk_create(
+            copies, update_conflicts=True, unique_fields=["id"], update_fields=fields, batch_size=500
+        )
+
+
+def replicate_saved_account(sender, instance, raw=False, using=None, update_fields=None, **kwargs):
+    if raw or using != DEFAULT_DB_ALIAS or not shards():
+        return
+    if update_fields is not None and set(update_fields) <= UNREPLICATED_FIELDS:
+        return
+    # Copied once the account commits, so a rolled back signup leaves none.
+    transaction.on_commit(partial(replicate, [_copy(instance)]), using=using)
+
+
+def delete_account_copies(sender, instance, using=None, **kwargs):
+    if using != DEFAULT_DB_ALIAS:
+        return
+    for alias in shards().values():
+        sender.objects.using(alias).filter(pk=instance.pk).delete()
+
+
+for model in ACCOUNT_MODELS:
+    post_save.connect(replicate_saved_account, sender=model)
+    post_delete.connect(delete_account_copies, sender=model)
+
+
+def seed_ids(alias):
+    """Start every regional table of a shard at the shard's id block."""
+    start = first_id(alias) - 1
+    if not start:
+        return
+    from django.apps import apps
+
+    with connections[alias].cursor() as cursor:
+        for model in apps.get_app_config("portal").get_models():
+            if not is_regional(model) or not model._meta.pk.get_internal_type().endswith("AutoField"):
+                continue
+            table = model._meta.db_table
+            cursor.execute("DELETE FROM sqlite_sequence WHERE name = %s AND seq < %s", [table, start])
+            cursor.execute(
+                "INSERT INTO sqlite_sequence (name, seq) SELECT %s, %s "
+                "WHERE NOT EXISTS (SELECT 1 FROM sqlite_sequence WHERE name = %s)",
+                [table, start, table],
+            )
+
+
+def copy_accounts(alias, batch_size=2000):
+    """Copy every user and profile into a shard; returns how many users."""
+    counts = {}
+    for model in ACCOUNT_MODELS:
+        copied, last = 0, 0
+        while True:
+            batch = list(model.objects.using(DEFAULT_DB_ALIAS).filter(pk__gt=last).order_by("pk")[:batch_size])
+            if not batch:
+                break
+            replicate(batch, aliases=[alias])
+            copied += len(batch)
+            last = batch[-1].pk
+        counts[model] = copied
+    return counts[User]
@@ -0,0 +1,138 @@
+from functools import partial
+
+from django.contrib.auth.hashers import make_password, UNUSABLE_PASSWORD_PREFIX
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.utils.crypto import get_random_string
+from . import sharding
+from .models import User, Donor, Receiver
+
+# Profile model created alongside each user type
+PROFILE_MODELS = {"donor": Donor, "receiver": Receiver}
+
+
+def create_account(user, user_type, mobile_number):
+    """
+    Save ``user`` and its profile row as one atomic unit.
+
+    Username uniqueness is left to the database constraint: a concurrent
+    signup with the same name raises ``IntegrityError`` and rolls back both
+    inserts, so a user never exists without a profile.
+    """
+    user.user_type = user_type
+    with transaction.atomic():
+        user.save()
+        PROFILE_MODELS[user_type].objects.create(user=user, mobile_number=mobile_number)
+    return user
+
+
+def _unusable_password():
+    return UNUSABLE_PASSWORD_PREFIX + get_random_string(40)
+
+
+def bulk_signup(accounts, user_type, batch_size=500):
+    """
+    Create many accounts of ``user_type`` for partner onboarding.
+
+    ``accounts`` is an iterable of dicts with ``username``, ``email``,
+    ``mobile_number`` and an optional ``password`` and ``region``.  Accounts without a
+    password get an unusable one so the partner can send reset links instead
+    of paying the hashing cost here.  Each batch costs one lookup for taken
+    usernames plus one ``bulk_create`` for users and one for profiles, all in
+    a single transaction.
+
+    Every row is validated like the signup form does it, without its
+    per-row queries: the username and email are normalised, the fields and
+    the password validators checked, and the email and mobile number
+    required.  Rows that fail are not created.
+
+    Returns ``(created, skipped, invalid)`` where ``skipped`` lists
+    usernames that already existed or were repeated in the input, and
+    ``invalid`` holds ``(username, messages)`` for the rows that failed
+    validation.
+    """
+    if user_type not in PROFILE_MODELS:
+        raise ValueError(f"Unknown user type: {user_type!r}")
+
+    created, skipped, invalid = 0, [], []
+    batch = []
+    for account in accounts:
+        try:
+            batch.append(_validate(account, user_type))
+        except ValidationError as e:
+            invalid.append((account.get("username", ""), e.messages))
+            continue
+        if len(batch) >= batch_size:
+            created += _create_batch(batch, user_type, skipped)
+            batch = []
+    if batch:
+        created += _create_batch(batch, user_type, skipped)
+    return created, skipped, invalid
+
+
+def _validate(account, user_type):
+    """The unsaved ``(user, profile)`` of ``account``; raises ValidationError."""
+    user = User(
+        username=account.get("username") or "",
+        email=account.get("email") or "",
+        user_type=user_type,
+        region=account.get("region") or "",
+    )
+    errors = {}
+    # Uniqueness is the batch's case-insensitive lookup; clean() normalises.
+    try:
+        user.full_clean(exclude=["password"], validate_unique=False)
+    except ValidationError as e:
+        errors.update(e.message_dict)
+    if not user.email:
+        errors.setdefault("email", []).append("An email address is required.")
+    if sharding.shards() and user.region not in sharding.shards():
+        errors.setdefault("region", []).append(f"Unknown region: {user.region!r}.")
+    profile = PROFILE_MODELS[user_type](user=user, mobile_number=account.get("mobile_number") or "")
+    try:
+        profile.full_clean(exclude=["user"], validate_unique=False)
+    except ValidationError as e:
+        errors.update(e.message_dict)
+    password = account.get("password")
+    if password:
+        try:
+            validate_password(password, user)
+        except ValidationError as e:
+            errors["password"] = e.messages
+    if errors:
+        raise ValidationError(errors)
+    user.password = make_password(password) if password else _unusable_password()
+    return user, profile
+
+
+def _create_batch(batch, user_type, skipped):
+    profile_model = PROFILE_MODELS[user_type]
+    with transaction.atomic():
+        # Case-insensitive, like the signup form's clean_username().
+        taken = set(
+            User.objects.annotate(username_lower=Lower("username"))
+            .filter(username_lower__in=[user.username.lower() for user, profile in batch])
+            .values_list("username_lower", flat=True)
+        )
+        users, mobiles = [], []
+        for user, profile in batch:
+            key = user.username.lower()
+            if key in taken:
+                skipped.append(user.username)
+                continue
+            taken.add(key)
+            users.append(user)
+            mobiles.append(profile.mobile_number)
+        User.objects.bulk_create(users)
+        # bulk_create sends no post_save, so copy the accounts to the shards here.
+        if sharding.shards():
+            transaction.on_commit(partial(sharding.replicate, users))
+        profiles = profile_model.objects.bulk_create(
+            profile_model(user=user, mobile_number=mobile)
+            for user, mobile in zip(users, mobiles)
+        )
+        if sharding.shards():
+            transaction.on_commit(partial(sharding.replicate, profiles))
+    return len(users)
@@ -0,0 +1,102 @@
+// Partial page updates for the donor dashboard, after the htmx conventions.
+//
+// Forms marked data-fragment, and links marked data-fragment-get or
+// data-fragment-post, are sent with an "HX-Request: true" header; the
+// server answers with just the changed HTML.  The response is swapped into
+// data-target ("afterbegin", "outerHTML" or "delete", per data-swap), and
+// any element in it marked data-swap-oob replaces the element with the same
+// id (or, with data-swap-oob="delete", removes it).  A 4xx response (an
+// invalid form) replaces data-error-target, or the form itself.  Without
+// JavaScript the same markup posts and redirects.
+(function () {
+    "use strict";
+
+    function csrfToken() {
+        var input = document.querySelector("input[name=csrfmiddlewaretoken]");
+        return input ? input.value : "";
+    }
+
+    function parse(html) {
+        var template = document.createElement("template");
+        template.innerHTML = html;
+        return template.content;
+    }
+
+    function swapOutOfBand(content) {
+        content.querySelectorAll("[data-swap-oob]").forEach(function (element) {
+            var how = element.getAttribute("data-swap-oob");
+            element.removeAttribute("data-swap-oob");
+            var current = element.id && document.getElementById(element.id);
+            if (current && how === "delete") {
+                current.remove();
+            } else if (current) {
+                current.replaceWith(element);
+            }
+            if (!current || how === "delete") {
+                element.remove();
+            }
+        });
+    }
+
+    function swap(target, how, content) {
+        if (how === "delete") {
+            target.remove();
+        } else if (how === "afterbegin") {
+            target.querySelectorAll(":scope > .empty").forEach(function (element) {
+                element.remove();
+            });
+            target.prepend(content);
+        } else {
+            target.replaceWith(content);
+        }
+    }
+
+    function send(source, method, url, body) {
+        var target = document.querySelector(source.dataset.target);
+        return fetch(url, {
+            method: method,
+            body: body,
+            credentials: "same-origin",
+            headers: {"HX-Request": "true", "X-CSRFToken": csrfToken()},
+        }).then(function (response) {
+            return response.text().then(function (html) {
+                var content = parse(html);
+                if (response.ok) {
+                    swapOutOfBand(content);
+                    if (target) {
+                        swap(target, source.dataset.swap, content);
+                    }
+                } else if (response.status < 500) {
+                    var errorTarget = source.dataset.errorTarget
+                        ? document.querySelector(source.dataset.errorTarget)
+                        : source;
+                    errorTarget.replaceWith(content);
+                } else {
+                    window.location.reload();
+                }
+            });
+        });
+    }
+
+    document.addEventListener("submit", function (event) {
+        var form = event.target;
+        if (!form.matches("form[data-fragment]")) {
+            return;
+        }
+        event.preventDefault();
+        send(form, "POST", form.action, new FormData(form));
+    });
+
+    document.addEventListener("click", function (event) {
+        var link = event.target.closest("a[data-fragment-get], a[data-fragment-post]");
+        if (!link) {
+            return;
+        }
+        event.preventDefault();
+        if (link.hasAttribute("data-fragment-get")) {
+            send(link, "GET", link.href);
+        } else if (!link.dataset.confirm || window.confirm(link.dataset.confirm)) {
+            send(link, "POST", link.href, new FormData());
+        }
+    });
+})();
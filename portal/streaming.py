@@ -0,0 +1,73 @@
+from django.conf import settings
+from django.http import HttpResponse, StreamingHttpResponse
+from django.template.loader import get_template, render_to_string
+from django.utils.crypto import get_random_string
+from django.utils.safestring import mark_safe
+
+# Rows rendered per streamed chunk; each chunk is one write (and one
+# compression flush) on the wire.
+FEED_CHUNK_SIZE = 200
+
+
+def _chunks(rows, size):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) >= size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def render_feed(
+    request,
+    template_name,
+    context,
+    rows,
+    rows_template,
+    rows_name,
+    chunk_size=FEED_CHUNK_SIZE,
+    streaming=None,
+):
+    """
+    Render a page whose body is a long list of rows.
+
+    ``template_name`` outputs ``{{ feed }}`` where the rows belong, and
+    ``rows_template`` renders a list of rows passed as ``rows_name`` (with a
+    ``{% empty %}`` branch for when there are none).  Pass ``rows`` as a
+    ``QuerySet.iterator()`` so they are fetched lazily.
+
+    In streaming mode (the default, controlled by ``PORTAL_STREAM_FEEDS``) the
+    page around the feed is rendered up front, so CSRF cookies and messages
+    are handled before the response leaves the view.  The header is sent
+    immediately and rows follow in chunks as they come off the cursor, which
+    keeps time to first byte and memory flat however long the feed grows.
+    """
+    if streaming is None:
+        streaming = getattr(settings, "PORTAL_STREAM_FEEDS", True)
+    rows_template = get_template(rows_template)
+
+    def render_rows(chunk):
+        return rows_template.render({rows_name: chunk}, request)
+
+    if not streaming:
+        feed = "".join(render_rows(chunk) for chunk in _chunks(rows, chunk_size))
+        context = {**context, "feed": mark_safe(feed or render_rows([]))}
+        return HttpResponse(render_to_string(template_name, context, request))
+
+    marker = f"<!--feed-{get_random_string(16)}-->"
+    page = render_to_string(template_name, {**context, "feed": mark_safe(marker)}, request)
+    head, tail = page.split(marker, 1)
+
+    def stream():
+        yield head
+        empty = True
+        for chunk in _chunks(rows, chunk_size):
+            empty = False
+            yield render_rows(chunk)
+        if empty:
+            yield render_rows([])
+        yield tail
+
+    return StreamingHttpResponse(stream())
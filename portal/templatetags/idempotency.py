@@ -0,0 +1,12 @@
+from django import template
+from django.utils.html import format_html
+
+from ..idempotency import FIELD_NAME, new_key
+
+register = template.Library()
+
+
+@register.simple_tag
+def idempotency_field():
+    """A hidden input with a fresh idempotency key; see portal.idempotency."""
+    return format_html('<input type="hidden" name="{}" value="{}">', FIELD_NAME, new_key())
@@ -0,0 +1,25 @@
+from django import template
+from django.utils.html import format_html
+
+from .. import photos
+
+register = template.Library()
+
+
+@register.simple_tag
+def thumbnail(photo, alt=""):
+    """
+    A lazily loaded ``<picture>`` of a ready DonationPhoto: WebP where the
+    browser takes it, JPEG otherwise, with the high-density variants in the
+    srcsets.  The size is given up front so the layout does not shift when
+    it arrives.
+    """
+    if not photo:
+        return ""
+    urls = photos.thumbnail_urls(photo)
+    return format_html(
+        '<picture><source type="image/webp" srcset="{}">'
+        '<img src="{}" srcset="{}" width="{}" height="{}" alt="{}" loading="lazy" decoding="async">'
+        "</picture>",
+        urls["webp"], urls["src"], urls["jpeg"], photo.width, photo.height, alt,
+    )
@@ -1,3 +1,1841 @@
-from django.test import TestCase
+import datetime
+import gzip
+import io
+import json
+import os
+import shutil
+import sqlite3
+import subprocess
+import sys
+import tempfile
+import time
+import unittest
+from unittest import mock
 
-# Create your tests here.
+import brotli
+
+from django.db import IntegrityError, connection, connections
+from django.conf import settings
+from django.core import mail
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.template import engines
+from django.template.loaders.cached import Loader as CachedLoader
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import Client, RequestFactory, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.autoreload import file_changed
+
+from foodsdonation.settings import env
+
+from . import (
+    analytics, api, archive, checks, events, inbox, maintenance, pagecache, photos, pickups, profiling, querybudget, ratelimit, recurring, routes, sharding, signup, thumbnails, urls, watch,
+)
+from .admin import EstimatedCountPaginator
+from .analytics import rebuild_rollups, update_rollups
+from .middleware import CompressionMiddleware
+from .storage import minify_css
+from .streaming import render_feed
+from .models import (
+    ArchivedDonation,
+    ArchivedRequest,
+    Change,
+    Donation,
+    DonationEvent,
+    DonationPhoto,
+    DonationRollup,
+    Donor,
+    IdempotencyKey,
+    PickupBooking,
+    PickupSlot,
+    Receiver,
+    RecurringDonation,
+    Request,
+    SavedSearch,
+    User,
+    WatchAlert,
+)
+
+# Tests render templates without running collectstatic first.
+TEST_STORAGES = {
+    "default": {"BACKEND": "django.core.files.storage.FileSystemStorage"},
+    "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"},
+}
+
+
+def make_donation(donor, days_ahead=1, **kwargs):
+    now = timezone.now()
+    fields = {
+        "food_type": "Rice",
+        "quantity": "10 plates",
+        "pickup_location": "Main Street",
+        "pickup_time": now + datetime.timedelta(days=days_ahead),
+        "expiry_date": (now + datetime.timedelta(days=days_ahead + 1)).date(),
+    }
+    fields.update(kwargs)
+    return Donation.objects.create(donor=donor, **fields)
+
+
+def rollup_snapshot():
+    return sorted(
+        DonationRollup.objects.values_list(
+            "day", "donor_id", "pickup_location", "donations", "meals",
+            "claimed", "claim_seconds", "expired_unclaimed",
+        )
+    )
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class SignupTests(TestCase):
+    def signup_data(self, username):
+        return {
+            "username": username,
+            "email": f"{username}@example.com",
+            "mobile_number": "5550100",
+            "password1": "a-long-passphrase",
+            "password2": "a-long-passphrase",
+        }
+
+    def test_signup_saves_user_and_profile_together(self):
+        response = self.client.post(reverse("donor_signup"), self.signup_data("bakery"))
+        self.assertRedirects(response, reverse("donorLogin"))
+        self.assertEqual(Donor.objects.get().user.username, "bakery")
+
+        with mock.patch.object(Donor.objects, "create", side_effect=IntegrityError):
+            response = self.client.post(reverse("donor_signup"), self.signup_data("canteen"))
+        self.assertContains(response, "Username already exists")
+        self.assertFalse(User.objects.filter(username="canteen").exists())
+
+    def test_bulk_signup_skips_taken_usernames_case_insensitively(self):
+        User.objects.create_user("Alice", password="x", user_type="donor")
+        accounts = [
+            {"username": name, "email": f"{name}@example.com", "mobile_number": "5550100"}
+            for name in ("alice", "bob", "BOB", "carol")
+        ]
+        with self.assertNumQueries(5):  # savepoint, lookup, two inserts, release
+            created, skipped, invalid = signup.bulk_signup(accounts, "receiver")
+        self.assertEqual((created, skipped, invalid), (2, ["alice", "BOB"], []))
+        self.assertEqual(sorted(Receiver.objects.values_list("user__username", flat=True)), ["bob", "carol"])
+        self.assertFalse(User.objects.get(username="bob").has_usable_password())
+
+    def test_bulk_signup_rolls_back_a_batch_on_a_duplicate(self):
+        accounts = [
+            {"username": f"user{i}", "email": f"user{i}@example.com", "mobile_number": "5550100"} for i in range(4)
+        ]
+        # A duplicate the lookup missed, as when another import races this one.
+        with mock.patch.object(Receiver.objects, "bulk_create", side_effect=IntegrityError):
+            with self.assertRaises(IntegrityError):
+                signup.bulk_signup(accounts, "receiver", batch_size=2)
+        self.assertFalse(User.objects.exists())
+        self.assertEqual(signup.bulk_signup(accounts, "receiver", batch_size=2), (4, [], []))
+        self.assertEqual(Receiver.objects.count(), 4)
+
+    def test_bulk_signup_validates_like_the_form(self):
+        def account(username, **kwargs):
+            return {"username": username, "email": "a@EXAMPLE.com", "mobile_number": "5550100", **kwargs}
+
+        accounts = [
+            account("good", password="a-long-passphrase"),
+            account("bad name!"),
+            account("weak", password="123"),
+            account("nomail", email=""),
+            account("nophone", mobile_number=""),
+            account("longphone", mobile_number="5" * 16),
+        ]
+        created, skipped, invalid = signup.bulk_signup(accounts, "donor")
+        self.assertEqual((created, skipped), (1, []))
+        self.assertEqual([username for username, messages in invalid], ["bad name!", "weak", "nomail", "nophone", "longphone"])
+        user = User.objects.get()
+        self.assertEqual((user.username, user.email), ("good", "a@example.com"))
+        self.assertTrue(user.check_password("a-long-passphrase"))
+
+
+class StaticFilesTests(TestCase):
+    def test_minify_css(self):
+        css = """
+            /*! Portal v1 */
+            /* layout */
+            .card > .title ,  a:hover {
+                color : #fff ;
+                margin: 0 auto;
+            }
+        """
+        self.assertEqual(minify_css(css), "/*! Portal v1 */ .card>.title,a:hover{color:#fff;margin:0 auto}")
+
+    def test_collectstatic_writes_hashed_minified_and_compressed_files(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        storages = {**TEST_STORAGES, "staticfiles": {"BACKEND": "portal.storage.PortalStaticFilesStorage"}}
+        with override_settings(STATIC_ROOT=root, STORAGES=storages):
+            call_command("collectstatic", interactive=False, verbosity=0)
+            with open(os.path.join(root, "staticfiles.json"), encoding="utf-8") as f:
+                paths = json.load(f)["paths"]
+            css = paths["portal/css/portal.css"]
+            vendored = paths["portal/vendor/bootstrap/bootstrap.min.css"]
+            self.assertRegex(css, r"^portal/css/portal\.[0-9a-f]{12}\.css$")
+            with open(os.path.join(root, css), encoding="utf-8") as f:
+                served = f.read()
+            self.assertNotIn("\n", served)
+            self.assertNotIn("/* ", served)
+            for suffix in (".gz", ".br"):
+                self.assertTrue(os.path.exists(os.path.join(root, css + suffix)), suffix)
+            # Vendored files are not minified again; only their references are hashed.
+            source = os.path.join(settings.BASE_DIR, "portal/static/portal/vendor/bootstrap/bootstrap.min.css")
+            with open(os.path.join(root, vendored), "rb") as hashed, open(source, "rb") as original:
+                self.assertEqual(hashed.read().splitlines()[:-1], original.read().splitlines()[:-1])
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class TemplateTests(TestCase):
+    def test_pages_use_the_cached_loader(self):
+        engine = engines["django"].engine
+        self.assertEqual([type(loader) for loader in engine.template_loaders], [CachedLoader])
+        self.assertIs(engine.get_template("home.html"), engine.get_template("home.html"))
+        response = self.client.get(reverse("home"))
+        self.assertEqual([t.name for t in response.templates][:2], ["home.html", "base.html"])
+
+    def test_editing_a_template_drops_the_cache(self):
+        engine = engines["django"].engine
+        home = engine.get_template("home.html")
+        self.client.get(reverse("home"))
+        self.assertTrue(len(pagecache.store))
+
+        replies = file_changed.send(sender=None, file_path=settings.BASE_DIR / "templates" / "home.html")
+        self.assertIn(True, [reply for _, reply in replies])  # handled without a restart
+        self.assertIsNot(engine.get_template("home.html"), home)
+        self.assertEqual(len(pagecache.store), 0)
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class StreamingTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+        for food in ("Rice", "Bread", "Soup", "Dal", "Fruit"):
+            make_donation(self.donor, food_type=food)
+
+    def test_feed_is_streamed_in_chunks(self):
+        request = RequestFactory().get("/")
+        request.user = self.receiver
+        response = render_feed(
+            request, "receiver_dashboard.html", {}, Donation.objects.order_by("pk").iterator(),
+            "includes/donation_cards.html", "donations", chunk_size=2,
+        )
+        self.assertTrue(response.streaming)
+        head, *chunks, tail = [part.decode() for part in response.streaming_content]
+        self.assertIn("Available Donations", head)
+        self.assertIn("</html>", tail)
+        foods = [[food for food in ("Rice", "Bread", "Soup", "Dal", "Fruit") if food in chunk] for chunk in chunks]
+        self.assertEqual(foods, [["Rice", "Bread"], ["Soup", "Dal"], ["Fruit"]])
+
+        with override_settings(PORTAL_STREAM_FEEDS=False):
+            response = render_feed(
+                request, "receiver_dashboard.html", {}, iter([]), "includes/donation_cards.html", "donations",
+            )
+        self.assertFalse(response.streaming)
+        self.assertContains(response, "No donations available right now.")
+
+    def test_streamed_feed_is_gzipped_chunk_by_chunk(self):
+        self.client.force_login(self.receiver)
+        response = self.client.get(reverse("receiver_dashboard"), HTTP_ACCEPT_ENCODING="gzip, br")
+        # The page carries a CSRF token, so no brotli (see CompressionMiddleware).
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        parts = list(response.streaming_content)
+        self.assertGreater(len(parts), 3)
+        page = gzip.decompress(b"".join(parts)).decode()
+        self.assertIn("Fruit", page)
+        self.assertIn("</html>", page)
+
+    def test_encoding_negotiation(self):
+        home = reverse("home")
+        response = self.client.get(home, HTTP_ACCEPT_ENCODING="gzip, deflate, br")
+        self.assertEqual(response["Content-Encoding"], "br")
+        self.assertIn("Accept-Encoding", response["Vary"])
+        self.assertIn(b"</html>", brotli.decompress(response.content))
+        response = self.client.get(home, HTTP_ACCEPT_ENCODING="gzip")
+        self.assertEqual(response["Content-Encoding"], "gzip")
+        self.assertIn(b"</html>", gzip.decompress(response.content))
+        response = self.client.get(home)
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertIn("Accept-Encoding", response["Vary"])
+
+    def test_pages_with_a_csrf_token_are_gzipped_for_every_visitor(self):
+        # Gzipped for its BREACH padding, whether or not the visitor already
+        # holds a token cookie.
+        for url, user in ((reverse("donorLogin"), None), (reverse("receiver_dashboard"), self.receiver)):
+            client = Client()
+            if user is not None:
+                client.force_login(user)
+            self.assertNotIn(settings.CSRF_COOKIE_NAME, client.cookies)
+            first = client.get(url, HTTP_ACCEPT_ENCODING="br, gzip")
+            self.assertIn(settings.CSRF_COOKIE_NAME, client.cookies)
+            again = client.get(url, HTTP_ACCEPT_ENCODING="br, gzip")
+            self.assertEqual((first["Content-Encoding"], again["Content-Encoding"]), ("gzip", "gzip"))
+
+        # Decided on the body: a page that hands out no cookie still counts.
+        form = b'<input type="hidden" name="csrfmiddlewaretoken" value="x">' + b"a" * 300
+        for body, encoding in ((form, "gzip"), (b"a" * 300, "br")):
+            middleware = CompressionMiddleware(lambda request: HttpResponse(body))
+            for factory in (RequestFactory(), RequestFactory(HTTP_COOKIE=f"{settings.CSRF_COOKIE_NAME}=x")):
+                response = middleware(factory.get("/", HTTP_ACCEPT_ENCODING="br, gzip"))
+                self.assertEqual(response["Content-Encoding"], encoding)
+
+    def test_streams_are_flushed_per_chunk(self):
+        def view(request):
+            return StreamingHttpResponse(iter([b"a" * 300, b"b" * 300]))
+
+        for encoding, decompress in (("br", brotli.decompress), ("gzip", gzip.decompress)):
+            middleware = CompressionMiddleware(view)
+            response = middleware(RequestFactory().get("/", HTTP_ACCEPT_ENCODING=encoding))
+            self.assertEqual(response["Content-Encoding"], encoding)
+            self.assertFalse(response.has_header("Content-Length"))
+            parts = list(response.streaming_content)
+            self.assertGreaterEqual(len(parts), 2)
+            self.assertEqual(decompress(b"".join(parts)), b"a" * 300 + b"b" * 300)
+
+
+class ApiTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+        self.donations = [make_donation(self.donor, food_type=f"Meal {i}") for i in range(5)]
+
+    def test_donation_fields(self):
+        url = reverse("api_donations")
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_login(self.receiver)
+        first = self.client.get(url).json()["results"][0]
+        self.assertEqual(list(first), list(api.DONATION_FIELDS))
+        self.assertEqual((first["id"], first["donor_username"]), (self.donations[0].pk, "bakery"))
+
+        response = self.client.get(url, {"fields": "food_type,status"})
+        self.assertEqual(response.json()["results"][0], {"food_type": "Meal 0", "status": "Available"})
+        response = self.client.get(url, {"fields": "food_type,password"})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json()["available"], list(api.DONATION_FIELDS))
+
+    def test_keyset_cursor_paging(self):
+        self.client.force_login(self.receiver)
+        url, seen, cursor = reverse("api_donations"), [], None
+        while True:
+            params = {"limit": 2, "fields": "id", **({"cursor": cursor} if cursor else {})}
+            with CaptureQueriesContext(connection) as queries:
+                page = self.client.get(url, params).json()
+            if cursor:  # A range scan from the last id, not an OFFSET.
+                sql = queries[-1]["sql"]
+                self.assertIn('"portal_donation"."id" >', sql)
+                self.assertNotIn("OFFSET", sql)
+            seen += [row["id"] for row in page["results"]]
+            cursor = page["next"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, [d.pk for d in self.donations])
+        self.assertEqual(self.client.get(url, {"cursor": "%%%"}).status_code, 400)
+        self.assertEqual(self.client.get(url, {"limit": 0}).status_code, 400)
+
+    def test_claims(self):
+        url = reverse("api_claims")
+        claim = {"claims": [{"donation": self.donations[0].pk, "message": "please"}, {"donation": self.donations[1].pk}]}
+        self.client.force_login(self.donor)
+        self.assertEqual(self.client.post(url, claim, content_type="application/json").status_code, 403)
+
+        self.client.force_login(self.receiver)
+        response = self.client.post(url, {"claims": [{"donation": 0}]}, content_type="application/json")
+        self.assertEqual((response.status_code, response.json()["missing"]), (404, [0]))
+        twice = {"claims": [{"donation": self.donations[0].pk}] * 2}
+        self.assertEqual(self.client.post(url, twice, content_type="application/json").status_code, 400)
+
+        response = self.client.post(url, claim, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(
+            sorted(Request.objects.values_list("donation_id", "message")),
+            [(self.donations[0].pk, "please"), (self.donations[1].pk, "")],
+        )
+        self.assertEqual(Donation.objects.filter(status="Requested").count(), 2)
+        self.assertEqual(DonationEvent.objects.filter(kind=DonationEvent.CLAIMED).count(), 2)
+
+
+@override_settings(STORAGES=TEST_STORAGES, PORTAL_RATE_LIMITS={"login": "2/m", "signup": "10/h", "claim": "30/m"})
+class RateLimitTests(TestCase):
+    def setUp(self):
+        ratelimit.store.clear()
+        self.addCleanup(ratelimit.store.clear)
+
+    def test_login_gets_429_with_retry_after(self):
+        url = reverse("donorLogin")
+        for _ in range(2):
+            response = self.client.post(url, {"username": "bakery", "password": "wrong"})
+            self.assertEqual(response.status_code, 200)
+        response = self.client.post(url, {"username": "bakery", "password": "wrong"})
+        self.assertEqual(response.status_code, 429)
+        self.assertEqual(response["Retry-After"], "30")
+        self.assertEqual(self.client.get(url).status_code, 200)
+        # Keyed on the address: guessing elsewhere does not lock the owner out.
+        response = self.client.post(url, {"username": "bakery", "password": "wrong"}, REMOTE_ADDR="10.0.0.2")
+        self.assertEqual(response.status_code, 200)
+
+    def test_a_refused_request_is_not_charged_to_other_buckets(self):
+        now = [0.0]
+        store = ratelimit.TokenBucketStore(clock=lambda: now[0])
+        capacity, refill = ratelimit.parse_rate("2/m")
+        self.assertEqual(store.hit("ip", capacity, refill), 0)
+        self.assertEqual(store.hit("ip", capacity, refill), 0)
+        for _ in range(3):
+            self.assertEqual(store.hit_all(["user", "ip"], capacity, refill), 30)
+        self.assertEqual(store.hit("user", capacity, refill), 0)
+        self.assertEqual(store.hit("user", capacity, refill), 0)
+        now[0] = 30.0
+        self.assertEqual(store.hit_all(["user", "ip"], capacity, refill), 0)
+        self.assertEqual(store.hit("ip", capacity, refill), 30)
+
+
+class RollupTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.other = User.objects.create_user("canteen", password="x", user_type="donor")
+        self.receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+
+    def assertMatchesFullRecompute(self):
+        incremental = rollup_snapshot()
+        rebuild_rollups()
+        self.assertEqual(incremental, rollup_snapshot())
+
+    def test_incremental_update_matches_full_recompute(self):
+        kept = make_donation(self.donor)
+        moved = make_donation(self.donor, quantity="3 boxes")
+        deleted = make_donation(self.other, days_ahead=2, pickup_location="Depot")
+        make_donation(self.other, days_ahead=-3, expiry_date=timezone.localdate() - datetime.timedelta(days=1))
+        update_rollups()
+
+        make_donation(self.other, days_ahead=2, pickup_location="Depot", quantity="lots")
+        Request.objects.create(donation=kept, requester=self.receiver, message="please")
+        moved.pickup_location = "Side Street"
+        moved.save()
+        deleted.delete()
+        self.assertEqual(update_rollups(), 3)
+        self.assertMatchesFullRecompute()
+
+    def test_soft_deleted_donations_drop_out(self):
+        kept = make_donation(self.donor)
+        hidden = make_donation(self.donor)
+        update_rollups()
+        hidden.soft_delete()
+        self.assertEqual(update_rollups(), 1)
+        self.assertEqual(DonationRollup.objects.get().donations, 1)
+        self.assertMatchesFullRecompute()
+
+        Donation.all_objects.filter(pk=kept.pk).update(deleted_at=timezone.now())
+        update_rollups()
+        self.assertFalse(DonationRollup.objects.exists())
+        self.assertMatchesFullRecompute()
+
+    def test_donations_expiring_between_runs_count_as_waste(self):
+        donation = make_donation(self.donor, days_ahead=-5, expiry_date=timezone.localdate() - datetime.timedelta(days=2))
+        three_days_ago = timezone.now() - datetime.timedelta(days=3)
+        with mock.patch("django.utils.timezone.now", return_value=three_days_ago):
+            rebuild_rollups()
+        self.assertEqual(DonationRollup.objects.get(donor=self.donor).expired_unclaimed, 0)
+
+        update_rollups()
+        rollup = DonationRollup.objects.get(donor=self.donor, day=timezone.localdate(donation.pickup_time))
+        self.assertEqual(rollup.expired_unclaimed, 1)
+        self.assertMatchesFullRecompute()
+
+    def test_rollup_metrics(self):
+        claimed = make_donation(self.donor, quantity="12 loaves")
+        make_donation(self.donor, quantity="8 loaves")
+        Request.objects.create(donation=claimed, requester=self.receiver, message="")
+        rebuild_rollups()
+
+        rollup = DonationRollup.objects.get()
+        self.assertEqual((rollup.donations, rollup.meals, rollup.claimed), (2, 20, 1))
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class DonationReportTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        Donor.objects.create(user=self.donor, mobile_number="5550100")
+        make_donation(self.donor)
+        rebuild_rollups()
+        self.staff = User.objects.create_user("admin", password="x", is_staff=True)
+
+    def test_report_requires_staff(self):
+        self.client.force_login(self.donor)
+        response = self.client.get(reverse("donation_report"))
+        self.assertEqual(response.status_code, 302)
+
+    def test_report_reads_rollups(self):
+        self.client.force_login(self.staff)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse("donation_report"), {"group": "donor"})
+        self.assertContains(response, "bakery")
+
+    def test_csv_export(self):
+        self.client.force_login(self.staff)
+        response = self.client.get(reverse("donation_report"), {"group": "location", "format": "csv"})
+        self.assertEqual(response["Content-Type"], "text/csv")
+        lines = response.content.decode().splitlines()
+        self.assertEqual(lines[0], "Group,Donations,Meals,Claimed,Claim rate,Avg hours to claim,Expired unclaimed")
+        self.assertTrue(lines[1].startswith("Main Street,1,10,0"))
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class AdminTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+        self.client.force_login(User.objects.create_superuser("admin", password="x"))
+
+    def add_claimed_donations(self, count):
+        for _ in range(count):
+            donation = make_donation(self.donor)
+            Request.objects.create(donation=donation, requester=self.receiver, message="")
+
+    def test_changelist_queries_do_not_grow_with_rows(self):
+        for name in ("admin:portal_donation_changelist", "admin:portal_request_changelist"):
+            url = reverse(name)
+            self.add_claimed_donations(2)
+            with CaptureQueriesContext(connection) as few:
+                self.client.get(url)
+            self.add_claimed_donations(20)
+            with CaptureQueriesContext(connection) as many:
+                self.client.get(url)
+            self.assertEqual(len(few), len(many), name)
+
+    def test_large_changelists_estimate_their_count(self):
+        donations = [make_donation(self.donor) for _ in range(5)]
+        donations[0].delete()  # LiveManager hides it from every changelist query
+        url = reverse("admin:portal_donation_changelist")
+        with mock.patch.object(EstimatedCountPaginator, "exact_limit", 2):
+            response = self.client.get(url)
+            self.assertEqual(response.context["cl"].paginator.count, donations[-1].pk)
+            response = self.client.get(url, {"status__exact": "Available"})
+            self.assertEqual(response.context["cl"].paginator.count, 3)
+        response = self.client.get(url)
+        self.assertEqual(response.context["cl"].paginator.count, 4)
+
+    def test_search_matches_prefix_and_id(self):
+        rice = make_donation(self.donor, food_type="Rice")
+        make_donation(self.donor, food_type="Bread")
+        url = reverse("admin:portal_donation_changelist")
+        response = self.client.get(url, {"q": "Ri"})
+        self.assertEqual(list(response.context["cl"].result_list), [rice])
+        response = self.client.get(url, {"q": str(rice.pk)})
+        self.assertIn(rice, response.context["cl"].result_list)
+        response = self.client.get(url, {"q": "Bak"})
+        self.assertEqual(len(response.context["cl"].result_list), 0)
+
+    def test_bulk_status_action(self):
+        donations = [make_donation(self.donor) for _ in range(3)]
+        response = self.client.post(
+            reverse("admin:portal_donation_changelist"),
+            {"action": "mark_requested", "_selected_action": [d.pk for d in donations[:2]]},
+        )
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(
+            sorted(Donation.objects.values_list("status", flat=True)),
+            ["Available", "Requested", "Requested"],
+        )
+        self.client.post(
+            reverse("admin:portal_donation_changelist"),
+            {"action": "mark_expired", "_selected_action": [donations[2].pk]},
+        )
+        self.assertEqual(
+            list(DonationEvent.objects.order_by("pk").values_list("kind", flat=True)),
+            [DonationEvent.EDITED, DonationEvent.EDITED, DonationEvent.EXPIRED],
+        )
+
+    def test_date_hierarchy_lists_years(self):
+        make_donation(self.donor, days_ahead=1)
+        make_donation(self.donor, days_ahead=800)
+        response = self.client.get(reverse("admin:portal_donation_changelist"))
+        year = timezone.localdate().year
+        self.assertContains(response, f"pickup_time__year={year}")
+        self.assertContains(response, f"pickup_time__year={year + 2}")
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class EventLogTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+
+    def post_donation(self, **fields):
+        data = {
+            "food_type": "Rice",
+            "quantity": "10 plates",
+            "pickup_location": "Main Street",
+            "pickup_time": "2030-01-01T10:00",
+            "expiry_date": "2030-01-02",
+            **fields,
+        }
+        self.client.force_login(self.donor)
+        self.client.post(reverse("donor_dashboard"), data)
+        return Donation.objects.latest("pk")
+
+    def test_views_log_the_lifecycle(self):
+        kept = self.post_donation()
+        gone = self.post_donation(food_type="Bread")
+        before_edit = timezone.now()
+        self.client.post(
+            reverse("edit_donation", args=[kept.pk]),
+            {
+                "food_type": "Rice",
+                "quantity": "12 plates",
+                "pickup_location": "Main Street",
+                "pickup_time": "2030-01-01T10:00",
+                "expiry_date": "2030-01-02",
+            },
+        )
+        self.client.post(reverse("delete_donation", args=[gone.pk]))
+        self.client.force_login(self.receiver)
+        self.client.post(reverse("request_food", args=[kept.pk]), {"message": "please"})
+
+        kinds = list(DonationEvent.objects.order_by("pk").values_list("donation_id", "kind"))
+        self.assertEqual(kinds, [
+            (kept.pk, DonationEvent.CREATED),
+            (gone.pk, DonationEvent.CREATED),
+            (kept.pk, DonationEvent.EDITED),
+            (gone.pk, DonationEvent.DELETED),
+            (kept.pk, DonationEvent.CLAIMED),
+        ])
+        self.assertEqual(events.verify(), [])
+
+        past = events.replay(at=before_edit)
+        self.assertEqual(sorted(past), [kept.pk, gone.pk])
+        self.assertEqual(past[kept.pk]["quantity"], "10 plates")
+        self.assertEqual(past[kept.pk]["status"], "Available")
+        now = events.replay()
+        self.assertEqual(list(now), [kept.pk])
+        self.assertEqual(now[kept.pk]["quantity"], "12 plates")
+        self.assertEqual(now[kept.pk]["status"], "Requested")
+
+    def test_events_are_batched_and_roll_back_with_the_change(self):
+        with self.assertNumQueries(3):  # savepoint, one INSERT, release
+            with events.atomic():
+                for pk in range(1, 101):
+                    events.log(DonationEvent.EXPIRED, pk, {"status": "Expired"})
+        with self.assertRaises(RuntimeError):
+            with events.atomic():
+                events.log(DonationEvent.EXPIRED, 1, {"status": "Expired"})
+                raise RuntimeError
+        self.assertEqual(DonationEvent.objects.count(), 100)
+
+    def test_events_of_a_rolled_back_nested_block_are_dropped(self):
+        with events.atomic():
+            events.log(DonationEvent.EXPIRED, 1, {"status": "Expired"})
+            try:
+                with events.atomic():
+                    events.log(DonationEvent.EXPIRED, 2, {"status": "Expired"})
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            with events.atomic():
+                events.log(DonationEvent.EXPIRED, 3, {"status": "Expired"})
+        self.assertEqual(list(DonationEvent.objects.order_by("pk").values_list("donation_id", flat=True)), [1, 3])
+
+    def test_events_are_append_only(self):
+        events.log(DonationEvent.DELETED, 1)
+        event = DonationEvent.objects.get()
+        with self.assertRaises(ValueError):
+            event.save()
+        with self.assertRaises(ValueError):
+            event.delete()
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class ArchiveTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+
+    def claim(self, donation):
+        Request.objects.create(donation=donation, requester=self.receiver, message="")
+        donation.status = "Requested"
+        donation.save()
+
+    def test_delete_view_soft_deletes(self):
+        donation = make_donation(self.donor)
+        self.claim(donation)
+        self.client.force_login(self.donor)
+        self.client.post(reverse("delete_donation", args=[donation.pk]))
+
+        self.assertFalse(Donation.objects.exists())
+        self.assertFalse(Request.objects.exists())
+        self.assertIsNotNone(Donation.all_objects.get().deleted_at)
+        self.assertEqual(Request.all_objects.count(), 1)
+        self.assertEqual(archive.get_donation(donation.pk), donation)
+
+    def test_archive_moves_finished_donations(self):
+        live = make_donation(self.donor)
+        recent = make_donation(self.donor, days_ahead=-1)
+        self.claim(recent)
+        done = make_donation(self.donor, days_ahead=-40)
+        self.claim(done)
+        expired = make_donation(self.donor, days_ahead=-40, status="Expired")
+        deleted = make_donation(self.donor)
+        deleted.soft_delete()
+        long_ago = timezone.now() - datetime.timedelta(days=35)
+        Donation.all_objects.exclude(pk__in=[live.pk, recent.pk]).update(updated_at=long_ago)
+        update_rollups()
+        rollups = rollup_snapshot()
+
+        self.assertEqual(archive.archive_donations(batch_size=2), 3)
+        self.assertEqual(sorted(Donation.all_objects.values_list("pk", flat=True)), [live.pk, recent.pk])
+        self.assertEqual(
+            sorted(ArchivedDonation.objects.values_list("pk", flat=True)), [done.pk, expired.pk, deleted.pk]
+        )
+        self.assertEqual(ArchivedRequest.objects.get().donation_id, done.pk)
+        self.assertEqual(archive.get_donation(done.pk).status, "Requested")
+        self.assertEqual(
+            {d.pk for d in archive.donations(donor=self.donor)}, {live.pk, recent.pk, done.pk, expired.pk}
+        )
+
+        update_rollups()
+        self.assertEqual(rollup_snapshot(), rollups)
+        rebuild_rollups()
+        self.assertEqual(rollup_snapshot(), rollups)
+
+    def test_archive_deletes_photo_files(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        done = make_donation(self.donor, days_ahead=-40, status="Expired")
+        live = make_donation(self.donor)
+        for key in ("shared", "own"):
+            for width in settings.PORTAL_THUMBNAIL_WIDTHS:
+                for extension in (".webp", ".jpg"):
+                    default_storage.save(f"{photos.THUMBNAIL_DIR}/{key}-{width}{extension}", ContentFile(b"thumb"))
+        names = {}
+        for donation, key in ((done, "shared"), (done, "own"), (live, "shared")):
+            image = default_storage.save("photos/originals/photo.jpg", ContentFile(b"jpeg"))
+            DonationPhoto.objects.create(
+                donation=donation, image=image, content_type="image/jpeg", size=4,
+                status=DonationPhoto.READY, thumbnail=key,
+            )
+            names[donation.pk, key] = image
+        Donation.objects.filter(pk=done.pk).update(updated_at=timezone.now() - datetime.timedelta(days=35))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(archive.archive_donations(), 1)
+
+        self.assertEqual(list(DonationPhoto.objects.values_list("donation_id", flat=True)), [live.pk])
+        self.assertFalse(default_storage.exists(names[done.pk, "shared"]))
+        self.assertFalse(default_storage.exists(names[done.pk, "own"]))
+        self.assertTrue(default_storage.exists(names[live.pk, "shared"]))
+        width = settings.PORTAL_THUMBNAIL_WIDTHS[0]
+        self.assertFalse(default_storage.exists(f"{photos.THUMBNAIL_DIR}/own-{width}.webp"))
+        self.assertTrue(default_storage.exists(f"{photos.THUMBNAIL_DIR}/shared-{width}.webp"))
+
+    def test_archive_api(self):
+        donation = make_donation(self.donor, days_ahead=-40, status="Expired")
+        Donation.objects.update(updated_at=timezone.now() - datetime.timedelta(days=35))
+        archive.archive_donations()
+        self.client.force_login(self.receiver)
+        response = self.client.get(reverse("api_archived_donations"), {"fields": "id,status"})
+        self.assertEqual(response.json()["results"], [{"id": donation.pk, "status": "Expired"}])
+        response = self.client.get(reverse("api_donation_detail", args=[donation.pk]))
+        self.assertEqual(response.status_code, 404)
+
+
+@override_settings(STORAGES=TEST_STORAGES, PORTAL_STREAM_FEEDS=False)
+class IdempotencyTests(TestCase):
+    donation_form = {
+        "food_type": "Rice",
+        "quantity": "10 plates",
+        "pickup_location": "Main Street",
+        "pickup_time": "2030-01-01T10:00",
+        "expiry_date": "2030-01-02",
+    }
+
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+
+    def test_retried_donation_post_is_replayed(self):
+        self.client.force_login(self.donor)
+        data = {**self.donation_form, "idempotency_key": "k1"}
+        first = self.client.post(reverse("donor_dashboard"), data)
+        second = self.client.post(reverse("donor_dashboard"), data)
+        self.assertEqual(Donation.objects.count(), 1)
+        self.assertEqual((second.status_code, second["Location"]), (first.status_code, first["Location"]))
+        self.assertEqual(second["Idempotent-Replay"], "true")
+
+        self.client.post(reverse("donor_dashboard"), {**data, "idempotency_key": "k2"})
+        self.assertEqual(Donation.objects.count(), 2)
+
+    def test_keys_are_per_user_and_expire(self):
+        IdempotencyKey.objects.create(
+            key="stale", created_at=timezone.now() - datetime.timedelta(days=2), status_code=302
+        )
+        other = User.objects.create_user("canteen", password="x", user_type="donor")
+        data = {**self.donation_form, "idempotency_key": "same"}
+        for user in (self.donor, other):
+            self.client.force_login(user)
+            self.client.post(reverse("donor_dashboard"), data)
+        self.assertEqual(Donation.objects.count(), 2)
+        self.assertFalse(IdempotencyKey.objects.filter(key="stale").exists())
+
+    def test_in_flight_key_gets_conflict(self):
+        self.client.force_login(self.donor)
+        IdempotencyKey.objects.create(key=f"donation:{self.donor.pk}:k1", created_at=timezone.now())
+        response = self.client.post(reverse("donor_dashboard"), {**self.donation_form, "idempotency_key": "k1"})
+        self.assertEqual(response.status_code, 409)
+        self.assertFalse(Donation.objects.exists())
+
+    def test_abandoned_key_is_taken_over(self):
+        self.client.force_login(self.donor)
+        long_ago = timezone.now() - datetime.timedelta(minutes=10)
+        IdempotencyKey.objects.create(key=f"donation:{self.donor.pk}:k1", created_at=long_ago, claimed_at=long_ago)
+        response = self.client.post(reverse("donor_dashboard"), {**self.donation_form, "idempotency_key": "k1"})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Donation.objects.count(), 1)
+        stored = IdempotencyKey.objects.get()
+        self.assertEqual((stored.status_code, stored.created_at), (302, long_ago))
+        response = self.client.post(reverse("donor_dashboard"), {**self.donation_form, "idempotency_key": "k1"})
+        self.assertEqual(response["Idempotent-Replay"], "true")
+        self.assertEqual(Donation.objects.count(), 1)
+
+    def test_duplicate_claim_is_rejected_by_the_database(self):
+        donation = make_donation(self.donor)
+        self.client.force_login(self.receiver)
+        for key in ("a", "b"):
+            response = self.client.post(
+                reverse("request_food", args=[donation.pk]), {"message": "", "idempotency_key": key}
+            )
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(Request.objects.count(), 1)
+
+        response = self.client.post(
+            reverse("api_claims"), {"claims": [{"donation": donation.pk}]}, content_type="application/json"
+        )
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(response.json()["donations"], [donation.pk])
+
+    def test_feed_forms_carry_a_key(self):
+        make_donation(self.donor)
+        self.client.force_login(self.receiver)
+        response = self.client.get(reverse("receiver_dashboard"))
+        self.assertContains(response, 'name="idempotency_key"')
+
+
+@override_settings(STORAGES=TEST_STORAGES, PORTAL_STREAM_FEEDS=False)
+class PickupSlotTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+        self.start = timezone.now().replace(microsecond=0) + datetime.timedelta(days=1)
+
+    def slots(self, donation, **kwargs):
+        end = self.start + datetime.timedelta(hours=1)
+        return pickups.create_slots(donation, self.start, end, **kwargs)
+
+    def claim(self, donation, slot, user=None):
+        self.client.force_login(user or self.receiver)
+        return self.client.post(reverse("request_food", args=[donation.pk]), {"slot": slot.pk})
+
+    def test_huge_windows_are_rejected_before_building_slots(self):
+        donation = make_donation(self.donor)
+        url = reverse("api_donation_slots", args=[donation.pk])
+        self.client.force_login(self.donor)
+        end = self.start + datetime.timedelta(days=3650)
+        errors = {}
+        with mock.patch.object(pickups, "PickupSlot", side_effect=AssertionError("built a slot")):
+            for minutes in (1, 0, -5, 10**12):
+                response = self.client.post(
+                    url, {"start": self.start.isoformat(), "end": end.isoformat(), "minutes": minutes},
+                    content_type="application/json",
+                )
+                self.assertEqual(response.status_code, 400)
+                errors[minutes] = response.json()["error"]
+        self.assertEqual(errors[1], f"At most {pickups.MAX_SLOTS_PER_DONATION} slots per donation.")
+        self.assertTrue(errors[0].startswith("Slots must be between"))
+
+    def test_booking_through_request_food(self):
+        donation = make_donation(self.donor)
+        first, second = self.slots(donation)
+        self.claim(donation, first)
+        booking = PickupBooking.objects.get()
+        self.assertEqual((booking.slot, booking.request), (first, Request.objects.get()))
+        first.refresh_from_db()
+        self.assertEqual(first.booked, 1)
+
+    def test_full_slot_and_overlap_roll_back_the_request(self):
+        donation, other = make_donation(self.donor), make_donation(self.donor)
+        slot = self.slots(donation, minutes=60)[0]
+        overlapping = self.slots(other, minutes=30)[1]
+        self.claim(donation, slot)
+
+        response = self.claim(other, overlapping)
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(Request.objects.filter(donation=other).count(), 0)
+
+        late = User.objects.create_user("kitchen", password="x", user_type="receiver")
+        self.claim(donation, slot, user=late)
+        self.assertFalse(Request.objects.filter(requester=late).exists())
+        slot.refresh_from_db()
+        self.assertEqual(slot.booked, 1)
+
+    def test_adjacent_slots_do_not_conflict(self):
+        donation, other = make_donation(self.donor), make_donation(self.donor)
+        self.claim(donation, self.slots(donation)[0])
+        self.claim(other, self.slots(other)[1])
+        self.assertEqual(PickupBooking.objects.count(), 2)
+
+    def test_slot_must_belong_to_the_donation(self):
+        donation, other = make_donation(self.donor), make_donation(self.donor)
+        self.claim(donation, self.slots(other)[0])
+        self.assertFalse(PickupBooking.objects.exists())
+        self.assertFalse(Request.objects.exists())
+
+    def test_slot_api(self):
+        donation = make_donation(self.donor)
+        self.client.force_login(self.donor)
+        response = self.client.post(
+            reverse("api_donation_slots", args=[donation.pk]),
+            {"start": self.start.isoformat(), "end": (self.start + datetime.timedelta(hours=2)).isoformat(),
+             "minutes": 30, "capacity": 2},
+            content_type="application/json",
+        )
+        self.assertEqual(len(response.json()["created"]), 4)
+
+        self.client.force_login(self.receiver)
+        pages, cursor = [], None
+        while True:
+            params = {"limit": 3, "fields": "id,start", **({"cursor": cursor} if cursor else {})}
+            data = self.client.get(reverse("api_slots"), params).json()
+            pages.append(len(data["results"]))
+            cursor = data["next"]
+            if not cursor:
+                break
+        self.assertEqual(pages, [3, 1])
+
+        slot = PickupSlot.objects.first()
+        response = self.client.post(
+            reverse("api_claims"), {"claims": [{"donation": donation.pk, "slot": slot.pk}]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(PickupBooking.objects.get().slot, slot)
+
+    def test_feed_offers_free_slots(self):
+        donation = make_donation(self.donor)
+        self.slots(donation)
+        self.client.force_login(self.receiver)
+        self.assertContains(self.client.get(reverse("receiver_dashboard")), 'name="slot"')
+
+
+class WatchTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.receiver = User.objects.create_user(
+            "shelter", password="x", user_type="receiver", email="shelter@example.com"
+        )
+
+    def alerted(self):
+        return sorted(WatchAlert.objects.values_list("search__name", flat=True))
+
+    def test_terms_location_and_expiry(self):
+        watch.save_search(self.receiver, "veg rice", food="Vegetarian rice")
+        watch.save_search(self.receiver, "main street", location="main street.")
+        watch.save_search(self.receiver, "keeps", min_days_left=3)
+        watch.save_search(self.receiver, "anything")
+        today = timezone.localdate()
+        donations = [
+            make_donation(self.donor, food_type="Rice, vegetarian", pickup_location="Main  Street",
+                          expiry_date=today + datetime.timedelta(days=1)),
+            make_donation(self.donor, food_type="Rice", pickup_location="Park Road",
+                          expiry_date=today + datetime.timedelta(days=3)),
+        ]
+        self.assertEqual(watch.match(donations), 5)
+        # Alerts already queued are skipped, and not counted.
+        self.assertEqual(watch.match(donations), 0)
+        watch.save_search(self.receiver, "park", location="Park Road")
+        self.assertEqual(watch.match(donations), 1)
+        WatchAlert.objects.filter(search__name="park").delete()
+        self.assertEqual(
+            sorted(WatchAlert.objects.values_list("donation_id", "search__name")),
+            [
+                (donations[0].pk, "anything"), (donations[0].pk, "main street"),
+                (donations[0].pk, "veg rice"),
+                (donations[1].pk, "anything"), (donations[1].pk, "keeps"),
+            ],
+        )
+
+    def test_only_candidate_searches_are_loaded(self):
+        other = User.objects.create_user("kitchen", password="x", user_type="receiver")
+        for i in range(15):
+            watch.save_search(other, f"soup {i}", food=f"soup{i}")
+        watch.save_search(self.receiver, "bread", food="bread")
+        with CaptureQueriesContext(connection) as queries:
+            watch.match([make_donation(self.donor, food_type="Bread")])
+        select = next(q["sql"] for q in queries if '"portal_savedsearch"' in q["sql"])
+        self.assertIn("IN", select)
+        self.assertEqual(self.alerted(), ["bread"])
+
+    def test_within_a_radius(self):
+        centre = (12.9716, 77.5946)
+        search = watch.save_search(self.receiver, "nearby", near=centre)
+        self.assertEqual(search.radius_km, watch.DEFAULT_RADIUS_KM)
+        # About 0.011 degrees of latitude to the km.
+        near = make_donation(self.donor, latitude=centre[0] + 0.02, longitude=centre[1])
+        corner = make_donation(self.donor, latitude=centre[0] + 0.025, longitude=centre[1] + 0.025)
+        far = make_donation(self.donor, latitude=centre[0] + 0.05, longitude=centre[1])
+        nowhere = make_donation(self.donor)
+        self.assertLess(watch.distance_km(centre, (near.latitude, near.longitude)), 3)
+        # Inside the bounding box, but not the circle.
+        self.assertGreater(watch.distance_km(centre, (corner.latitude, corner.longitude)), 3)
+        self.assertEqual(watch.match([near, corner, far, nowhere]), 1)
+        self.assertEqual(list(WatchAlert.objects.values_list("donation_id", flat=True)), [near.pk])
+
+        # Away from every box, the search is not even loaded.
+        with mock.patch.object(watch, "matches", wraps=watch.matches) as checked:
+            self.assertEqual(watch.match([far]), 0)
+        checked.assert_not_called()
+
+        with self.assertRaises(watch.WatchError):
+            watch.save_search(self.receiver, "both", location="Main Street", near=centre)
+        with self.assertRaises(watch.WatchError):
+            watch.save_search(self.receiver, "huge", near=centre, radius_km=1000)
+        self.assertEqual(watch.bounding_box(89.99, 0, 5)[2:], (-180.0, 180.0))
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_new_donations_queue_and_send_alerts(self):
+        self.client.force_login(self.receiver)
+        response = self.client.post(
+            reverse("api_searches"), {"name": "soup", "food": "soup"}, content_type="application/json"
+        )
+        self.assertEqual(response.json()["terms"], "soup")
+
+        self.client.force_login(self.donor)
+        self.client.post(reverse("donor_dashboard"), {
+            "food_type": "Tomato soup", "quantity": "5 litres", "pickup_location": "Main Street",
+            "pickup_time": "2030-01-01T10:00", "expiry_date": "2030-01-02",
+        })
+        self.client.post(
+            reverse("api_donations"),
+            {"donations": [
+                {"food_type": food, "quantity": "1", "pickup_location": "Main Street",
+                 "pickup_time": "2030-01-01T10:00", "expiry_date": "2030-01-02"}
+                for food in ("Lentil soup", "Bread")
+            ]},
+            content_type="application/json",
+        )
+        self.assertEqual(self.alerted(), ["soup", "soup"])
+
+        call_command("send_watch_alerts", stdout=mock.Mock())
+        self.assertEqual(len(mail.outbox), 1)
+        self.assertIn("Lentil soup", mail.outbox[0].body)
+        self.client.force_login(self.receiver)
+        self.assertEqual(self.client.get(reverse("api_alerts"), {"pending": 1}).json()["results"], [])
+
+        search = SavedSearch.objects.get()
+        self.client.delete(reverse("api_search_detail", args=[search.pk]))
+        self.assertFalse(WatchAlert.objects.exists())
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class DonorFragmentTests(TestCase):
+    DONATION = {
+        "food_type": "Soup",
+        "quantity": "5 litres",
+        "pickup_location": "Main Street",
+        "pickup_time": "2030-01-01T10:00",
+        "expiry_date": "2030-01-02",
+    }
+
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.client.force_login(self.donor)
+
+    def fragment(self, method, name, args=(), data=None):
+        return getattr(self.client, method)(reverse(name, args=args), data or {}, headers={"HX-Request": "true"})
+
+    def test_post_returns_the_new_card_and_a_fresh_form(self):
+        for _ in range(20):
+            make_donation(self.donor)
+        page = self.client.get(reverse("donor_dashboard"))
+        response = self.fragment("post", "donor_dashboard", data=self.DONATION)
+        self.assertEqual(response.status_code, 201)
+        donation = Donation.objects.latest("pk")
+        self.assertContains(response, f'id="donation-{donation.pk}"', status_code=201)
+        self.assertContains(response, 'id="donation-form"', status_code=201)
+        self.assertLess(len(response.content) * 5, len(page.content))
+
+        response = self.fragment("post", "donor_dashboard", data={**self.DONATION, "quantity": ""})
+        self.assertEqual(response.status_code, 422)
+        self.assertContains(response, "errorlist", status_code=422)
+
+    def test_edit_and_delete_fragments(self):
+        donation = make_donation(self.donor)
+        receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+        Request.objects.create(donation=donation, requester=receiver, message="Please")
+
+        response = self.fragment("get", "edit_donation", [donation.pk])
+        self.assertContains(response, f'action="{reverse("edit_donation", args=[donation.pk])}"')
+        response = self.fragment("post", "edit_donation", [donation.pk], {**self.DONATION, "food_type": "Stew"})
+        self.assertContains(response, "<strong>Stew</strong>")
+        self.assertNotContains(response, f'action="{reverse("edit_donation", args=[donation.pk])}"')
+
+        self.assertContains(self.fragment("get", "donor_requests"), "shelter")
+        response = self.fragment("post", "delete_donation", [donation.pk])
+        self.assertContains(response, f'id="request-{Request.all_objects.get().pk}" data-swap-oob="delete"')
+        self.assertIsNotNone(Donation.all_objects.get(pk=donation.pk).deleted_at)
+
+
+class SettingsTests(TestCase):
+    def test_env_readers(self):
+        with mock.patch.dict(os.environ, {
+            "T_BOOL": "off", "T_INT": "42", "T_LIST": "a.example.com, b.example.com,",
+            "T_MAP": "journal_mode=WAL,synchronous=NORMAL", "T_EMPTY": " ",
+        }):
+            self.assertIs(env.boolean("T_BOOL", True), False)
+            self.assertEqual(env.integer("T_INT", 0), 42)
+            self.assertEqual(env.items("T_LIST"), ["a.example.com", "b.example.com"])
+            self.assertEqual(env.mapping("T_MAP"), {"journal_mode": "WAL", "synchronous": "NORMAL"})
+            self.assertEqual(env.integer("T_EMPTY", 7), 7)
+            self.assertEqual(env.choice("T_EMPTY", "db", {"db": "sessions.db"}), "sessions.db")
+            for reader, name in ((env.boolean, "T_INT"), (env.integer, "T_BOOL")):
+                with self.assertRaisesMessage(ImproperlyConfigured, name):
+                    reader(name, None)
+            with self.assertRaises(ImproperlyConfigured):
+                env.choice("T_BOOL", "db", {"db": "sessions.db"})
+
+    def test_production_profile(self):
+        script = (
+            "import django, json; django.setup(); from django.conf import settings as s; "
+            "print(json.dumps([s.DEBUG, s.SESSION_ENGINE, s.DATABASES['default']['CONN_MAX_AGE'], "
+            "s.DATABASES['default']['OPTIONS']]))"
+        )
+        environ = {
+            **os.environ, "DJANGO_SETTINGS_MODULE": "foodsdonation.settings",
+            "DJANGO_PROFILE": "production", "DJANGO_SECRET_KEY": "x", "DJANGO_CACHE_BACKEND": "file",
+            "DJANGO_DB_PRAGMAS": "journal_mode=WAL",
+        }
+        output = subprocess.run(
+            [sys.executable, "-c", script], env=environ, cwd=settings.BASE_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout
+        debug, sessions, max_age, options = json.loads(output)
+        self.assertEqual((debug, sessions, max_age), (False, "django.contrib.sessions.backends.cached_db", 600))
+        self.assertEqual(options["init_command"], "PRAGMA journal_mode=WAL;")
+        self.assertEqual(options["transaction_mode"], "IMMEDIATE")
+
+    def ids(self, issues):
+        return sorted(issue.id for issue in issues)
+
+    def test_performance_checks(self):
+        ids = self.ids
+        self.assertEqual(ids(checks.check_databases(None)), ["portal.W002", "portal.W003"])
+        with override_settings(DEBUG=True, SESSION_ENGINE="django.contrib.sessions.backends.cache"):
+            self.assertEqual(ids(checks.check_debug(None)), ["portal.W001"])
+            self.assertEqual(ids(checks.check_caches(None)), ["portal.W007"])
+        plain = {**settings.STORAGES, "staticfiles": {"BACKEND": "django.contrib.staticfiles.storage.StaticFilesStorage"}}
+        with override_settings(STORAGES=plain):
+            self.assertEqual(ids(checks.check_static_storage(None)), ["portal.W009"])
+        self.assertEqual(ids(checks.check_templates(None)), [])
+        with override_settings(PORTAL_REQUEST_PROFILE_EVERY=10):
+            self.assertEqual(ids(checks.check_request_profiling(None)), ["portal.W011"])
+        self.assertEqual(
+            checks._pragmas({"OPTIONS": {"init_command": "PRAGMA journal_mode=WAL; PRAGMA synchronous = normal;"}}),
+            {"journal_mode": "wal", "synchronous": "normal"},
+        )
+
+
+class InboxTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.receivers = [
+            User.objects.create_user(f"shelter{i}", password="x", user_type="receiver") for i in range(4)
+        ]
+
+    def requests_for(self, donation, receivers=None):
+        return [
+            Request.objects.create(donation=donation, requester=receiver, message="")
+            for receiver in receivers or self.receivers
+        ]
+
+    def statuses(self, requests):
+        return list(Request.objects.filter(pk__in=[r.pk for r in requests]).order_by("pk").values_list("status", flat=True))
+
+    def test_accept_declines_siblings_and_frees_their_slots(self):
+        donation, other = make_donation(self.donor), make_donation(self.donor)
+        first, *rest = self.requests_for(donation)
+        untouched = self.requests_for(other)
+        start = timezone.now() + datetime.timedelta(days=1)
+        slot = pickups.create_slots(donation, start, start + datetime.timedelta(hours=1), minutes=60, capacity=4)[0]
+        for claim in (first, rest[0], rest[1]):
+            pickups.book(slot.pk, claim.requester, claim)
+
+        self.assertEqual(inbox.decide(self.donor, "accept", [first.pk]), (1, 3))
+        self.assertEqual(self.statuses([first, *rest]), ["accepted"] + ["declined"] * 3)
+        self.assertEqual(self.statuses(untouched), ["pending"] * 4)
+        slot.refresh_from_db()
+        self.assertEqual(slot.booked, 1)
+        self.assertEqual(list(PickupBooking.objects.values_list("request_id", flat=True)), [first.pk])
+
+        self.assertEqual(inbox.decide(self.donor, "collect", [first.pk, rest[0].pk]), (1, 0))
+        self.assertEqual(self.statuses([first, rest[0]]), ["collected", "declined"])
+
+    def test_one_accepted_request_per_donation(self):
+        donation, other = make_donation(self.donor), make_donation(self.donor)
+        first, second, *_ = self.requests_for(donation)
+        elsewhere = self.requests_for(other, self.receivers[:1])[0]
+        with self.assertRaises(inbox.InboxError):
+            inbox.decide(self.donor, "accept", [first.pk, second.pk, elsewhere.pk])
+        self.assertEqual(self.statuses([first, second, elsewhere]), ["pending"] * 3)
+
+        self.assertEqual(inbox.decide(self.donor, "accept", [first.pk, elsewhere.pk]), (2, 3))
+        # A request arriving after the accept cannot be accepted as well.
+        late = self.requests_for(other, self.receivers[1:2])[0]
+        self.assertEqual(inbox.decide(self.donor, "accept", [late.pk]), (0, 0))
+        self.assertEqual(self.statuses([first, second, elsewhere, late]), ["accepted", "declined", "accepted", "pending"])
+
+    def test_decisions_are_set_based(self):
+        counts = []
+        for siblings in (3, 30):
+            donation = make_donation(self.donor)
+            receivers = [
+                User.objects.create_user(f"r{siblings}-{i}", password="x", user_type="receiver")
+                for i in range(siblings)
+            ]
+            claims = self.requests_for(donation, receivers)
+            with CaptureQueriesContext(connection) as queries:
+                inbox.decide(self.donor, "accept", [claims[0].pk])
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+    def test_only_the_donors_own_requests_move(self):
+        other_donor = User.objects.create_user("canteen", password="x", user_type="donor")
+        claims = self.requests_for(make_donation(self.donor))
+        self.assertEqual(inbox.decide(other_donor, "decline", [c.pk for c in claims]), (0, 0))
+        self.assertEqual(inbox.decide(self.donor, "collect", [claims[0].pk]), (0, 0))
+        with self.assertRaises(inbox.InboxError):
+            inbox.decide(self.donor, "approve", [claims[0].pk])
+
+    def test_inbox_counts_in_one_query(self):
+        donation, quiet = make_donation(self.donor), make_donation(self.donor)
+        claims = self.requests_for(donation)
+        inbox.decide(self.donor, "decline", [claims[0].pk])
+        with self.assertNumQueries(2):
+            donations = list(inbox.inbox(self.donor))
+        self.assertEqual([d.pk for d in donations], [donation.pk])
+        self.assertEqual((donations[0].pending, donations[0].declined, donations[0].total_requests), (3, 1, 4))
+        self.assertEqual(len(donations[0].inbox_requests), 4)
+        self.assertEqual(list(inbox.inbox(self.donor, "accepted")), [])
+        self.assertNotIn(quiet.pk, [d.pk for d in inbox.inbox(self.donor)])
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_inbox_view_and_api(self):
+        claims = self.requests_for(make_donation(self.donor))
+        self.client.force_login(self.donor)
+        response = self.client.post(reverse("donor_inbox"), {"action": "accept", "requests": [claims[1].pk]})
+        self.assertRedirects(response, reverse("donor_inbox"))
+        page = self.client.get(reverse("donor_inbox"))
+        self.assertContains(page, "1 accepted, 3 declined")
+
+        response = self.client.post(
+            reverse("api_request_decisions"),
+            {"action": "collect", "requests": [claims[1].pk]},
+            content_type="application/json",
+        )
+        self.assertEqual(response.json(), {"changed": 1, "declined_siblings": 0})
+        data = self.client.get(reverse("api_requests"), {"status": "collected", "fields": "id,status"}).json()
+        self.assertEqual(data["results"], [{"id": claims[1].pk, "status": "collected"}])
+
+
+class RecurringTests(TestCase):
+    # A Monday.
+    today = datetime.date(2030, 1, 7)
+
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+
+    def make_template(self, rule="FREQ=DAILY", **kwargs):
+        kwargs.setdefault("starts_on", self.today)
+        return RecurringDonation.objects.create(
+            donor=self.donor, food_type="Bread", quantity="20 loaves", pickup_location="Main Street",
+            rule=rule, pickup_time=datetime.time(18, 0), **kwargs,
+        )
+
+    def test_rules(self):
+        def dates(rule, days=14, starts_on=self.today):
+            last = self.today + datetime.timedelta(days=days - 1)
+            return [d.day for d in recurring.occurrences(recurring.parse_rule(rule), starts_on, self.today, last)]
+
+        self.assertEqual(dates("FREQ=WEEKLY;BYDAY=MO,WE,FR"), [7, 9, 11, 14, 16, 18])
+        self.assertEqual(dates("FREQ=WEEKLY;INTERVAL=2;BYDAY=FR"), [11])
+        self.assertEqual(dates("freq=daily;interval=3", days=7), [7, 10, 13])
+        self.assertEqual(dates("FREQ=WEEKLY", starts_on=datetime.date(2030, 1, 2)), [9, 16])
+        self.assertEqual(dates("FREQ=DAILY;UNTIL=20300109"), [7, 8, 9])
+        for rule in ("", "FREQ=MONTHLY", "FREQ=DAILY;BYDAY=MO", "FREQ=DAILY;COUNT=3",
+                     "FREQ=WEEKLY;BYDAY=XX", "FREQ=DAILY;INTERVAL=0"):
+            with self.assertRaises(recurring.RuleError):
+                recurring.parse_rule(rule)
+
+    def test_materialize_is_incremental_and_idempotent(self):
+        daily = self.make_template(shelf_days=2)
+        weekly = self.make_template("FREQ=WEEKLY;BYDAY=TU,SA")
+        self.make_template(active=False)
+        self.make_template(ends_on=self.today + datetime.timedelta(days=1))
+
+        self.assertEqual(recurring.materialize(horizon=6, batch_size=2, today=self.today), 7 + 2 + 2)
+        donation = Donation.objects.get(recurrence=daily, occurrence=self.today)
+        self.assertEqual(timezone.localtime(donation.pickup_time).time(), datetime.time(18, 0))
+        self.assertEqual(donation.expiry_date, self.today + datetime.timedelta(days=2))
+        self.assertEqual(donation.status, "Available")
+        self.assertEqual(
+            DonationEvent.objects.filter(kind=DonationEvent.CREATED).count(), Donation.objects.count()
+        )
+
+        self.assertEqual(recurring.materialize(horizon=6, today=self.today), 0)
+        tomorrow = self.today + datetime.timedelta(days=1)
+        self.assertEqual(recurring.materialize(horizon=6, today=tomorrow), 1)
+        self.assertEqual(weekly.donations.count(), 2)
+        # Losing the watermark regenerates nothing: the unique constraint skips them.
+        RecurringDonation.objects.update(materialized_until=None)
+        self.assertEqual(recurring.materialize(horizon=6, today=tomorrow), 0)
+        self.assertEqual(daily.donations.count(), 8)
+
+    def test_api_and_command(self):
+        self.client.force_login(self.donor)
+        url = reverse("api_recurring_donations")
+        template = {
+            "food_type": "Bread", "quantity": "20 loaves", "pickup_location": "Main Street",
+            "pickup_time": "18:00", "shelf_days": 1, "starts_on": str(timezone.localdate()),
+        }
+        response = self.client.post(url, {**template, "rule": "FREQ=HOURLY"}, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("rule", response.json()["errors"])
+        response = self.client.post(url, {**template, "rule": "FREQ=DAILY"}, content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        pk = response.json()["id"]
+
+        call_command("materialize_recurring", "--days", "2", stdout=mock.Mock())
+        self.assertEqual(Donation.objects.filter(recurrence_id=pk).count(), 3)
+        response = self.client.delete(reverse("api_recurring_donation_detail", args=[pk]))
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(RecurringDonation.objects.get(pk=pk).active)
+
+
+def jpeg(width=1200, height=900):
+    from io import BytesIO
+
+    from PIL import Image
+
+    buffer = BytesIO()
+    Image.new("RGB", (width, height), (200, 120, 40)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+@unittest.skipIf(thumbnails.Image is None, "Pillow is not installed")
+@override_settings(STORAGES=TEST_STORAGES, PORTAL_THUMBNAIL_WORKERS=0)
+class PhotoTests(TestCase):
+    def setUp(self):
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media)
+        self.enterContext(override_settings(MEDIA_ROOT=media))
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.donation = make_donation(self.donor)
+        self.client.force_login(self.donor)
+
+    def upload(self, content, name="bread.jpg"):
+        return self.client.post(
+            reverse("donation_photos", args=[self.donation.pk]),
+            {"photo": SimpleUploadedFile(name, content)},
+        )
+
+    def test_upload_is_checked_and_stored_pending(self):
+        self.upload(b"<?php echo 1; ?>", name="bread.jpg")
+        self.assertFalse(DonationPhoto.objects.exists())
+        with override_settings(PORTAL_PHOTO_MAX_SIZE=1024):
+            self.upload(jpeg())
+            self.assertFalse(DonationPhoto.objects.exists())
+            # Far too large: refused before the body is read.
+            self.assertEqual(self.upload(b"\xff\xd8\xff" + bytes(200_000)).status_code, 413)
+        response = self.client.post(
+            reverse("donation_photos", args=[self.donation.pk]), {"photo": SimpleUploadedFile("a.jpg", jpeg())},
+            CONTENT_LENGTH="lots",
+        )
+        self.assertEqual(response.status_code, 400)
+
+        self.assertRedirects(self.upload(jpeg()), reverse("donor_dashboard"))
+        photo = DonationPhoto.objects.get()
+        self.assertEqual((photo.status, photo.content_type), (DonationPhoto.PENDING, "image/jpeg"))
+        self.assertTrue(photo.image.name.startswith("photos/originals/"))
+        self.assertTrue(os.path.exists(photo.image.path))
+
+    def test_thumbnails_rendered_by_pool_and_served_cached(self):
+        self.upload(jpeg())
+        self.upload(jpeg())
+        self.assertEqual(photos.render_pending(workers=1), 2)
+        first, second = DonationPhoto.objects.order_by("pk")
+        self.assertEqual((first.status, first.width, first.height), (DonationPhoto.READY, 320, 240))
+        # Identical bytes share their thumbnails.
+        self.assertEqual(first.thumbnail, second.thumbnail)
+
+        receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+        self.client.force_login(receiver)
+        page = b"".join(self.client.get(reverse("receiver_dashboard")).streaming_content).decode()
+        self.assertIn('loading="lazy"', page)
+        url = photos.thumbnail_urls(first)["src"]
+        self.assertIn(f'src="{url}"', page)
+        self.assertIn(f"{first.thumbnail}-640.webp 2x", page)
+
+        self.client.force_login(self.donor)
+        response = self.client.post(
+            reverse("edit_donation", args=[self.donation.pk]),
+            {
+                "food_type": "Stew", "quantity": "5 litres", "pickup_location": "Main Street",
+                "pickup_time": "2030-01-01T10:00", "expiry_date": "2030-01-02",
+            },
+            headers={"HX-Request": "true"},
+        )
+        self.assertContains(response, "<strong>Stew</strong>")
+        self.assertContains(response, f'src="{url}"', count=2)
+
+        response = self.client.get(url, HTTP_ACCEPT_ENCODING="gzip, br")
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        self.assertIn("immutable", response["Cache-Control"])
+        self.assertFalse(response.has_header("Content-Encoding"))
+        self.assertEqual(self.client.get("/media/../db.sqlite3").status_code, 404)
+
+
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+
+    def feed(self, since=None, limit=50):
+        params = {"limit": limit, **({"since": since} if since else {})}
+        return self.client.get(reverse("api_changes"), params).json()
+
+    def test_every_write_path_records_one_change(self):
+        first = make_donation(self.donor)
+        second, third = Donation.objects.bulk_create(
+            [Donation(donor=self.donor, food_type=f"Soup {i}", quantity="1", pickup_location="x",
+                      pickup_time=timezone.now(), expiry_date=timezone.localdate()) for i in range(2)]
+        )
+        claim = Request.objects.create(donation=third, requester=self.receiver)
+        Donation.objects.filter(pk=first.pk).update(status="Expired")
+        third.soft_delete()
+        Donation.all_objects.filter(pk=second.pk).delete()
+
+        self.assertEqual(
+            list(Change.objects.order_by("seq").values_list("kind", "object_id", "deleted")),
+            [
+                (Change.DONATION, first.pk, False),
+                (Change.DONATION, third.pk, True),
+                (Change.REQUEST, claim.pk, True),
+                (Change.DONATION, second.pk, True),
+            ],
+        )
+
+    def test_delta_sync(self):
+        donations = [make_donation(self.donor, food_type=f"Meal {i}") for i in range(3)]
+        make_donation(self.donor).soft_delete()
+        other = User.objects.create_user("kitchen", password="x", user_type="receiver")
+        Request.objects.create(donation=donations[0], requester=other)
+        self.client.force_login(self.receiver)
+
+        self.assertTrue(self.feed(limit=2)["more"])
+        page = self.feed()
+        # The snapshot leaves out tombstones and other receivers' requests.
+        self.assertEqual(
+            [(item["type"], item["id"]) for item in page["changes"]],
+            [("donation", donation.pk) for donation in donations],
+        )
+        self.assertEqual(page["changes"][2]["data"]["food_type"], "Meal 2")
+        token = page["next"]
+
+        with CaptureQueriesContext(connection) as queries:
+            page = self.feed(token)
+        self.assertEqual((page["changes"], page["next"], page["more"]), ([], token, False))
+        self.assertEqual(sum('"portal_' in q["sql"] and "portal_user" not in q["sql"] for q in queries), 1)
+
+        Donation.objects.filter(pk=donations[1].pk).update(quantity="7")
+        donations[0].soft_delete()
+        page = self.feed(token)
+        # Another receiver's request is deleted too; its tombstone is theirs.
+        self.assertEqual(
+            page["changes"],
+            [
+                {"type": "donation", "id": donations[1].pk, "data": page["changes"][0]["data"]},
+                {"type": "donation", "id": donations[0].pk, "deleted": True},
+            ],
+        )
+        self.assertEqual(page["changes"][0]["data"]["quantity"], "7")
+        tombstone = {"type": "request", "id": Request.all_objects.get().pk, "deleted": True}
+        for user in (other, self.donor):
+            self.client.force_login(user)
+            self.assertIn(tombstone, self.feed(token)["changes"])
+
+    def test_hard_deleted_request_keeps_its_owners(self):
+        donation = make_donation(self.donor)
+        claim = Request.objects.create(donation=donation, requester=self.receiver)
+        Donation.all_objects.filter(pk=donation.pk).delete()
+        change = Change.objects.get(kind=Change.REQUEST)
+        self.assertEqual(
+            (change.object_id, change.deleted, change.requester_id, change.donor_id),
+            (claim.pk, True, self.receiver.pk, self.donor.pk),
+        )
+
+
+@unittest.skipIf(routes.np is None, "NumPy is not installed")
+class RouteTests(TestCase):
+    def test_two_opt_uncrosses(self):
+        # The corners of a square (node 0 is the depot), visited crosswise.
+        matrix = routes.distance_matrix([(0, 0), (0, 0.01), (0.01, 0.01), (0.01, 0)])
+        crossing = routes.np.array([0, 2, 1, 3, 0])
+        improved = routes.two_opt(matrix, crossing)
+        self.assertLess(routes.tour_length(matrix, improved), routes.tour_length(matrix, crossing))
+        self.assertAlmostEqual(routes.tour_length(matrix, improved), 4 * matrix[0, 1])
+        # Stops on a line are visited in order, whatever order they came in.
+        order, distance = routes.order_stops([(0, 0.03), (0, 0.01), (0, 0.04), (0, 0.02)], depot=(0, 0))
+        self.assertEqual(list(order), [1, 3, 0, 2])
+        self.assertAlmostEqual(distance, 2 * matrix[0, 1] * 4, places=6)
+
+    def test_plan_by_window_and_size(self):
+        donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        day = timezone.localdate() + datetime.timedelta(days=1)
+        morning = timezone.make_aware(datetime.datetime.combine(day, datetime.time(9)))
+
+        def claimed(hours, latitude, **kwargs):
+            kwargs.setdefault("status", "Requested")
+            return make_donation(
+                donor, pickup_time=morning + datetime.timedelta(hours=hours),
+                latitude=latitude, longitude=77.6, **kwargs,
+            )
+
+        early = [claimed(0.25 * i, 12.9 + 0.01 * i) for i in range(4)]
+        late = [claimed(6, 12.95)]
+        claimed(0, None)
+        claimed(0, 12.9, status="Available")
+
+        planned = routes.plan(routes.claimed(day), depot=(12.9, 77.5), max_stops=3)
+        self.assertEqual([len(route.stops) for route in planned], [3, 1, 1])
+        self.assertEqual(planned[-1].stops, late)
+        self.assertEqual(
+            sorted(stop.pk for route in planned[:2] for stop in route.stops), [d.pk for d in early]
+        )
+        self.assertTrue(all(route.distance > 0 for route in planned))
+
+        self.client.force_login(donor)
+        self.assertEqual(self.client.get(reverse("api_routes")).status_code, 403)
+        staff = User.objects.create_user("coordinator", password="x", is_staff=True)
+        self.client.force_login(staff)
+        response = self.client.get(reverse("api_routes"), {"date": str(day), "depot": "12.9,77.5"})
+        self.assertEqual(len(response.json()["routes"]), 2)
+
+
+@override_settings(STORAGES=TEST_STORAGES, PORTAL_REQUEST_PROFILE_TOKEN="letmein")
+class ProfilingTests(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.enterContext(override_settings(PORTAL_REQUEST_PROFILE_DIR=self.directory))
+        receiver = User.objects.create_user("shelter", password="x", user_type="receiver")
+        make_donation(User.objects.create_user("bakery", password="x", user_type="donor"))
+        self.client.force_login(receiver)
+
+    def test_profiles_requests_asked_for(self):
+        for token in ("nope", None, "letmein"):
+            headers = {profiling.HEADER: token} if token else {}
+            response = self.client.get(reverse("receiver_dashboard"), headers=headers)
+            # A streamed page is profiled until its last chunk.
+            b"".join(response.streaming_content)
+        found = profiling.samples(self.directory)
+        self.assertEqual([(sample.name, sample.meta["status"]) for sample in found], [("receiver_dashboard", 200)])
+        for extension in (".prof", ".heap"):
+            self.assertTrue(os.path.exists(found[0].path + extension))
+        self.assertGreater(found[0].meta["peak"], 0)
+
+        out = io.StringIO()
+        call_command("profiles", "--limit", "3", "--portal", stdout=out)
+        self.assertIn("receiver_dashboard: 1 sample(s)", out.getvalue())
+        self.assertIn("function calls", out.getvalue())
+
+    def test_sampling(self):
+        with override_settings(PORTAL_REQUEST_PROFILE_TOKEN=None, PORTAL_REQUEST_PROFILE_EVERY=1):
+            self.client.get(reverse("api_donations"))
+        self.assertEqual([sample.name for sample in profiling.samples(self.directory)], ["api_donations"])
+        with self.assertRaises(CommandError):
+            call_command("profiles", "--view", "home", stdout=io.StringIO())
+
+
+class MaintenanceTests(TransactionTestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)
+        self.enterContext(override_settings(PORTAL_BACKUP_DIR=self.directory))
+
+    def test_backup_in_steps(self):
+        make_donation(User.objects.create_user("bakery", password="x", user_type="donor"))
+        for _ in range(3):
+            result = maintenance.backup("default", pages=1, pause=0, keep=2)
+        self.assertGreater(result.steps, 1)
+        self.assertLessEqual(result.longest, result.held)
+        kept = maintenance.backups("default")
+        self.assertEqual(len(kept), 2)
+        self.assertIn(kept[-1], result.detail)
+        copy = sqlite3.connect(kept[-1])
+        self.addCleanup(copy.close)
+        self.assertEqual(copy.execute("SELECT food_type FROM portal_donation").fetchall(), [("Rice",)])
+
+    def test_optimize_vacuum_and_schedule(self):
+        self.assertEqual(maintenance.optimize("default").detail, "first ANALYZE")
+        self.assertEqual(maintenance.optimize("default").detail, "PRAGMA optimize")
+        self.assertIn("skipped", maintenance.vacuum("default").detail)
+
+        with override_settings(PORTAL_MAINTENANCE_SCHEDULE={"optimize": 3600}):
+            out = io.StringIO()
+            call_command("maintain_db", "--scheduled", stdout=out)
+            self.assertIn("default optimize:", out.getvalue())
+            self.assertEqual(list(maintenance.run_due(["default"])), [])
+            self.assertEqual(maintenance.due(["default"], now=time.time() + 3600), [("default", "optimize")])
+        with self.assertRaises(CommandError):
+            call_command("maintain_db", "defragment")
+
+
+@override_settings(STORAGES=TEST_STORAGES)
+class PageCacheTests(TestCase):
+    def setUp(self):
+        pagecache.store.clear()
+        pagecache.counters.clear()
+        self.addCleanup(pagecache.store.clear)
+
+    def token(self, response):
+        return response.content.split(b'name="csrfmiddlewaretoken" value="')[1].split(b'"')[0].decode()
+
+    def test_anonymous_pages_get_their_own_csrf_token(self):
+        login = reverse("donorLogin")
+        first = self.client.get(login)
+        self.assertEqual(first[pagecache.HEADER], "miss")
+        for _ in range(2):
+            client = Client(enforce_csrf_checks=True)
+            hit = client.get(login)
+            self.assertEqual(hit[pagecache.HEADER], "hit")
+            self.assertEqual(hit["X-Frame-Options"], "DENY")
+            self.assertNotEqual(self.token(hit), self.token(first))
+            self.assertIn(settings.CSRF_COOKIE_NAME, hit.cookies)
+            # The token filled in matches the visitor's own cookie.
+            response = client.post(login, {"username": "nobody", "password": "x", "csrfmiddlewaretoken": self.token(hit)})
+            self.assertEqual(response.status_code, 200)
+        self.assertEqual(pagecache.stats()["views"]["donor_login_view"]["hit_ratio"], round(2 / 3, 4))
+
+    def test_roles_and_messages(self):
+        signup = reverse("donor_signup")
+        donor = User.objects.create_user("bakery", password="x", user_type="donor")
+        self.client.force_login(donor)
+        self.assertEqual([self.client.get(signup)[pagecache.HEADER] for _ in range(2)], ["miss", "hit"])
+        # Login pages are only cached for anonymous visitors.
+        self.assertEqual(self.client.get(reverse("donorLogin"))[pagecache.HEADER], "bypass")
+        self.client.force_login(User.objects.create_user("shelter", password="x", user_type="receiver"))
+        self.assertEqual(self.client.get(signup)[pagecache.HEADER], "miss")
+
+        self.client.logout()
+        data = {
+            "username": "canteen", "email": "c@example.com", "mobile_number": "5550100",
+            "password1": "Str0ng-passw0rd", "password2": "Str0ng-passw0rd",
+        }
+        response = self.client.post(signup, data, follow=True)
+        self.assertEqual(response[pagecache.HEADER], "bypass")
+        self.assertContains(response, "Donor account created successfully")
+        again = self.client.get(reverse("donorLogin"))
+        self.assertNotContains(again, "Donor account created successfully")
+
+        self.client.force_login(donor)
+        self.assertEqual(self.client.get(reverse("api_page_cache")).status_code, 403)
+        self.client.force_login(User.objects.create_user("coordinator", password="x", is_staff=True))
+        views = self.client.get(reverse("api_page_cache")).json()["views"]
+        self.assertEqual(views["donor_signup"], {"hit": 1, "miss": 2, "bypass": 0, "hit_ratio": round(1 / 3, 4)})
+
+
+class QueryBudgetTests(TestCase):
+    def test_every_view_within_budget(self):
+        report = querybudget.report(querybudget.crawl())
+        self.assertEqual(
+            [(view["route"], view["role"], view["problems"]) for view in report["views"] if view["problems"]], []
+        )
+        self.assertEqual(len(report["views"]), len(urls.urlpatterns) * len(querybudget.ROLES))
+        self.assertEqual(json.loads(json.dumps(report)), report)
+
+    def test_problems(self):
+        self.assertEqual(querybudget.problems("api_donations", [200, 200], [3, 3]), [])
+        self.assertEqual(
+            querybudget.problems("api_donations", [200, 500], [3, 5]),
+            ["server error: 200, 500", "grows with the data: 3 -> 5 queries", "over budget: 5 > 3 queries"],
+        )
+        self.assertEqual(querybudget.problems("new_view", [200], [1]), ["no budget declared"])
+
+
+SHARDS = {"north": "region_north", "south": "region_south"}
+
+
+@override_settings(PORTAL_SHARDS=SHARDS)
+class ShardingTests(TransactionTestCase):
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        # The shards' test databases are made here rather than by the test
+        # runner, so the rest of the suite keeps a single database.  They
+        # are flushed after each test like default; flushing keeps the id
+        # blocks.
+        cls.databases = {*cls.databases, *SHARDS.values()}
+        for alias in SHARDS.values():
+            default = connections.settings["default"]
+            settings.DATABASES[alias] = connections.settings[alias] = {
+                **default, "TEST": {**default["TEST"], "NAME": None}
+            }
+            connections[alias].creation.create_test_db(verbosity=0, autoclobber=True, serialize=False)
+            sharding.seed_ids(alias)
+
+    @classmethod
+    def tearDownClass(cls):
+        for alias in SHARDS.values():
+            connections[alias].creation.destroy_test_db(settings.DATABASES[alias]["NAME"], verbosity=0)
+            connections[alias].close()
+            del connections[alias]
+            connections.settings.pop(alias, None)
+            settings.DATABASES.pop(alias, None)
+        super().tearDownClass()
+
+    def setUp(self):
+        self.north = User.objects.create_user("bakery", password="x", user_type="donor", region="north")
+        self.south = User.objects.create_user("canteen", password="x", user_type="donor", region="south")
+        self.local = User.objects.create_user("kitchen", password="x", user_type="donor")
+        self.receiver = User.objects.create_user("shelter", password="x", user_type="receiver", region="north")
+
+    def test_rows_follow_the_region(self):
+        self.assertEqual(User.objects.using("region_south").get(pk=self.north.pk).username, "bakery")
+        self.north.email = "bakery@example.com"
+        self.north.save()
+        self.assertEqual(User.objects.using("region_south").get(pk=self.north.pk).email, "bakery@example.com")
+
+        self.client.force_login(self.north)
+        item = {
+            "food_type": "Bread", "quantity": "5 loaves", "pickup_location": "Main Street",
+            "pickup_time": (timezone.now() + datetime.timedelta(days=1)).isoformat(),
+            "expiry_date": str(timezone.localdate() + datetime.timedelta(days=2)),
+        }
+        response = self.client.post(
+            reverse("api_donations"), {"donations": [item]}, content_type="application/json"
+        )
+        [bread] = response.json()["created"]
+        self.assertEqual(sharding.locate(bread), "region_north")
+        self.assertEqual(Donation.objects.using("region_north").get(pk=bread).donor, self.north)
+        self.assertEqual(DonationEvent.objects.using("region_north").get().donation_id, bread)
+        self.assertFalse(Donation.objects.filter(pk=bread).exists())
+        soup = self.south.donation_set.create(
+            food_type="Soup", quantity="1", pickup_location="x",
+            pickup_time=timezone.now(), expiry_date=timezone.localdate(),
+        )
+        with sharding.region("north"):
+            claim = Request.objects.create(donation_id=bread, requester=self.receiver)
+        self.assertEqual(claim._state.db, "region_north")
+        self.assertEqual(self.receiver.request_set.get(), claim)
+
+        # A region sees its own donations; staff see every region's.
+        self.client.force_login(self.receiver)
+        listed = self.client.get(reverse("api_donations")).json()["results"]
+        self.assertEqual([row["id"] for row in listed], [bread])
+        staff = User.objects.create_user("coordinator", password="x", is_staff=True)
+        self.client.force_login(staff)
+        first = self.client.get(reverse("api_donations"), {"limit": 1}).json()
+        rest = self.client.get(reverse("api_donations"), {"cursor": first["next"]}).json()
+        self.assertEqual([row["id"] for row in first["results"] + rest["results"]], [bread, soup.pk])
+        self.assertEqual(self.client.get(reverse("api_donation_detail", args=[soup.pk])).json()["food_type"], "Soup")
+
+        self.south.delete()
+        self.assertFalse(Donation.objects.using("region_south").exists())
+        self.assertFalse(User.objects.using("region_north").filter(username="canteen").exists())
+
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_dashboard_shows_donor_profiles(self):
+        profile = Donor.objects.create(user=self.north, mobile_number="555-0101")
+        self.assertEqual(Donor.objects.using("region_north").get(pk=profile.pk).mobile_number, "555-0101")
+        self.north.donation_set.create(
+            food_type="Bread", quantity="5 loaves", pickup_location="x",
+            pickup_time=timezone.now() + datetime.timedelta(days=1), expiry_date=timezone.localdate(),
+        )
+        self.client.force_login(self.receiver)
+        content = b"".join(self.client.get(reverse("receiver_dashboard")).streaming_content)
+        self.assertIn(b"Phone: 555-0101", content)
+        self.assertNotIn(b"Not available", content)
+
+        self.north.delete()
+        self.assertFalse(Donor.objects.using("region_south").exists())
+
+    @unittest.skipIf(routes.np is None, "NumPy is not installed")
+    @override_settings(STORAGES=TEST_STORAGES)
+    def test_staff_views_cover_every_region(self):
+        pickup = timezone.now().replace(hour=12, minute=0, second=0, microsecond=0)
+        made = {}
+        for donor, food in ((self.north, "Bread"), (self.south, "Soup")):
+            made[food] = donor.donation_set.create(
+                food_type=food, quantity="10 boxes", pickup_location="Main Street", status="Requested",
+                pickup_time=pickup, expiry_date=timezone.localdate(), latitude=12.97, longitude=77.59,
+            )
+        for name in ("", *SHARDS):
+            with sharding.region(name):
+                rebuild_rollups()
+        staff = User.objects.create_superuser("coordinator", password="x")
+        self.client.force_login(staff)
+
+        [row] = analytics.report(group_by="location")
+        self.assertEqual((row["group"], row["donations"], row["meals"]), ("Main Street", 2, 20))
+        response = self.client.get(reverse("donation_report"), {"group": "donor", "format": "csv"})
+        self.assertEqual([line.split(",")[0] for line in response.content.decode().splitlines()[1:]],
+                         ["bakery", "canteen"])
+
+        response = self.client.get(reverse("api_routes"), {"date": str(timezone.localdate(pickup))})
+        stops = [stop["id"] for route in response.json()["routes"] for stop in route["stops"]]
+        self.assertEqual(sorted(stops), sorted(donation.pk for donation in made.values()))
+
+        # The admin reads one region at a time, and an object where it lives.
+        changelist = reverse("admin:portal_donation_changelist")
+        self.assertRedirects(self.client.get(changelist), f"{changelist}?region=default")
+        response = self.client.get(changelist, {"region": "south"})
+        self.assertContains(response, '<td class="field-food_type">Soup</td>')
+        self.assertNotContains(response, '<td class="field-food_type">Bread</td>')
+        response = self.client.get(reverse("admin:portal_donation_change", args=[made["Bread"].pk]))
+        self.assertContains(response, "Bread")
+
+    def test_donors_see_their_requesters(self):
+        Receiver.objects.create(user=self.receiver, mobile_number="555-0102")
+        other = User.objects.create_user("pantry", password="x", user_type="receiver", region="north")
+        Receiver.objects.create(user=other, mobile_number="555-0103")
+        bread = self.north.donation_set.create(
+            food_type="Bread", quantity="1", pickup_location="x",
+            pickup_time=timezone.now(), expiry_date=timezone.localdate(),
+        )
+        bread.request_set.create(requester=self.receiver)
+
+        for donor, seen in ((self.north, ["555-0102"]), (self.south, [])):
+            self.client.force_login(donor)
+            response = self.client.get(reverse("api_receivers"), {"fields": "mobile_number"})
+            self.assertEqual([row["mobile_number"] for row in response.json()["results"]], seen)
+
+    def test_scatter_merges_in_order(self):
+        now = timezone.now()
+        for hours, donor in enumerate([self.south, self.north, self.local, self.north, self.south, self.local]):
+            donor.donation_set.create(
+                food_type=f"Meal {hours}", quantity="1", pickup_location="x",
+                pickup_time=now + datetime.timedelta(hours=hours % 3), expiry_date=timezone.localdate(),
+            )
+        everywhere = list(sharding.scatter(Donation.objects.order_by("-pickup_time", "food_type")))
+        self.assertEqual(
+            [d.food_type for d in everywhere], ["Meal 2", "Meal 5", "Meal 1", "Meal 4", "Meal 0", "Meal 3"]
+        )
+        self.assertEqual({d._state.db for d in everywhere}, {"default", *SHARDS.values()})
+        # By id: default's block, then north's, then south's.
+        rows = sharding.scatter(Donation.objects.values("food_type", "pk"), limit=4)
+        self.assertEqual([row["food_type"] for row in rows], ["Meal 2", "Meal 5", "Meal 1", "Meal 3"])
@@ -0,0 +1,67 @@
+"""
+Thumbnail rendering, run in the process pool of portal.photos.
+
+This module imports nothing from Django, so a freshly spawned worker only
+loads Pillow.  Thumbnails are named after a hash of the photo's bytes:
+the same photo uploaded twice is rendered once, and a name always refers
+to the same content, so it can be served with a far-future cache header.
+"""
+
+import hashlib
+import os
+import tempfile
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Pillow is optional; without it photos keep no thumbnails.
+    Image = ImageOps = None
+
+FORMATS = (("WEBP", ".webp", {"quality": 75, "method": 4}), ("JPEG", ".jpg", {"quality": 80, "progressive": True}))
+KEY_LENGTH = 20
+
+
+def fingerprint(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()[:KEY_LENGTH]
+
+
+def _write(image, path, kind, options):
+    # Written under a temporary name and renamed, so a reader never sees a
+    # half-written thumbnail and two workers rendering the same photo do not
+    # interleave.
+    fd, temporary = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as f:
+            image.save(f, kind, **options)
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def render(source, directory, widths):
+    """
+    Render ``source`` as WebP and JPEG thumbnails at most ``widths`` pixels
+    wide and tall into ``directory``.  Returns ``(key, width, height)``:
+    the files are ``<key>-<width>.webp`` and ``.jpg``, and width and
+    height are the dimensions of the smallest.
+    """
+    key = fingerprint(source)
+    os.makedirs(directory, exist_ok=True)
+    widths = sorted(widths, reverse=True)
+    with Image.open(source) as image:
+        # JPEGs are decoded straight at a fraction of their size, far
+        # cheaper than decoding in full and scaling down.
+        image.draft("RGB", (widths[0], widths[0]))
+        image = ImageOps.exif_transpose(image).convert("RGB")
+    for width in widths:
+        # Each size is scaled from the previous one, not the original.
+        image.thumbnail((width, width), Image.Resampling.LANCZOS, reducing_gap=2.0)
+        for kind, extension, options in FORMATS:
+            path = os.path.join(directory, f"{key}-{width}{extension}")
+            if not os.path.exists(path):
+                _write(image, path, kind, options)
+    return key, image.width, image.height
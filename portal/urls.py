@@ -1,5 +1,5 @@
 from django.urls import path
-from . import views
+from . import api, views
 
 urlpatterns = [
     path('', views.home, name='home'),
@@ -9,9 +9,40 @@ urlpatterns = [
     path("logout/", views.logout_view, name="logout"),
     path("receiver/login/", views.receiver_login_view, name="RecieverLogin"),
     path('donor/dashboard/', views.donor_dashboard, name='donor_dashboard'),
+    path('donor/dashboard/requests/', views.donor_requests, name='donor_requests'),
+    path('donor/inbox/', views.donor_inbox, name='donor_inbox'),
     path('donation/edit/<int:id>/', views.edit_donation, name='edit_donation'),
     path('donation/delete/<int:id>/', views.delete_donation, name='delete_donation'),
+    path('donation/<int:id>/photos/', views.donation_photos, name='donation_photos'),
+    path('media/<path:path>', views.media, name='media'),
     path('receiver/dashboard/', views.receiver_dashboard, name='receiver_dashboard'),
     path('donation/<int:id>/request/', views.request_food, name='request_food'),
     path("request-food/<int:id>/", views.request_food, name="request_food"),
+    path("reports/donations/", views.donation_report, name="donation_report"),
+
+    # JSON API
+    path("api/v1/donations/", api.donations, name="api_donations"),
+    path("api/v1/donations/<int:id>/", api.donation_detail, name="api_donation_detail"),
+    path("api/v1/donations/<int:id>/slots/", api.donation_slots, name="api_donation_slots"),
+    path("api/v1/slots/", api.slots, name="api_slots"),
+    path("api/v1/recurring/", api.recurring_donations, name="api_recurring_donations"),
+    path("api/v1/recurring/<int:id>/", api.recurring_donation_detail, name="api_recurring_donation_detail"),
+    path("api/v1/archive/donations/", api.archived_donations, name="api_archived_donations"),
+    path(
+        "api/v1/archive/donations/<int:id>/",
+        api.archived_donation_detail,
+        name="api_archived_donation_detail",
+    ),
+    path("api/v1/searches/", api.searches, name="api_searches"),
+    path("api/v1/searches/<int:id>/", api.search_detail, name="api_search_detail"),
+    path("api/v1/alerts/", api.alerts, name="api_alerts"),
+    path("api/v1/requests/", api.requests, name="api_requests"),
+    path("api/v1/requests/<int:id>/", api.request_detail, name="api_request_detail"),
+    path("api/v1/requests/decisions/", api.request_decisions, name="api_request_decisions"),
+    path("api/v1/claims/", api.claim_donations, name="api_claims"),
+    path("api/v1/changes/", api.change_feed, name="api_changes"),
+    path("api/v1/routes/", api.pickup_routes, name="api_routes"),
+    path("api/v1/page-cache/", api.page_cache_stats, name="api_page_cache"),
+    path("api/v1/donors/", api.donors, name="api_donors"),
+    path("api/v1/receivers/", api.receivers, name="api_receivers"),
 ]
@@ -1,7 +1,16 @@
+import csv
+
+from django.conf import settings
 from django.contrib import messages
+from django.contrib.admin.views.decorators import staff_member_required
+from django.core.files.uploadhandler import TemporaryFileUploadHandler
+from django.http import Http404, HttpResponse
+from django.db import IntegrityError
+from django.db.models import F, Prefetch
 from django.shortcuts import render, redirect, get_object_or_404
+from django.template.loader import render_to_string
 from django.contrib.auth import authenticate, login,logout
-from .models import Donation, Request, Donor
+from .models import Donation, DonationEvent, DonationPhoto, PickupSlot, Request
 from .forms import (
     DonorSignupForm,
     ReceiverSignupForm,
@@ -10,58 +19,73 @@ from .forms import (
     ReceiverLoginForm,
 )
 from django.contrib.auth.decorators import login_required
+from . import analytics, events, inbox, photos, pickups, watch
+from .idempotency import idempotent
+from .pagecache import page_cache
+from .ratelimit import ratelimit
+from .streaming import FEED_CHUNK_SIZE, render_feed
 from django.contrib.auth import get_user_model
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.utils.dateparse import parse_date
+from django.views.decorators.csrf import csrf_exempt, csrf_protect
+from django.views.static import serve
 
 User = get_user_model()
 
 
+@page_cache()
 def home(request):
     return render(request, "home.html")
 
 
+@page_cache(per_role=True)
+@ratelimit("signup", keys=("ip",))
 def donor_signup(request):
     if request.method == "POST":
         form = DonorSignupForm(request.POST)
         if form.is_valid():
-            username = form.cleaned_data["username"]
-            if User.objects.filter(username=username).exists():
-                messages.error(
-                    request, "Username already exists. Please choose a different one."
+            try:
+                form.save()
+            except IntegrityError:
+                form.add_error(
+                    "username", "Username already exists. Please choose a different one."
                 )
-                return redirect("donor_signup")
-
-            form.save()
-            messages.success(
-                request, "Donor account created successfully! You can now login."
-            )
-            return redirect("donorLogin")
+            else:
+                messages.success(
+                    request, "Donor account created successfully! You can now login."
+                )
+                return redirect("donorLogin")
     else:
         form = DonorSignupForm()
 
     return render(request, "donor_signup.html", {"form": form})
 
 
+@page_cache(per_role=True)
+@ratelimit("signup", keys=("ip",))
 def receiver_signup(request):
     if request.method == "POST":
         form = ReceiverSignupForm(request.POST)
         if form.is_valid():
-            username = form.cleaned_data["username"]
-            if User.objects.filter(username=username).exists():
-                messages.error(
-                    request, "Username already exists. Please choose a different one."
+            try:
+                form.save()
+            except IntegrityError:
+                form.add_error(
+                    "username", "Username already exists. Please choose a different one."
                 )
-                return redirect("receiver_signup")
-
-            form.save()
-            messages.success(
-                request, "Receiver account created successfully! You can now login."
-            )
-            return redirect("RecieverLogin")
+            else:
+                messages.success(
+                    request, "Receiver account created successfully! You can now login."
+                )
+                return redirect("RecieverLogin")
     else:
         form = ReceiverSignupForm()
     return render(request, "receiver_signup.html", {"form": form})
 
 
+@page_cache()
+@ratelimit("login", keys=("ip",))
 def donor_login_view(request):
     if request.method == "POST":
         form = DonorLoginForm(request.POST)
@@ -81,6 +105,8 @@ def donor_login_view(request):
     return render(request, "donorLogin.html", {"form": form})
 
 
+@page_cache()
+@ratelimit("login", keys=("ip",))
 def receiver_login_view(request):
     if request.method == "POST":
         form = ReceiverLoginForm(request.POST)
@@ -101,7 +127,28 @@ def receiver_login_view(request):
     return render(request, "RecieverLogin.html", {"form": form})
 
 
+def is_fragment(request):
+    """Whether fragments.js sent the request, asking for just the changed HTML."""
+    return request.headers.get("HX-Request") == "true"
+
+
+def render_fragments(request, parts, status=200):
+    """One response holding each ``(template, context)`` of ``parts`` in turn."""
+    return HttpResponse(
+        "".join(render_to_string(name, context, request) for name, context in parts), status=status
+    )
+
+
+def donor_requests_for(user):
+    return (
+        Request.objects.filter(donation__donor=user)
+        .select_related("requester", "donation")
+        .order_by("-created_at")
+    )
+
+
 @login_required
+@idempotent("donation")
 def donor_dashboard(request):
     if request.user.user_type != "donor":
         return redirect("home")
@@ -111,52 +158,203 @@ def donor_dashboard(request):
         if form.is_valid():
             donation = form.save(commit=False)
             donation.donor = request.user
-            donation.save()
+            with events.atomic():
+                donation.save()
+                events.log(
+                    DonationEvent.CREATED, donation.pk, events.snapshot(donation), actor=request.user
+                )
+                watch.match([donation])
+            if is_fragment(request):
+                # The new card, plus a blank form with a fresh idempotency key.
+                return render_fragments(
+                    request,
+                    [
+                        ("includes/donor_donation.html", {"donation": donation}),
+                        ("includes/donation_form.html", {"form": DonationForm(), "oob": True}),
+                    ],
+                    status=201,
+                )
             messages.success(request, "Donation posted successfully!")
             return redirect("donor_dashboard")
+        if is_fragment(request):
+            return render_fragments(request, [("includes/donation_form.html", {"form": form})], status=422)
     else:
         form = DonationForm()
 
-    donations = Donation.objects.filter(donor=request.user)
-    requests = Request.objects.filter(donation__donor=request.user)
+    donations = Donation.objects.filter(donor=request.user).prefetch_related(ready_photos()).order_by("-pk")
+    requests = donor_requests_for(request.user)
     return render(
         request,
         "donor_dashboard.html",
         {"form": form, "donations": donations, "requests": requests},
     )
+
+
+@login_required
+def donor_inbox(request):
+    if request.user.user_type != "donor":
+        return redirect("home")
+
+    if request.method == "POST":
+        ids = [pk for pk in request.POST.getlist("requests") if pk.isdigit()]
+        try:
+            changed, siblings = inbox.decide(request.user, request.POST.get("action"), ids)
+        except inbox.InboxError as e:
+            messages.error(request, str(e))
+        else:
+            note = f" and declined {siblings} other request(s)" if siblings else ""
+            messages.success(request, f"Updated {changed} request(s){note}.")
+        return redirect(request.get_full_path())
+
+    status = request.GET.get("status")
+    return render(
+        request,
+        "donor_inbox.html",
+        {
+            "donations": inbox.inbox(request.user, status),
+            "status": status,
+            "statuses": Request.STATUS_CHOICES,
+        },
+    )
+
+
+@login_required
+def donor_requests(request):
+    if request.user.user_type != "donor":
+        return redirect("home")
+    return render_fragments(
+        request, [("includes/donor_requests.html", {"requests": donor_requests_for(request.user)})]
+    )
+
+
 def logout_view(request):
     logout(request)
     return redirect('home')
 
+@login_required
 def edit_donation(request, id):
     donation = get_object_or_404(Donation, id=id, donor=request.user)
     if request.method == 'POST':
+        before = events.snapshot(donation)
         form = DonationForm(request.POST, instance=donation)
         if form.is_valid():
-            form.save()
+            with events.atomic():
+                form.save()
+                events.log(
+                    DonationEvent.EDITED, donation.pk, events.diff(before, donation), actor=request.user
+                )
+            if is_fragment(request):
+                # The card shows the photos, as on the dashboard.
+                donation = Donation.objects.prefetch_related(ready_photos()).get(pk=donation.pk)
+                return render_fragments(request, [("includes/donor_donation.html", {"donation": donation})])
             return redirect('donor_dashboard')
+        if is_fragment(request):
+            return render_fragments(
+                request,
+                [("includes/donor_donation_edit.html", {"donation": donation, "form": form})],
+                status=422,
+            )
     else:
         form = DonationForm(instance=donation)
+        if is_fragment(request):
+            return render_fragments(
+                request, [("includes/donor_donation_edit.html", {"donation": donation, "form": form})]
+            )
     return render(request, 'edit_donation.html', {'form': form})
 
+@login_required
 def delete_donation(request, id):
     donation = get_object_or_404(Donation, id=id, donor=request.user)
     if request.method == 'POST':
-        donation.delete()
+        request_ids = list(Request.objects.filter(donation=donation).values_list("pk", flat=True))
+        with events.atomic():
+            events.log(DonationEvent.DELETED, donation.pk, actor=request.user)
+            donation.soft_delete()
+        if is_fragment(request):
+            # The card is removed client side; its requests went with it.
+            return render_fragments(
+                request, [("includes/removed.html", {"prefix": "request-", "ids": request_ids})]
+            )
         return redirect('donor_dashboard')
     return render(request, 'delete_donation.html', {'donation': donation})
 
+def ready_photos():
+    return Prefetch(
+        "photos",
+        queryset=DonationPhoto.objects.filter(status=DonationPhoto.READY).order_by("pk"),
+        to_attr="ready_photos",
+    )
+
+
+@csrf_exempt
+def donation_photos(request, id):
+    # Spool the upload to a temporary file as it arrives instead of keeping
+    # smaller files in memory: photos.add() then moves it into place.  The
+    # handlers can only be swapped before anything reads request.POST, which
+    # CsrfViewMiddleware would, hence the CSRF check inside.  Oversized
+    # bodies are refused before any of them is read.
+    try:
+        length = int(request.META.get("CONTENT_LENGTH") or 0)
+    except ValueError:
+        return HttpResponse("Invalid Content-Length.", status=400)
+    if length > settings.PORTAL_PHOTO_MAX_SIZE + 64 * 1024:
+        return HttpResponse("Photo too large.", status=413)
+    request.upload_handlers = [TemporaryFileUploadHandler(request)]
+    return _donation_photos(request, id)
+
+
+@csrf_protect
 @login_required
-def receiver_dashboard(request):
-    donations = Donation.objects.select_related('donor').all()
-    
-    for d in donations:
-        d.donor_profile = Donor.objects.filter(user=d.donor).first()
+def _donation_photos(request, id):
+    donation = get_object_or_404(Donation, id=id, donor=request.user)
+    if request.method != "POST":
+        return redirect("donor_dashboard")
+    upload = request.FILES.get("photo")
+    try:
+        if upload is None:
+            raise photos.PhotoError("Choose a photo to upload.")
+        photos.add(donation, upload)
+    except photos.PhotoError as e:
+        messages.error(request, str(e))
+    else:
+        messages.success(request, "Photo added; it shows up once its thumbnail is ready.")
+    return redirect("donor_dashboard")
+
 
-    return render(request, 'receiver_dashboard.html', {'donations': donations})
+def media(request, path):
+    """
+    Donation photos and thumbnails.  Their names never change content, so
+    browsers may keep them for a year without asking again.
+    """
+    if not path.startswith("photos/"):
+        raise Http404
+    response = serve(request, path, document_root=settings.MEDIA_ROOT)
+    patch_cache_control(response, public=True, max_age=365 * 24 * 60 * 60, immutable=True)
+    return response
 
 
 @login_required
+def receiver_dashboard(request):
+    # Donor profiles come from the same join; rows are streamed off the
+    # cursor, with one query per chunk each for the bookable pickup slots
+    # and the photos.
+    free_slots = PickupSlot.objects.filter(start__gte=timezone.now(), booked__lt=F("capacity"))
+    donations = Donation.objects.select_related("donor", "donor__donor").prefetch_related(
+        Prefetch("slots", queryset=free_slots, to_attr="free_slots"), ready_photos()
+    )
+    return render_feed(
+        request,
+        "receiver_dashboard.html",
+        {},
+        donations.iterator(chunk_size=FEED_CHUNK_SIZE),
+        "includes/donation_cards.html",
+        "donations",
+    )
+
+
+@login_required
+@idempotent("claim")
+@ratelimit("claim", keys=("user", "ip"))
 def request_food(request, id):
     donation = get_object_or_404(Donation, id=id)
 
@@ -166,13 +364,29 @@ def request_food(request, id):
 
     if request.method == "POST":
         message = request.POST.get("message", "")
-        Request.objects.create(
-            donation=donation,
-            requester=request.user,
-            message=message
-        )
-        donation.status = "Requested"
-        donation.save()
+        slot = request.POST.get("slot")
+        try:
+            with events.atomic():
+                claim = Request.objects.create(
+                    donation=donation,
+                    requester=request.user,
+                    message=message
+                )
+                claimed = {"status": "Requested", "request": claim.pk}
+                if slot:
+                    if not slot.isdigit():
+                        raise pickups.SlotError("That pickup slot does not exist.")
+                    claimed["slot"] = pickups.book(int(slot), request.user, claim).slot_id
+                donation.status = "Requested"
+                donation.save()
+                events.log(DonationEvent.CLAIMED, donation.pk, claimed, actor=request.user)
+        except IntegrityError:
+            # unique_request_per_requester: this receiver already asked.
+            messages.info(request, "You have already requested this donation.")
+            return redirect("receiver_dashboard")
+        except pickups.SlotError as e:
+            messages.error(request, str(e))
+            return redirect("receiver_dashboard")
 
         messages.success(request, "Food request submitted successfully.")
         return redirect("receiver_dashboard")
@@ -180,3 +394,44 @@ def request_food(request, id):
     return redirect("home")
 
 
+REPORT_COLUMNS = [
+    ("group", "Group"),
+    ("donations", "Donations"),
+    ("meals", "Meals"),
+    ("claimed", "Claimed"),
+    ("claim_rate", "Claim rate"),
+    ("avg_hours_to_claim", "Avg hours to claim"),
+    ("expired_unclaimed", "Expired unclaimed"),
+]
+
+
+def _report_date(value):
+    try:
+        return parse_date(value or "")
+    except ValueError:
+        return None
+
+
+@staff_member_required
+def donation_report(request):
+    group_by = request.GET.get("group", "day")
+    if group_by not in ("day", "donor", "location"):
+        group_by = "day"
+    start = _report_date(request.GET.get("start"))
+    end = _report_date(request.GET.get("end"))
+    rows = analytics.report(start, end, group_by)
+
+    if request.GET.get("format") == "csv":
+        response = HttpResponse(content_type="text/csv")
+        response["Content-Disposition"] = f'attachment; filename="donations-by-{group_by}.csv"'
+        writer = csv.writer(response)
+        writer.writerow([label for _, label in REPORT_COLUMNS])
+        for row in rows:
+            writer.writerow([row[key] for key, _ in REPORT_COLUMNS])
+        return response
+
+    return render(
+        request,
+        "donation_report.html",
+        {"rows": list(rows), "group_by": group_by, "start": start, "end": end},
+    )
@@ -0,0 +1,216 @@
+"""
+Receivers' saved searches, and the alerts queued when a new donation
+matches one.
+
+A search names words the food type must contain ("vegetarian rice"), a
+pickup location, and how many days the food must still keep; any of them
+may be left out.  Rather than run every saved search against each new
+donation, the searches themselves are indexed: each stores one of its
+words as ``token`` and its normalised location, under a (token, location)
+index.  A donation can only match searches keyed on one of its own words
+or on "" (no words), and on its own location or on "" (anywhere), so
+matching a batch of donations is one index lookup for those keys followed
+by an exact check of the few candidates it returns.
+
+Pickup locations are free text, so the location is matched as a whole
+(case and punctuation aside) and acts as the spatial cell.  A search may
+instead give a point and a radius ("within 3 km"), which matches donations
+whose coordinates are that close.  Such a search is keyed on "" (anywhere)
+and stores the bounding box of its circle, so the candidate query keeps
+only boxes that overlap the batch's donations, and the exact great-circle
+distance is checked for the few that remain.
+
+Matches are queued as WatchAlert rows, in the same transaction as the
+donation, and delivered by the ``send_watch_alerts`` command.
+"""
+
+import datetime
+import math
+import re
+from collections import defaultdict
+
+from django.db.models import Q
+from django.utils import timezone
+
+from .models import SavedSearch, WatchAlert
+from .routes import EARTH_RADIUS_KM
+
+MAX_SEARCHES_PER_RECEIVER = 20
+DEFAULT_RADIUS_KM = 3
+MAX_RADIUS_KM = 100
+# Donations whose keys are looked up per query.
+MATCH_CHUNK_SIZE = 200
+
+_WORD = re.compile(r"\w+")
+
+
+class WatchError(Exception):
+    pass
+
+
+def words(text):
+    return _WORD.findall(text.casefold())
+
+
+def normalise_location(text):
+    return " ".join(words(text))
+
+
+def bounding_box(latitude, longitude, radius_km):
+    """
+    ``(min_lat, max_lat, min_lon, max_lon)`` around the circle, in degrees.
+    Circles reaching a pole or across the antimeridian get every longitude.
+    """
+    angle = radius_km / EARTH_RADIUS_KM
+    spread = math.degrees(angle)
+    min_lat, max_lat = latitude - spread, latitude + spread
+    if min_lat <= -90 or max_lat >= 90:
+        return max(min_lat, -90.0), min(max_lat, 90.0), -180.0, 180.0
+    # The widest point of the circle is not on its centre's latitude.
+    spread = math.degrees(math.asin(math.sin(angle) / math.cos(math.radians(latitude))))
+    min_lon, max_lon = longitude - spread, longitude + spread
+    if min_lon < -180 or max_lon > 180:
+        return min_lat, max_lat, -180.0, 180.0
+    return min_lat, max_lat, min_lon, max_lon
+
+
+def distance_km(a, b):
+    """Great-circle (haversine) distance between two ``(lat, lon)`` points."""
+    lat1, lon1, lat2, lon2 = map(math.radians, (*a, *b))
+    h = math.sin((lat2 - lat1) / 2) ** 2 + math.cos(lat1) * math.cos(lat2) * math.sin((lon2 - lon1) / 2) ** 2
+    return 2 * EARTH_RADIUS_KM * math.asin(math.sqrt(min(h, 1.0)))
+
+
+def save_search(receiver, name, food="", location="", min_days_left=None, near=None, radius_km=None):
+    """
+    Create a saved search for ``receiver``; raises WatchError if invalid.
+    ``near`` is a ``(latitude, longitude)`` to match donations within
+    ``radius_km`` (default ``DEFAULT_RADIUS_KM``) of, instead of a location.
+    """
+    name = name.strip()
+    if not name:
+        raise WatchError("Give the search a name.")
+    if min_days_left is not None and min_days_left < 0:
+        raise WatchError("min_days_left cannot be negative.")
+    if near is None and radius_km is not None:
+        raise WatchError("A radius needs a latitude and longitude.")
+    if near is not None:
+        if location.strip():
+            raise WatchError("Search by location or by distance, not both.")
+        latitude, longitude = near
+        radius_km = DEFAULT_RADIUS_KM if radius_km is None else radius_km
+        if not (-90 <= latitude <= 90 and -180 <= longitude <= 180):
+            raise WatchError("That is not a valid latitude and longitude.")
+        if not 0 < radius_km <= MAX_RADIUS_KM:
+            raise WatchError(f"The radius must be more than 0 and at most {MAX_RADIUS_KM} km.")
+    if SavedSearch.objects.filter(receiver=receiver).count() >= MAX_SEARCHES_PER_RECEIVER:
+        raise WatchError(f"At most {MAX_SEARCHES_PER_RECEIVER} saved searches per receiver.")
+    terms = sorted(set(words(food)))
+    search = SavedSearch(
+        receiver=receiver,
+        name=name[:100],
+        terms=" ".join(terms),
+        location=normalise_location(location),
+        min_days_left=min_days_left,
+        # Every term has to match, so any one of them is a valid key; the
+        # longest is likely the rarest and so gives the fewest candidates.
+        token=max(terms, key=lambda term: (len(term), term)) if terms else "",
+    )
+    if near is not None:
+        search.latitude, search.longitude, search.radius_km = latitude, longitude, radius_km
+        (search.min_latitude, search.max_latitude,
+         search.min_longitude, search.max_longitude) = bounding_box(latitude, longitude, radius_km)
+    if len(search.terms) > 200 or len(search.token) > 100 or len(search.location) > 255:
+        raise WatchError("That search is too long.")
+    search.save()
+    return search
+
+
+def matches(search, food_words, location, point, expiry_date, today):
+    if search.location and search.location != location:
+        return False
+    if search.radius_km is not None and (
+        point is None or distance_km((search.latitude, search.longitude), point) > search.radius_km
+    ):
+        return False
+    if search.terms and not set(search.terms.split()) <= food_words:
+        return False
+    if search.min_days_left is not None:
+        return expiry_date >= today + datetime.timedelta(days=search.min_days_left)
+    return True
+
+
+def coordinates(donation):
+    if donation.latitude is None or donation.longitude is None:
+        return None
+    return donation.latitude, donation.longitude
+
+
+def _near(points):
+    """Searches without a radius, and those whose box overlaps the box around ``points``."""
+    if not points:
+        return Q(radius_km__isnull=True)
+    latitudes, longitudes = zip(*points)
+    return Q(radius_km__isnull=True) | Q(
+        min_latitude__lte=max(latitudes),
+        max_latitude__gte=min(latitudes),
+        min_longitude__lte=max(longitudes),
+        max_longitude__gte=min(longitudes),
+    )
+
+
+def match(donations):
+    """
+    Queue a WatchAlert for every saved search each of ``donations`` matches.
+    Returns the number of alerts queued, leaving out those already queued.
+    """
+    today = timezone.localdate()
+    queued = 0
+    for start in range(0, len(donations), MATCH_CHUNK_SIZE):
+        chunk = donations[start : start + MATCH_CHUNK_SIZE]
+        keys = [
+            (
+                set(words(donation.food_type)), normalise_location(donation.pickup_location),
+                coordinates(donation), donation,
+            )
+            for donation in chunk
+        ]
+        tokens = {""}.union(*(food_words for food_words, _, _, _ in keys))
+        locations = {""} | {location for _, location, _, _ in keys}
+        points = [point for _, _, point, _ in keys if point is not None]
+        by_key = defaultdict(list)
+        candidates = SavedSearch.objects.filter(_near(points), token__in=tokens, location__in=locations)
+        for search in candidates.only(
+            "terms", "location", "min_days_left", "token", "latitude", "longitude", "radius_km"
+        ):
+            by_key[search.token, search.location].append(search)
+        if not by_key:
+            continue
+        alerts = []
+        for food_words, location, point, donation in keys:
+            for token in food_words | {""}:
+                for cell in {location, ""}:
+                    for search in by_key.get((token, cell), ()):
+                        if matches(search, food_words, location, point, donation.expiry_date, today):
+                            alerts.append(WatchAlert(search=search, donation=donation))
+        if not alerts:
+            continue
+        # bulk_create() returns every alert, the duplicates it skipped too.
+        existing = WatchAlert.objects.filter(donation__in=chunk)
+        before = existing.count()
+        WatchAlert.objects.bulk_create(alerts, ignore_conflicts=True)
+        queued += existing.count() - before
+    return queued
+
+
+def pending(limit):
+    """Up to ``limit`` unsent alerts for donations still listed, oldest first."""
+    return (
+        WatchAlert.objects.filter(sent_at__isnull=True, donation__deleted_at__isnull=True)
+        .select_related("search__receiver", "donation")
+        .order_by("pk")[:limit]
+    )
+
+
+def mark_sent(alerts):
+    WatchAlert.objects.filter(pk__in=[alert.pk for alert in alerts]).update(sent_at=timezone.now())